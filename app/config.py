@@ -5,3 +5,151 @@ load_dotenv()
 
 MONGODB_URI = os.getenv("MONGODB_URI")
 DATABASE = "ai-wedder"
+
+# Modèles Hugging Face
+CLASSIFIER_MODEL = "Jyokim/camembert-wedder-nps-classifier"
+CLUSTERER_MODEL = "cmarkea/distilcamembert-base-nli"
+
+# Inférence par micro-batchs
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "32"))
+INFERENCE_MAX_LENGTH = int(os.getenv("INFERENCE_MAX_LENGTH", "256"))
+
+# Zero-shot : "cross-encoder" (NLI, fidèle au pipeline) ou "bi-encoder" (similarité d'embeddings)
+ZERO_SHOT_MODE = os.getenv("ZERO_SHOT_MODE", "cross-encoder")
+HYPOTHESIS_TEMPLATE = "Cet avis concerne {}."
+
+# Clustering en cascade : les avis courts dont le sentiment est sûr gardent le classement
+# par similarité d'embeddings, les autres ne passent par le NLI que sur leurs CASCADE_TOP_K labels
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "false").lower() == "true"
+CASCADE_SKIP_CONFIDENCE = float(os.getenv("CASCADE_SKIP_CONFIDENCE", "0.9"))
+CASCADE_SKIP_MAX_CHARS = int(os.getenv("CASCADE_SKIP_MAX_CHARS", "60"))
+CASCADE_TOP_K = int(os.getenv("CASCADE_TOP_K", "3"))
+
+# Écritures groupées (bulk_write)
+BULK_WRITE_BATCH_SIZE = int(os.getenv("BULK_WRITE_BATCH_SIZE", "500"))
+BULK_WRITE_FLUSH_INTERVAL = float(os.getenv("BULK_WRITE_FLUSH_INTERVAL", "5"))
+
+# OpenAI (OPENAI_BASE_URL permet de viser un serveur bouchon en local)
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+GPT_MODEL = os.getenv("GPT_MODEL", "gpt-3.5-turbo")
+GPT_TEMPERATURE = 0.3
+GPT_MAX_CONCURRENCY = int(os.getenv("GPT_MAX_CONCURRENCY", "8"))
+GPT_REQUESTS_PER_MINUTE = int(os.getenv("GPT_REQUESTS_PER_MINUTE", "500"))
+GPT_TOKENS_PER_MINUTE = int(os.getenv("GPT_TOKENS_PER_MINUTE", "200000"))
+GPT_MAX_RETRIES = int(os.getenv("GPT_MAX_RETRIES", "5"))
+# Sorties structurées : "tools" (appel de fonction forcé), "json_schema" (modèles récents) ou "off"
+GPT_STRUCTURED_OUTPUT = os.getenv("GPT_STRUCTURED_OUTPUT", "tools")
+# Nombre de relances de réparation (seule la réponse mal formée est renvoyée)
+GPT_REPAIR_ATTEMPTS = int(os.getenv("GPT_REPAIR_ATTEMPTS", "1"))
+
+# Cache persistant des réponses GPT
+GPT_CACHE_ENABLED = os.getenv("GPT_CACHE_ENABLED", "true").lower() == "true"
+GPT_CACHE_PATH = os.getenv("GPT_CACHE_PATH", ".cache/gpt_cache.sqlite")
+GPT_CACHE_TTL = int(os.getenv("GPT_CACHE_TTL", str(30 * 24 * 3600)))
+GPT_CACHE_MAX_ENTRIES = int(os.getenv("GPT_CACHE_MAX_ENTRIES", "50000"))
+# Les dates d'accès sont écrites par lots, l'éviction a lieu toutes les N insertions
+GPT_CACHE_ACCESS_FLUSH_EVERY = int(os.getenv("GPT_CACHE_ACCESS_FLUSH_EVERY", "100"))
+GPT_CACHE_EVICT_EVERY = int(os.getenv("GPT_CACHE_EVICT_EVERY", "100"))
+
+# Découpage des avis en prompts selon un budget de tokens
+SUMMARY_BATCH_TOKENS = int(os.getenv("SUMMARY_BATCH_TOKENS", "3000"))
+SUMMARY_FINAL_TOKENS = int(os.getenv("SUMMARY_FINAL_TOKENS", "6000"))
+SUMMARY_MAX_REDUCE_DEPTH = int(os.getenv("SUMMARY_MAX_REDUCE_DEPTH", "3"))
+
+# Jobs d'enrichissement en arrière-plan
+JOB_CHECKPOINT_EVERY = int(os.getenv("JOB_CHECKPOINT_EVERY", "10"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+# Collections d'avis accessibles par le paramètre `dataset` des routes
+REVIEW_DATASETS = [d.strip() for d in os.getenv("REVIEW_DATASETS", "reviews").split(",") if d.strip()]
+
+# Pool de processus d'inférence (0 = inférence dans le processus de l'API)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+INFERENCE_THREADS = int(
+    os.getenv(
+        "INFERENCE_THREADS", str(max(1, (os.cpu_count() or 1) // max(1, INFERENCE_WORKERS)))
+    )
+)
+
+# Backend d'inférence : "torch" ou "onnx" (ONNX Runtime, quantification int8 optionnelle)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+INFERENCE_QUANTIZE = os.getenv("INFERENCE_QUANTIZE", "false").lower() == "true"
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", ".cache/onnx")
+
+# Chargement des modèles : "background" (préchauffage au démarrage) ou "lazy" (au premier appel)
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "background")
+
+# Labels par défaut quand aucun jeu de labels n'a encore été enregistré
+DEFAULT_LABELS = [
+    "qualité des plats",
+    "service client",
+    "professionnalisme de l'équipe",
+    "présentation des plats",
+    "flexibilité",
+    "rapport qualité/prix",
+    "communication",
+    "adaptabilité",
+    "satisfaction des invités",
+    "expérience globale",
+]
+
+# Jeux de labels nommés (par région, catégorie de lieu ou client)
+LABEL_SET_MAX_LABELS = int(os.getenv("LABEL_SET_MAX_LABELS", "50"))
+# Hypothèses tokenisées / encodées gardées en cache, par version de jeu de labels
+HYPOTHESIS_CACHE_SIZE = int(os.getenv("HYPOTHESIS_CACHE_SIZE", "64"))
+
+# Analyse à la volée (/reviews/analyze) : micro-batching dynamique
+ANALYZE_MAX_BATCH_SIZE = int(os.getenv("ANALYZE_MAX_BATCH_SIZE", "16"))
+ANALYZE_MAX_WAIT_MS = float(os.getenv("ANALYZE_MAX_WAIT_MS", "5"))
+ANALYZE_MAX_REVIEWS = int(os.getenv("ANALYZE_MAX_REVIEWS", "32"))
+ANALYZE_LABELS_TTL = int(os.getenv("ANALYZE_LABELS_TTL", "60"))
+
+# Pool de connexions MongoDB (MONGODB_URI=mongomock:// pour un stand-in en mémoire)
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "50"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_TIMEOUT_MS = int(os.getenv("MONGODB_TIMEOUT_MS", "10000"))
+MONGODB_READ_PREFERENCE = os.getenv("MONGODB_READ_PREFERENCE", "primaryPreferred")
+
+# Lecture en flux de la collection des avis
+REVIEWS_CURSOR_BATCH_SIZE = int(os.getenv("REVIEWS_CURSOR_BATCH_SIZE", "1000"))
+REVIEWS_CHUNK_SIZE = int(os.getenv("REVIEWS_CHUNK_SIZE", "2000"))
+
+# Découverte des labels : embeddings + MiniBatchKMeans, puis nommage des clusters par GPT
+LABEL_DISCOVERY_CLUSTERS = int(os.getenv("LABEL_DISCOVERY_CLUSTERS", "10"))
+LABEL_DISCOVERY_EXEMPLARS = int(os.getenv("LABEL_DISCOVERY_EXEMPLARS", "5"))
+LABEL_DISCOVERY_MAX_REVIEWS = int(os.getenv("LABEL_DISCOVERY_MAX_REVIEWS", "20000"))
+# Un jeu de labels découvert est réutilisé tant que le corpus n'a pas grossi de plus de ce ratio
+LABEL_DISCOVERY_REFRESH_RATIO = float(os.getenv("LABEL_DISCOVERY_REFRESH_RATIO", "0.2"))
+
+# Embeddings des avis (float16, stockés dans Mongo) et index de plus proches voisins
+EMBEDDINGS_ENABLED = os.getenv("EMBEDDINGS_ENABLED", "true").lower() == "true"
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", ".cache/index")
+# "hnsw" (hnswlib, si installé) ou "exact" (produit scalaire numpy)
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "hnsw")
+# Un seul processus par répertoire écrit l'index sur disque (bail dans Mongo)
+VECTOR_INDEX_LEASE_SECONDS = int(os.getenv("VECTOR_INDEX_LEASE_SECONDS", "300"))
+# Intervalle du sync de l'index en arrière-plan (les requêtes ne font que le lire)
+VECTOR_INDEX_SYNC_SECONDS = float(os.getenv("VECTOR_INDEX_SYNC_SECONDS", "30"))
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+SIMILAR_MAX_RESULTS = int(os.getenv("SIMILAR_MAX_RESULTS", "50"))
+
+# Statistiques par traiteur (collection venue_stats)
+VENUE_STATS_BATCH_SIZE = int(os.getenv("VENUE_STATS_BATCH_SIZE", "200"))
+VENUE_REVIEWS_PAGE_SIZE = int(os.getenv("VENUE_REVIEWS_PAGE_SIZE", "20"))
+
+# Traces OpenTelemetry (si installé) ; les métriques Prometheus sont exposées sur /metrics
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "false").lower() == "true"
+
+# Prétraitement avant inférence : réparation d'encodage, espaces, doublons, textes longs
+PREPROCESS_ENABLED = os.getenv("PREPROCESS_ENABLED", "true").lower() == "true"
+# "chunk" (découpage en phrases, résultats moyennés) ou "truncate"
+PREPROCESS_LONG_TEXT = os.getenv("PREPROCESS_LONG_TEXT", "chunk")
+# ~4 caractères par token : la longueur maximale du modèle en caractères
+PREPROCESS_MAX_CHARS = int(os.getenv("PREPROCESS_MAX_CHARS", str(INFERENCE_MAX_LENGTH * 4)))
+PREPROCESS_MAX_CHUNKS = int(os.getenv("PREPROCESS_MAX_CHUNKS", "4"))
+PREPROCESS_CACHE_SIZE = int(os.getenv("PREPROCESS_CACHE_SIZE", "100000"))
+
+# Export / import colonnaire (Parquet ou Arrow IPC)
+COLUMNAR_ROWS_PER_FILE = int(os.getenv("COLUMNAR_ROWS_PER_FILE", "100000"))
@@ -0,0 +1,144 @@
+import asyncio
+from time import monotonic
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from app.config import BULK_WRITE_BATCH_SIZE, BULK_WRITE_FLUSH_INTERVAL
+from app.db.mongo import is_mock
+from app.services.metrics import span
+
+
+class BulkWriter:
+    """
+    Write-behind buffer for `$set` updates on an async collection.
+    Updates are flushed as one unordered `bulk_write` once `batch_size` operations
+    are pending or `flush_interval` seconds have passed since the last flush,
+    and on exit when used as an async context manager.
+
+    Inside `async with`, a timer task flushes idle updates every `flush_interval`
+    seconds. Outside of it, the interval is only checked by `set()`: callers that
+    may stop writing for a while (between checkpoints) call `flush()` themselves.
+
+    On the in-memory mongomock stand-in, whose `bulk_write` does not accept the
+    operations of recent PyMongo versions, updates are sent one by one instead.
+    """
+
+    def __init__(
+        self,
+        collection,
+        batch_size=BULK_WRITE_BATCH_SIZE,
+        flush_interval=BULK_WRITE_FLUSH_INTERVAL,
+    ):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.last_flush = monotonic()
+        self.matched = 0
+        self.modified = 0
+        self.errors = []
+        self._lock = asyncio.Lock()
+        self._timer = None
+
+    async def set(self, filter, fields, upsert=False):
+        self.pending.append((filter, {"$set": fields}, upsert))
+        if (
+            len(self.pending) >= self.batch_size
+            or monotonic() - self.last_flush >= self.flush_interval
+        ):
+            await self.flush()
+
+    async def flush(self):
+        """Send pending updates and return the per-batch report."""
+        # Un seul bulk_write à la fois : deux mises à jour d'un même document restent ordonnées
+        async with self._lock:
+            return await self._flush()
+
+    async def _flush(self):
+        self.last_flush = monotonic()
+        if not self.pending:
+            return None
+
+        operations, self.pending = self.pending, []
+        try:
+            with span(
+                "mongo.bulk_write",
+                collection=self.collection.name,
+                operations=len(operations),
+            ):
+                if is_mock(self.collection):
+                    report = await self._update_each(operations)
+                else:
+                    result = await self.collection.bulk_write(
+                        [UpdateOne(*operation) for operation in operations], ordered=False
+                    )
+                    report = {
+                        "operations": len(operations),
+                        "matched": result.matched_count,
+                        "modified": result.modified_count,
+                        "errors": [],
+                    }
+        except BulkWriteError as e:
+            # Unordered : les opérations valides du batch sont tout de même appliquées
+            details = e.details
+            report = {
+                "operations": len(operations),
+                "matched": details.get("nMatched", 0),
+                "modified": details.get("nModified", 0),
+                "errors": details.get("writeErrors", []),
+            }
+            print(
+                f"⚠️ bulk_write {self.collection.name} : "
+                f"{len(report['errors'])}/{len(operations)} opérations en erreur"
+            )
+
+        if report["errors"] and is_mock(self.collection):
+            print(
+                f"⚠️ update_one {self.collection.name} : "
+                f"{len(report['errors'])}/{len(operations)} opérations en erreur"
+            )
+        self.matched += report["matched"]
+        self.modified += report["modified"]
+        self.errors.extend(report["errors"])
+        return report
+
+    async def _update_each(self, operations):
+        """Unordered `bulk_write` equivalent for the mongomock stand-in."""
+        report = {"operations": len(operations), "matched": 0, "modified": 0, "errors": []}
+        for index, (filter, update, upsert) in enumerate(operations):
+            try:
+                result = await self.collection.update_one(filter, update, upsert=upsert)
+            except PyMongoError as e:
+                report["errors"].append({"index": index, "errmsg": str(e), "op": filter})
+                continue
+            report["matched"] += result.matched_count
+            report["modified"] += result.modified_count
+        return report
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(max(0.0, self.flush_interval - (monotonic() - self.last_flush)))
+            if monotonic() - self.last_flush < self.flush_interval:
+                continue
+            try:
+                await self.flush()
+            except PyMongoError as e:
+                # Le timer ne doit pas s'arrêter : l'erreur est comptée comme celles du bulk_write
+                print(f"⚠️ flush périodique {self.collection.name} : {e}")
+                self.errors.append({"errmsg": str(e)})
+
+    async def __aenter__(self):
+        if 0 < self.flush_interval < float("inf"):
+            self._timer = asyncio.create_task(self._flush_periodically())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._timer is not None:
+            # Annulé verrou pris : jamais au milieu d'un bulk_write
+            async with self._lock:
+                self._timer.cancel()
+            await asyncio.gather(self._timer, return_exceptions=True)
+            self._timer = None
+        await self.flush()
+        return False
@@ -1,5 +1,82 @@
-from pymongo import MongoClient
-from app.config import MONGODB_URI, DATABASE
+import inspect
 
-client = MongoClient(MONGODB_URI)
-db = client[DATABASE]
+from pymongo import AsyncMongoClient
+
+from app.config import (
+    DATABASE,
+    MONGODB_MAX_POOL_SIZE,
+    MONGODB_MIN_POOL_SIZE,
+    MONGODB_READ_PREFERENCE,
+    MONGODB_TIMEOUT_MS,
+    MONGODB_URI,
+)
+from app.services.metrics import MongoCommandMetrics
+
+_client = None
+
+
+def create_client(uri=MONGODB_URI):
+    if uri and uri.startswith("mongomock://"):
+        # Stand-in en mémoire pour le développement local et les benchmarks
+        from mongomock_motor import AsyncMongoMockClient
+
+        return AsyncMongoMockClient()
+
+    return AsyncMongoClient(
+        uri,
+        maxPoolSize=MONGODB_MAX_POOL_SIZE,
+        minPoolSize=MONGODB_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGODB_TIMEOUT_MS,
+        connectTimeoutMS=MONGODB_TIMEOUT_MS,
+        socketTimeoutMS=MONGODB_TIMEOUT_MS,
+        readPreference=MONGODB_READ_PREFERENCE,
+        event_listeners=[MongoCommandMetrics()],
+    )
+
+
+def is_mock(handle):
+    """True for the handles of the mongomock stand-in (client, database or collection)."""
+    # mongomock_motor se fait passer pour Motor : on regarde toute la hiérarchie
+    return any(cls.__module__.startswith("mongomock") for cls in type(handle).__mro__)
+
+
+def get_db():
+    """Shared async database handle. The client is created on first use; no I/O happens here."""
+    global _client
+    if _client is None:
+        _client = create_client()
+    return _client[DATABASE]
+
+
+async def connect():
+    db = get_db()
+    await db.command("ping")
+    return db
+
+
+async def close():
+    global _client
+    if _client is not None:
+        await _maybe_await(_client.close())
+        _client = None
+
+
+async def _maybe_await(value):
+    return await value if inspect.isawaitable(value) else value
+
+
+async def aggregate(collection, pipeline, **kwargs):
+    """`aggregate` is a coroutine with PyMongo's async API but not with Motor-style clients."""
+    return await _maybe_await(collection.aggregate(pipeline, **kwargs))
+
+
+async def iter_chunks(cursor, size):
+    """Group the documents of an async cursor into lists of at most `size` documents."""
+    chunk = []
+    async for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -1,7 +1,54 @@
 # Entry point
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from app.routes import reviews, hello
+from starlette.concurrency import run_in_threadpool
+
+from app.config import EMBEDDINGS_ENABLED, INFERENCE_WORKERS, MODEL_WARMUP, REVIEW_DATASETS
+from app.db import mongo
+from app.routes import reviews, hello, health, label_sets, metrics
+from app.services.analysis import analyzer
+from app.services.jobs import job_manager
+from app.services.registry import registry
+from app.services.vector_index import sync_review_indexes
+from app.services.workers import get_inference_pool, shutdown_inference_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Les modèles se chargent en arrière-plan : le service répond dès le démarrage
+    warm_ups = []
+    if MODEL_WARMUP == "background":
+        warm_ups.append(asyncio.create_task(run_in_threadpool(registry.warm_up)))
+        if INFERENCE_WORKERS:
+            # Avec le pool, les modèles sont chargés par les workers
+            warm_ups.append(asyncio.create_task(get_inference_pool().warm_up()))
+
+    db = await mongo.connect()
+
+    # Reprise des jobs interrompus (redémarrage, worker recyclé...)
+    await job_manager.ensure_indexes()
+    await job_manager.resume_interrupted()
+
+    # Index de similarité tenu à jour hors des requêtes
+    index_sync = None
+    if EMBEDDINGS_ENABLED:
+        index_sync = asyncio.create_task(sync_review_indexes(db, REVIEW_DATASETS))
+    yield
+    if index_sync is not None:
+        index_sync.cancel()
+    await job_manager.shutdown()
+    await analyzer.close()
+    for warm_up in warm_ups:
+        warm_up.cancel()
+    shutdown_inference_pool()
+    await mongo.close()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.include_router(reviews.router, prefix="/reviews")
 app.include_router(hello.router, prefix="/hello")
+app.include_router(health.router, prefix="/health")
+app.include_router(label_sets.router, prefix="/label-sets")
+app.include_router(metrics.router)
@@ -0,0 +1,45 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.config import INFERENCE_WORKERS, MODEL_WARMUP
+from app.db.mongo import get_db
+from app.services.registry import registry
+from app.services.workers import inference_pool_status
+
+router = APIRouter()
+
+
+@router.get("/live")
+def liveness():
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+async def readiness():
+    """
+    Ready once MongoDB answers. With MODEL_WARMUP=background, the models being
+    warmed up (in this process, or in the inference workers) must be loaded too;
+    in lazy mode they load on first use and do not gate readiness.
+    """
+    try:
+        await get_db().command("ping")
+        mongo_ready = True
+    except Exception:
+        mongo_ready = False
+
+    pool = inference_pool_status()
+    ready = mongo_ready
+    if MODEL_WARMUP == "background":
+        ready = ready and registry.is_ready()
+        if INFERENCE_WORKERS:
+            ready = ready and pool is not None and pool["state"] == "ready"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "warmup": MODEL_WARMUP,
+            "mongo": mongo_ready,
+            "models": registry.status(),
+            "inference_pool": pool,
+        },
+    )
@@ -0,0 +1,62 @@
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import BaseModel
+
+from app.db.mongo import get_db
+from app.routes.reviews import review_dataset
+from app.services.label_sets import (
+    LabelSetError,
+    delete_label_set,
+    get_label_set,
+    label_set_cache,
+    list_label_sets,
+    save_label_set,
+)
+
+router = APIRouter()
+
+
+class LabelSetRequest(BaseModel):
+    labels: List[str]
+    scope: Optional[Dict[str, str]] = None
+    description: Optional[str] = None
+
+
+@router.get("")
+async def get_label_sets(request: Request):
+    """Named label sets; query parameters filter on the scope (e.g. ?region=bretagne)."""
+    return {"label_sets": await list_label_sets(get_db(), dict(request.query_params))}
+
+
+@router.get("/{name}")
+async def get_one(name: str, version: Optional[str] = None, dataset: str = Depends(review_dataset)):
+    """Label set `name`; "default" is the label set of the last enrichment run of `dataset`."""
+    label_set = await get_label_set(get_db(), name, version, dataset)
+    if label_set is None:
+        raise HTTPException(status_code=404, detail="Label set not found")
+    return label_set
+
+
+@router.put("/{name}")
+async def put_label_set(name: str, request: LabelSetRequest):
+    try:
+        label_set = await save_label_set(
+            get_db(), name, request.labels, request.scope, request.description
+        )
+    except LabelSetError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    label_set_cache.invalidate(name)
+    return label_set
+
+
+@router.delete("/{name}")
+async def remove_label_set(name: str):
+    try:
+        deleted = await delete_label_set(get_db(), name)
+    except LabelSetError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Label set not found")
+    label_set_cache.invalidate(name)
+    return {"name": name, "deleted": True}
@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse, Response
+
+from app.services.metrics import latest
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def metrics():
+    exposition = latest()
+    if exposition is None:
+        return PlainTextResponse("prometheus_client is not installed", status_code=503)
+    payload, content_type = exposition
+    return Response(content=payload, media_type=content_type)
@@ -1,317 +1,265 @@
-import pandas as pd
-import os
-import ast
-import time
+from typing import List, Optional
 
-from fastapi import APIRouter
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
-from app.db.mongo import db
-from transformers import pipeline
-from openai import OpenAI
-from dotenv import load_dotenv
-from tqdm import tqdm
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from app.config import (
+    ANALYZE_MAX_REVIEWS,
+    INFERENCE_WORKERS,
+    REVIEW_DATASETS,
+    SIMILAR_MAX_RESULTS,
+    VENUE_REVIEWS_PAGE_SIZE,
+)
+from app.db.mongo import get_db
+from app.services.analysis import analyzer
+from app.services.analytics import get_venue_stats
+from app.services.inference import embed_batch
+from app.services.jobs import UnknownLabelSets, job_manager
+from app.services.label_sets import DEFAULT_NAME, label_set_cache
+from app.services.registry import registry
+from app.services.vector_index import decode_embedding, get_review_index
+from app.services.workers import get_inference_pool
+from app.utils.converters import convert_objectids, parse_object_id
 
 router = APIRouter()
-load_dotenv()
 
-# Chargement une fois au démarrage
-classifier = pipeline(
-    "text-classification",
-    model="Jyokim/camembert-wedder-nps-classifier",
-    tokenizer="Jyokim/camembert-wedder-nps-classifier",
-)
 
-clusterer = pipeline(
-    task="zero-shot-classification",
-    model="cmarkea/distilcamembert-base-nli",
-    tokenizer="cmarkea/distilcamembert-base-nli",
-)
+def review_dataset(dataset: str = "reviews"):
+    """The `dataset` query parameter, restricted to the review collections of REVIEW_DATASETS."""
+    if dataset not in REVIEW_DATASETS:
+        raise HTTPException(status_code=422, detail=f"Unknown dataset: {dataset}")
+    return dataset
+
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+class AnalyzeRequest(BaseModel):
+    text: Optional[str] = None
+    texts: Optional[List[str]] = None
+    label_set: str = DEFAULT_NAME
+    dataset: str = "reviews"
 
 
-def gpt_model(prompt, model="gpt-3.5-turbo"):
+async def submit(dataset, incremental, label_sets):
     try:
-        messages = [{"role": "user", "content": prompt}]
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=0.3,
+        return await job_manager.submit(
+            dataset=dataset, incremental=incremental, label_sets=label_sets
+        )
+    except UnknownLabelSets as e:
+        raise HTTPException(
+            status_code=404, detail=f"Unknown label sets: {', '.join(e.args[0])}"
         )
-        return response.choices[0].message.content
-    except Exception as e:
-        print(f"❌ GPT API error: {e}")
-        return ""
-
-
-def get_clustering_prompt(reviews_as_str):
-    return f"""Tu es un expert en traiteurs de mariage. \
-    Voici des avis de clients sur des traiteurs de mariage :\n{reviews_as_str}\n \
-    Propose-moi la liste la plus pertinente des 10 catégories thématiques pour classer ou regrouper des avis de clients sur des traiteurs de mariage. \
-    Renvoie uniquement une liste de mots ou expressions, sous forme de liste Python. Exemple : ["nourriture", "service", "ambiance", "ponctualité", "prix", "professionnalisme", "présentation"] etc. \
-    Ne donne pas d'explications, juste la liste. \
-    """
 
 
-def get_reviews_for_clustering_prompt(review_samples):
-    reviews_for_clustering_prompt = ""
-    for i, row in review_samples.iterrows():
-        reviews_for_clustering_prompt += f"[Avis {i+1}]: {row['text']}\n"
-    return reviews_for_clustering_prompt
-
-
-def get_ai_clusters(labels, scores):
-    aiClusters = []
-    for label, score in zip(labels, scores):
-        aiClusters.append({"label": label, "score": score})
-    return aiClusters
-
-
-def get_catering_with_reviews(db_model):
-    return list(
-        db_model.aggregate(
-            [
-                {
-                    "$group": {
-                        "_id": "$venue",
-                        "reviews": {
-                            "$push": {"text": "$text", "aiClusters": "$aiClusters"}
-                        },
-                    }
-                },
-                {
-                    "$lookup": {
-                        "from": "venues",
-                        "localField": "_id",
-                        "foreignField": "_id",
-                        "as": "venue_data",
-                    }
-                },
-                {
-                    "$project": {
-                        "_id": 0,
-                        "cateringCompanyId": {"$first": "$venue_data._id"},
-                        "cateringCompanyName": {"$first": "$venue_data.name"},
-                        "reviews": 1,
-                    }
-                },
-            ]
-        )
+@router.post("/summarize")
+async def updateReviews(
+    incremental: bool = False,
+    dataset: str = Depends(review_dataset),
+    label_sets: List[str] = Query([]),
+):
+    """
+    Start the summarize pipeline for `dataset` (or attach to the run already in
+    progress) and stream its progress. The run itself is a background job:
+    disconnecting does not stop it, see /reviews/jobs/{job_id}/stream to reattach.
+    `label_sets` are named label sets scored alongside the main one.
+    """
+    job_id, _ = await submit(dataset, incremental, label_sets)
+    return StreamingResponse(
+        job_manager.stream(job_id),
+        media_type="text/plain",
+        headers={"X-Job-Id": job_id},
     )
 
 
-def batch_reviews(reviews, batch_size=10):
-    for i in range(0, len(reviews), batch_size):
-        yield reviews[i : i + batch_size]
+@router.post("/jobs")
+async def submit_job(
+    incremental: bool = False,
+    dataset: str = Depends(review_dataset),
+    label_sets: List[str] = Query([]),
+):
+    job_id, created = await submit(dataset, incremental, label_sets)
+    return {"job_id": job_id, "created": created}
 
 
-@router.post("/summarize")
-def updateReviews():
-    def event_stream():
-        reviews = list(db["reviews"].find({}, {"_id": 1, "text": 1}))
-        yield f"🔍 {len(reviews)} reviews trouvés\n"
-
-        # ------------------------------------------------------------------ #
-        #           Étape 1 : Classification et Clustering des avis          #
-        # ------------------------------------------------------------------ #
-
-        # We retrieve a sample of reviews to clusterize them
-        df_sample = (
-            pd.DataFrame(reviews).sample(n=150, random_state=42).reset_index(drop=True)
-        )  # Sample for clustering
-        reviews_for_clustering_prompt = get_reviews_for_clustering_prompt(df_sample)
-        clustering_prompt = get_clustering_prompt(reviews_for_clustering_prompt)
-
-        suggested_labels = []
-
-        raw_labels = gpt_model(clustering_prompt)
-
-        if not raw_labels:
-            yield "❌ Aucune réponse obtenue depuis l'API OpenAI. Vérifie ta clé API, ta connexion ou ton quota.\n"
-            return
-
-        try:
-            suggested_labels = ast.literal_eval(raw_labels)
-            assert isinstance(suggested_labels, list)
-        except Exception as e:
-            yield f"❌ Erreur lors de l’analyse de la réponse : {e}\nRéponse GPT brute :\n{raw_labels}\n"
-            return
-
-        if not suggested_labels:
-            yield "❌ Aucune étiquette valide n’a été extraite. Abandon...\n"
-            return
-        else:
-            yield f"✅ Labels de clustering récupérés : {suggested_labels}\n"
-
-        for idx, review in enumerate(reviews):
-            text = review.get("text", "")
-
-            if not text:
-                continue
-
-            # ------------------------- Classification ------------------------- #
-
-            """
-            The first step is to classify each review with a sentiment analysis model.
-            Here, we use the classifier I built with Camembert. 
-            I have trained it and push it on Hugging Face so that it can be used in production.
-            The classifier is a simple text classification model that predicts the sentiment of each review.
-            It is a French model that predicts the sentiment of the review as either "positive", "negative" or "neutral".
-            """
-
-            sentiment = classifier(text)[0]
-
-            # --------------------------- Clustering --------------------------- #
-
-            """
-            The second step is to clusterize the reviews based on their content.
-            For this step, I will use 2 techniques : 
-                1. The first technique is about getting 10 labels based on the overall review tendency.
-                2. The second technique is about using DistilCamembert Zero-Shot to clusterize the reviews based on the labels obtained in the first step.
-            I am basically inducing the labels from the reviews themselves, so that they are more relevant to the dataset and to my specific needs.
-            """
-
-            clusterer_result = clusterer(
-                sequences=text,
-                candidate_labels=suggested_labels,
-                hypothesis_template="Cet avis concerne {}.",
-            )
-            ai_clusters = get_ai_clusters(
-                labels=clusterer_result["labels"], scores=clusterer_result["scores"]
-            )
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return convert_objectids(job)
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    if not await job_manager.cancel(job_id):
+        raise HTTPException(status_code=404, detail="No running job with this id")
+    return {"job_id": job_id, "cancel_requested": True}
 
-            # --------------------------- Update DB --------------------------- #
-
-            """
-            I update the review in the database with the sentiment and the clusters.
-            """
-
-            db["reviews"].update_one(
-                {"_id": review["_id"]},
-                {
-                    "$set": {
-                        "aiSentiment": sentiment["label"],
-                        "aiConfidenceScore": sentiment["score"],
-                        "aiClusters": ai_clusters,
-                    }
-                },
-            )
 
-            yield f"[{idx+1}/{len(reviews)}] Sentiment + clusters enregistrés\n"
-            time.sleep(0.1)  # Ici on met une pause pour ne pas surcharger l'API
-
-        yield "Résumés globaux par traiteur...\n"
-
-        # ------------------------------------------------------------------ #
-        #                         Step 2 : Summarize                         #
-        # ------------------------------------------------------------------ #
-
-        """
-        In this step, I will summarize the reviews for each catering company.
-        I will use the OpenAI GPT model to summarize the reviews.
-        The summary will be stored in the database for each catering company.
-        I will also use the reviews to generate a global score for each catering company.
-        """
-
-        catering_with_reviews = get_catering_with_reviews(db["reviews"])
-
-        for _, entry in enumerate(
-            tqdm(catering_with_reviews, desc="Processing catering companies")
-        ):
-            name = entry["cateringCompanyName"]
-            reviews = entry["reviews"]
-
-            summaries = []
-
-            # Batch processing of reviews to avoid hitting token limits
-            for batch in batch_reviews(reviews):
-                batch_text = ""
-
-                for r in batch:
-                    review_ai_clusters = ", ".join(
-                        [c["label"] for c in r.get("aiClusters", [])]
-                    )
-                    if r.get("text"):
-                        batch_text += (
-                            f"\n\n [AVIS] {r['text']} [CLUSTERS] {review_ai_clusters}"
-                        )
-
-                batch_prompt = f"""
-                Tu es un assistant d'analyse d'avis pour des traiteurs de mariage.
-
-                Voici un extrait d'avis avec les thèmes principaux de chaque avis pour le traiteur **{name}** :
-
-                {batch_text}
-
-                Résume les points importants en quelques phrases.
-                """
-                try:
-                    summaries.append(gpt_model(batch_prompt))
-                except Exception as e:
-                    yield f"Erreur GPT batch pour {name}: {e}"
-                    continue
-
-            full_summary = "\n\n".join(summaries)
-
-            final_prompt = f"""
-            Tu es un assistant d'analyse d'avis pour des traiteurs de mariage.
-
-            Voici les résumés intermédiaires des avis pour le traiteur **{name}** :
-
-            {full_summary}
-
-            Ta tâche :
-            1. Fais un résumé synthétique global des avis.
-            2. Analyse et synthétise les points majeurs évoqués (forces, faiblesses, répétitions...).
-            3. Attribue un score global subjectif sur 100 basé sur la qualité perçue.
-
-            ⚠️ Le format de sortie **doit être exactement** celui-ci :
-
-            Résumé : [texte ici]
-
-            Points clés : [texte ici]
-
-            Score global : [nombre entre 0 et 100]%
-
-            Exemple valide :
-            Résumé : Ce traiteur est connu pour sa qualité de service et la présentation des plats. Si vous souhaitez un repas raffiné, c'est le traiteur idéal. Cependant, certains ont trouvé les prix un peu élevés par rapport à d'autres traiteurs...
-            Points clés : Les invités ont particulièrement apprécié la qualité du service et la présentation des plats...
-            Score global : 88%
-            """
-
-            try:
-                result = gpt_model(final_prompt)
-                if (
-                    "Résumé :" in result
-                    and "Points clés :" in result
-                    and "Score global :" in result
-                ):
-                    parts = result.split("Score global :")
-                    if len(parts) == 2:
-                        core, score = parts
-                        summary, key_points = core.split("Points clés :", 1)
-                        summary = (
-                            summary.replace("Résumé :", "", 1).strip()
-                            if "Résumé :" in summary
-                            else summary.strip()
-                        )
-                        db["venues"].update_one(
-                            {"_id": entry["cateringCompanyId"]},
-                            {
-                                "$set": {
-                                    "aiSummary": summary.strip(),
-                                    "aiKeyPoints": key_points.strip(),
-                                    "aiGlobalScore": score.strip(),
-                                }
-                            },
-                        )
-                        yield f"Résumé pour {name} enregistré\n"
-                else:
-                    yield f"Résultat inattendu pour {name} : {result}\n"
-            except Exception as e:
-                yield f"Aïe ! Erreur GPT pour {name} : {e}\n"
-                continue
-
-        yield "Traitement terminé.\n"
-
-    return StreamingResponse(event_stream(), media_type="text/plain")
+@router.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str, offset: int = 0):
+    if await job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        job_manager.stream(job_id, offset), media_type="text/plain"
+    )
+
+
+@router.post("/analyze")
+async def analyze_reviews(request: AnalyzeRequest):
+    """
+    Sentiment and zero-shot clusters for one review (`text`) or a few (`texts`),
+    computed inline against the named `label_set` (by default the labels of the
+    last enrichment run of `dataset`). Concurrent calls are coalesced into micro-batches.
+    """
+    dataset = review_dataset(request.dataset)
+    texts = ([request.text] if request.text else []) + (request.texts or [])
+    texts = [text for text in texts if text and text.strip()]
+    if not texts:
+        raise HTTPException(status_code=422, detail="No review text provided")
+    if len(texts) > ANALYZE_MAX_REVIEWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {ANALYZE_MAX_REVIEWS} reviews per request, use /reviews/jobs for bulk runs",
+        )
+
+    label_set = await label_set_cache.get(get_db(), request.label_set, dataset)
+    if label_set is None:
+        raise HTTPException(status_code=404, detail=f"Unknown label set: {request.label_set}")
+
+    results = await analyzer.submit([(text, label_set) for text in texts])
+    return {
+        "labelSet": {"name": label_set["name"], "version": label_set["version"]},
+        "results": results,
+    }
+
+
+@router.get("/similar")
+async def similar_reviews(
+    review_id: Optional[str] = None,
+    text: Optional[str] = None,
+    k: int = Query(10, ge=1, le=SIMILAR_MAX_RESULTS),
+    dataset: str = Depends(review_dataset),
+):
+    """Reviews closest to an indexed review (`review_id`) or to a free `text`."""
+    if bool(review_id) == bool(text and text.strip()):
+        raise HTTPException(status_code=422, detail="Provide either review_id or text")
+
+    db = get_db()
+    # L'index est tenu à jour en arrière-plan : la requête ne fait que le lire
+    index = get_review_index(dataset)
+
+    exclude = ()
+    if review_id:
+        if not ObjectId.is_valid(review_id):
+            raise HTTPException(status_code=422, detail="Invalid review_id")
+        vector = index.get(review_id)
+        if vector is None:
+            review = await db[dataset].find_one(
+                {"_id": ObjectId(review_id)}, {"aiEmbedding": 1}
+            )
+            if review is None or review.get("aiEmbedding") is None:
+                raise HTTPException(status_code=404, detail="Review not found or not embedded yet")
+            vector = decode_embedding(review["aiEmbedding"])
+        exclude = (review_id,)
+    elif INFERENCE_WORKERS:
+        # Les modèles sont dans les workers d'inférence, pas dans l'API
+        vector = (await get_inference_pool().embed([text]))[0]
+    else:
+        vector = (
+            await run_in_threadpool(lambda: embed_batch(registry.get("embedder"), [text]))
+        )[0]
+
+    hits = await run_in_threadpool(index.similar_reviews, vector, k, exclude)
+    reviews = {
+        str(review["_id"]): review
+        async for review in db[dataset].find(
+            {"_id": {"$in": [ObjectId(key) for key, _ in hits]}},
+            {"text": 1, "venue": 1, "rating": 1, "aiSentiment": 1, "aiClusters": 1},
+        )
+    }
+    # Les avis supprimés depuis leur indexation sont ignorés et retirés de l'index
+    deleted = [key for key, _ in hits if key not in reviews]
+    if deleted:
+        index.remove(deleted)
+    results = [
+        {**reviews[key], "similarity": score} for key, score in hits if key in reviews
+    ]
+    return {"results": convert_objectids(results)}
+
+
+@router.get("/venues/{venue}/similar")
+async def similar_venues(
+    venue: str,
+    k: int = Query(5, ge=1, le=SIMILAR_MAX_RESULTS),
+    dataset: str = Depends(review_dataset),
+):
+    """Caterers whose reviews are, on average, closest to those of `venue`."""
+    db = get_db()
+    # L'index est tenu à jour en arrière-plan : la requête ne fait que le lire
+    index = get_review_index(dataset)
+
+    hits = await run_in_threadpool(index.similar_venues, venue, k)
+    if hits is None:
+        raise HTTPException(status_code=404, detail="No embedded reviews for this venue")
+
+    names = {
+        str(doc["_id"]): doc.get("name")
+        async for doc in db["venues"].find(
+            {"_id": {"$in": [parse_object_id(key) for key, _, _ in hits]}}, {"name": 1}
+        )
+    }
+    return {
+        "results": [
+            {"venue": key, "name": names.get(key), "similarity": score, "reviews": count}
+            for key, score, count in hits
+        ]
+    }
+
+
+@router.get("/venues/{venue}/stats")
+async def venue_stats(
+    venue: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(VENUE_REVIEWS_PAGE_SIZE, ge=1, le=100),
+    dataset: str = Depends(review_dataset),
+):
+    """
+    Materialized sentiment, score, cluster and rating statistics of a caterer,
+    with one page of its enriched reviews. No GPT call is involved.
+    """
+    db = get_db()
+    stats = await get_venue_stats(db, venue, dataset)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No enriched reviews for this venue")
+
+    query = {"venue": stats["_id"], "aiSentiment": {"$exists": True}}
+    cursor = (
+        db[dataset]
+        .find(
+            query,
+            {
+                "text": 1,
+                "rating": 1,
+                "date": 1,
+                "aiSentiment": 1,
+                "aiConfidenceScore": 1,
+                "aiClusters": {"$slice": 3},
+            },
+        )
+        .sort("_id", -1)
+        .skip((page - 1) * page_size)
+        .limit(page_size)
+    )
+    return convert_objectids(
+        {
+            "stats": stats,
+            "reviews": {
+                "page": page,
+                "page_size": page_size,
+                "total": stats["reviews"],
+                "items": await cursor.to_list(None),
+            },
+        }
+    )
@@ -0,0 +1,78 @@
+from starlette.concurrency import run_in_threadpool
+
+from app.config import CLUSTERER_MODEL, HYPOTHESIS_TEMPLATE, INFERENCE_WORKERS
+from app.services.inference import StageStats, classify_batch, cluster_batch
+from app.services.microbatch import MicroBatcher
+from app.services.pipeline import get_ai_clusters
+from app.services.registry import registry
+from app.services.workers import get_inference_pool
+from utils.pre_processing import merge_clusters, merge_sentiments, preprocess_batch
+
+_stats = StageStats("Analyse à la volée", stage="analyze", model=CLUSTERER_MODEL)
+
+
+def _classify(texts):
+    return classify_batch(registry.get("classifier"), texts)
+
+
+def _cluster(texts, labels):
+    return cluster_batch(registry.get("clusterer"), texts, labels, HYPOTHESIS_TEMPLATE)
+
+
+async def analyze_batch(items):
+    """
+    Analyze `(text, label_set)` items coalesced from concurrent requests.
+    Texts are classified together, then clustered per label set: each text is only
+    scored against its own labels, whose hypotheses are cached per label-set version.
+    """
+    texts = [text for text, _ in items]
+    prepared = preprocess_batch(texts)
+
+    groups = {}
+    for (_, label_set), positions in zip(items, prepared.chunks):
+        group = groups.setdefault(label_set["version"], (label_set["labels"], set()))
+        group[1].update(positions)
+
+    # Scores per label-set version and model input: a text shared by two requests
+    # with different label sets is clustered once per label set
+    scored = {version: {} for version in groups}
+    with _stats.measure(len(texts)):
+        if INFERENCE_WORKERS:
+            pool = get_inference_pool()
+            sentiments, _ = await pool.infer(prepared.inputs, None, HYPOTHESIS_TEMPLATE)
+            for version, (labels, positions) in groups.items():
+                positions = sorted(positions)
+                _, results = await pool.infer(
+                    [prepared.inputs[p] for p in positions],
+                    labels,
+                    HYPOTHESIS_TEMPLATE,
+                    classify=False,
+                )
+                scored[version].update(zip(positions, results))
+        else:
+            sentiments = await run_in_threadpool(_classify, prepared.inputs)
+            for version, (labels, positions) in groups.items():
+                positions = sorted(positions)
+                results = await run_in_threadpool(
+                    _cluster, [prepared.inputs[p] for p in positions], labels
+                )
+                scored[version].update(zip(positions, results))
+    sentiments = prepared.merge(sentiments, merge_sentiments)
+
+    clusters = []
+    for (_, label_set), positions in zip(items, prepared.chunks):
+        results = [scored[label_set["version"]][p] for p in positions]
+        clusters.append(results[0] if len(results) == 1 else merge_clusters(results))
+
+    return [
+        {
+            "text": text,
+            "aiSentiment": sentiment["label"],
+            "aiConfidenceScore": sentiment["score"],
+            "aiClusters": get_ai_clusters(result["labels"], result["scores"]),
+        }
+        for text, sentiment, result in zip(texts, sentiments, clusters)
+    ]
+
+
+analyzer = MicroBatcher(analyze_batch)
@@ -0,0 +1,183 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from app.config import REVIEWS_CURSOR_BATCH_SIZE, VENUE_STATS_BATCH_SIZE
+from app.db.bulk import BulkWriter
+from app.utils.converters import parse_object_id
+
+
+def sentiment_polarity(labels):
+    """Map classifier labels ("positive", "NEGATIVE", "neutre"...) to 1 / 0 / -1 (NaN if unknown)."""
+    prefixes = labels.astype(str).str.lower().str[:3]
+    return prefixes.map({"pos": 1.0, "neu": 0.0, "neg": -1.0})
+
+
+def rating_polarity(ratings):
+    """Sentiment expected from a 1-5 rating: 4-5 positive, 3 neutral, 1-2 negative."""
+    return pd.Series(
+        np.select([ratings >= 4, ratings >= 3], [1.0, 0.0], default=-1.0),
+        index=ratings.index,
+    ).where(ratings.notna())
+
+
+def to_score(polarity):
+    """Polarity in [-1, 1] as a 0-100 score."""
+    return round((polarity + 1) * 50, 1)
+
+
+def compute_cluster_stats(df):
+    """
+    Per-cluster sentiment, each review contributing to every cluster in proportion
+    to its zero-shot score (and to its sentiment confidence).
+    """
+    clusters = df[["polarity", "confidence", "aiClusters"]].explode("aiClusters").dropna()
+    if clusters.empty:
+        return []
+    clusters["label"] = clusters["aiClusters"].str["label"]
+    clusters["weight"] = clusters["aiClusters"].str["score"].astype(float) * clusters["confidence"]
+    clusters["weighted"] = clusters["weight"] * clusters["polarity"]
+
+    top_labels = df["aiClusters"].str[0].str["label"].value_counts()
+    grouped = clusters.groupby("label").agg(weight=("weight", "sum"), weighted=("weighted", "sum"))
+    grouped["polarity"] = grouped["weighted"] / grouped["weight"].where(grouped["weight"] > 0)
+    grouped = grouped.sort_values("weight", ascending=False)
+
+    return [
+        {
+            "label": label,
+            "reviews": int(top_labels.get(label, 0)),
+            "weight": round(float(row.weight), 4),
+            "polarity": round(float(row.polarity), 4) if pd.notna(row.polarity) else None,
+            "score": to_score(float(row.polarity)) if pd.notna(row.polarity) else None,
+        }
+        for label, row in grouped.iterrows()
+    ]
+
+
+def compute_venue_stats(reviews):
+    """Sentiment, score, per-cluster and rating statistics of one venue's enriched reviews."""
+    df = pd.DataFrame(reviews)
+    for column in ("aiSentiment", "aiConfidenceScore", "aiClusters", "rating"):
+        if column not in df:
+            df[column] = None
+    df = df[df["aiSentiment"].notna()].copy()
+    if df.empty:
+        return None
+
+    df["polarity"] = sentiment_polarity(df["aiSentiment"])
+    df["confidence"] = pd.to_numeric(df["aiConfidenceScore"], errors="coerce").fillna(0.0)
+    df["aiClusters"] = df["aiClusters"].apply(lambda c: c if isinstance(c, list) else [])
+    scored = df[df["polarity"].notna()]
+
+    counts = df["aiSentiment"].astype(str).str.lower().value_counts()
+    distribution = {label: int(counts.get(label, 0)) for label in counts.index}
+    total_weight = scored["confidence"].sum()
+    polarity = (
+        float((scored["polarity"] * scored["confidence"]).sum() / total_weight)
+        if total_weight > 0
+        else None
+    )
+
+    ratings = pd.to_numeric(df["rating"], errors="coerce")
+    rated = df[ratings.notna() & df["polarity"].notna()]
+    rated_ratings = ratings[rated.index]
+    rating_stats = {"reviews": int(len(rated)), "mean": None, "agreement": None, "correlation": None}
+    if len(rated):
+        rating_stats["mean"] = round(float(rated_ratings.mean()), 2)
+        rating_stats["agreement"] = round(
+            float((rating_polarity(rated_ratings) == rated["polarity"]).mean()), 4
+        )
+        # La corrélation n'a de sens que si notes et sentiments varient tous les deux
+        if rated_ratings.nunique() > 1 and rated["polarity"].nunique() > 1:
+            rating_stats["correlation"] = round(float(rated_ratings.corr(rated["polarity"])), 4)
+
+    return {
+        "reviews": int(len(df)),
+        "sentiment": {
+            "counts": distribution,
+            "shares": {label: round(count / len(df), 4) for label, count in distribution.items()},
+        },
+        "meanConfidence": round(float(df["confidence"].mean()), 4),
+        "polarity": round(polarity, 4) if polarity is not None else None,
+        "score": to_score(polarity) if polarity is not None else None,
+        "clusters": compute_cluster_stats(scored),
+        "rating": rating_stats,
+    }
+
+
+def venue_stats_key(dataset, venue):
+    """`venue_stats` key: a caterer's stats are kept apart for each review collection."""
+    # L'ordre des champs compte pour l'égalité d'un _id document : toujours construit ici
+    return {"dataset": dataset, "venue": venue}
+
+
+async def refresh_venue_stats(db, dataset="reviews", venue_ids=None, batch_size=VENUE_STATS_BATCH_SIZE):
+    """
+    Recompute and materialize the `venue_stats` of `dataset` for `venue_ids` (every
+    venue if None), `batch_size` venues at a time. Returns the number of venues refreshed.
+    """
+    if venue_ids is None:
+        venue_ids = await db[dataset].distinct("venue", {"venue": {"$ne": None}})
+    venue_ids = list(venue_ids)
+
+    writer = BulkWriter(db["venue_stats"])
+    refreshed = 0
+    for i in range(0, len(venue_ids), batch_size):
+        batch = venue_ids[i : i + batch_size]
+        cursor = (
+            db[dataset]
+            .find(
+                {"venue": {"$in": batch}, "aiSentiment": {"$exists": True}},
+                {
+                    "_id": 0,
+                    "venue": 1,
+                    "rating": 1,
+                    "aiSentiment": 1,
+                    "aiConfidenceScore": 1,
+                    "aiClusters": 1,
+                },
+            )
+            .batch_size(REVIEWS_CURSOR_BATCH_SIZE)
+        )
+        by_venue = {}
+        async for review in cursor:
+            by_venue.setdefault(review["venue"], []).append(review)
+
+        updated_at = datetime.now(timezone.utc)
+        for venue, reviews in by_venue.items():
+            stats = compute_venue_stats(reviews)
+            if stats is None:
+                continue
+            await writer.set(
+                {"_id": venue_stats_key(dataset, venue)},
+                {**stats, "dataset": dataset, "venue": venue, "updatedAt": updated_at},
+                upsert=True,
+            )
+            refreshed += 1
+
+        # Traiteurs sans avis enrichi : leurs statistiques ne sont plus valables
+        gone = [venue for venue in batch if venue not in by_venue]
+        if gone:
+            await db["venue_stats"].delete_many(
+                {"_id": {"$in": [venue_stats_key(dataset, venue) for venue in gone]}}
+            )
+
+    await writer.flush()
+    return refreshed
+
+
+async def get_venue_stats(db, venue, dataset="reviews"):
+    """
+    Materialized stats of `venue` in `dataset`, computed on the fly (and stored) if
+    missing. The returned document is keyed by the venue id alone.
+    """
+    venue = parse_object_id(venue)
+    key = {"_id": venue_stats_key(dataset, venue)}
+    stats = await db["venue_stats"].find_one(key)
+    if stats is None and await refresh_venue_stats(db, dataset, [venue]):
+        stats = await db["venue_stats"].find_one(key)
+    if stats is not None:
+        stats["_id"] = venue
+    return stats
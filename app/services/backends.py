@@ -0,0 +1,116 @@
+import fcntl
+import os
+import shutil
+import tempfile
+
+from app.config import INFERENCE_BACKEND, INFERENCE_QUANTIZE, ONNX_CACHE_DIR
+
+BACKENDS = ("torch", "onnx")
+# Présent seulement dans un export complet
+COMPLETE_MARKER = ".complete"
+
+
+def onnx_export_dir(model_name, suffix=""):
+    return os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "__") + suffix)
+
+
+def _build_once(target_dir, build):
+    """
+    Run `build(tmp_dir)` unless `target_dir` already holds a complete build. The API
+    and the pool workers start together: a file lock lets a single process build,
+    into a temporary directory renamed into place once complete, so no process
+    ever loads a half-written model.
+    """
+    marker = os.path.join(target_dir, COMPLETE_MARKER)
+    if os.path.exists(marker):
+        return target_dir
+
+    os.makedirs(ONNX_CACHE_DIR, exist_ok=True)
+    with open(f"{target_dir}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(marker):
+            # Construit par un autre processus pendant l'attente du verrou
+            return target_dir
+        if os.path.isdir(target_dir):
+            # Export interrompu (ou antérieur au marqueur) : refait
+            shutil.rmtree(target_dir)
+        tmp_dir = tempfile.mkdtemp(dir=ONNX_CACHE_DIR, prefix=f"{os.path.basename(target_dir)}.")
+        try:
+            build(tmp_dir)
+            open(os.path.join(tmp_dir, COMPLETE_MARKER), "w").close()
+            os.replace(tmp_dir, target_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+    return target_dir
+
+
+def _export_onnx(model_class, model_name, export_dir):
+    """Export the model to ONNX once; later loads read the cached export."""
+
+    def export(tmp_dir):
+        print(f"📦 Export ONNX de {model_name} vers {export_dir}")
+        model = model_class.from_pretrained(model_name, export=True)
+        model.save_pretrained(tmp_dir)
+
+    return _build_once(export_dir, export)
+
+
+def _quantize_onnx(model_name, export_dir):
+    from optimum.onnxruntime import ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    def quantize(tmp_dir):
+        print(f"📦 Quantification int8 dynamique de {model_name}")
+        quantizer = ORTQuantizer.from_pretrained(export_dir)
+        quantizer.quantize(
+            save_dir=tmp_dir,
+            quantization_config=AutoQuantizationConfig.avx2(
+                is_static=False, per_channel=False
+            ),
+        )
+
+    return _build_once(onnx_export_dir(model_name, "-int8"), quantize)
+
+
+def load_sequence_classifier(
+    model_name, backend=INFERENCE_BACKEND, quantize=INFERENCE_QUANTIZE
+):
+    """Load a sequence classification model with the configured backend."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+
+    if backend == "torch":
+        from transformers import AutoModelForSequenceClassification
+
+        return AutoModelForSequenceClassification.from_pretrained(model_name)
+
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+
+    export_dir = _export_onnx(
+        ORTModelForSequenceClassification, model_name, onnx_export_dir(model_name)
+    )
+    if quantize:
+        return ORTModelForSequenceClassification.from_pretrained(
+            _quantize_onnx(model_name, export_dir), file_name="model_quantized.onnx"
+        )
+    return ORTModelForSequenceClassification.from_pretrained(export_dir)
+
+
+def load_encoder(model_name, model, backend=INFERENCE_BACKEND):
+    """
+    Encoder returning `last_hidden_state`, used for embeddings.
+    With torch it is the classifier's own base model; with ONNX a separate
+    feature-extraction graph is exported (not quantized, embeddings are more sensitive).
+    """
+    if backend == "torch":
+        return model.base_model
+
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+
+    export_dir = _export_onnx(
+        ORTModelForFeatureExtraction,
+        model_name,
+        onnx_export_dir(model_name, "-features"),
+    )
+    return ORTModelForFeatureExtraction.from_pretrained(export_dir)
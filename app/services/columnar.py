@@ -0,0 +1,223 @@
+import glob
+import math
+import os
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from bson import ObjectId, json_util
+
+from app.config import (
+    COLUMNAR_ROWS_PER_FILE,
+    REVIEWS_CHUNK_SIZE,
+    REVIEWS_CURSOR_BATCH_SIZE,
+)
+from app.db.bulk import BulkWriter
+from app.db.mongo import iter_chunks
+from app.utils.converters import parse_object_id
+
+CLUSTERS_TYPE = pa.list_(pa.struct([("label", pa.string()), ("score", pa.float64())]))
+STRINGS_TYPE = pa.list_(pa.string())
+
+# Colonnes typées ; les autres champs d'un document sont conservés dans la colonne "extra" (JSON étendu)
+SCHEMAS = {
+    "reviews": pa.schema(
+        [
+            ("_id", pa.string()),
+            ("venue", pa.string()),
+            ("author", pa.string()),
+            ("rating", pa.int64()),
+            ("text", pa.string()),
+            ("source", pa.string()),
+            ("aiSentiment", pa.string()),
+            ("aiConfidenceScore", pa.float64()),
+            ("aiClusters", CLUSTERS_TYPE),
+            ("aiContentHash", pa.string()),
+            ("aiEnrichmentVersion", pa.string()),
+            ("aiEmbedding", pa.binary()),
+            ("aiEmbeddingHash", pa.string()),
+            ("aiEmbeddedAt", pa.timestamp("ms", tz="UTC")),
+            ("extra", pa.string()),
+        ]
+    ),
+    "venues": pa.schema(
+        [
+            ("_id", pa.string()),
+            ("name", pa.string()),
+            ("aiSummary", pa.string()),
+            ("aiKeyPoints", STRINGS_TYPE),
+            ("aiStrengths", STRINGS_TYPE),
+            ("aiWeaknesses", STRINGS_TYPE),
+            ("aiGlobalScore", pa.float64()),
+            ("extra", pa.string()),
+        ]
+    ),
+}
+OBJECT_ID_COLUMNS = {"_id", "venue"}
+EXTENSIONS = {"parquet": "parquet", "arrow": "arrow"}
+
+
+def _coerce(value, type_):
+    """Value converted to the column type, or raises ValueError/TypeError."""
+    if value is None:
+        return None
+    if isinstance(value, ObjectId):
+        return str(value)
+    if pa.types.is_integer(type_):
+        if isinstance(value, float) and math.isnan(value):
+            return None
+        # Entier nullable : une note manquante ne transforme pas la colonne en float64
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not float(value).is_integer():
+            raise TypeError(type(value).__name__)
+        return int(value)
+    if pa.types.is_floating(type_):
+        if isinstance(value, str):
+            # Anciens scores textuels ("88%") : conservés dans "extra"
+            raise TypeError(type(value).__name__)
+        return float(value)
+    if pa.types.is_list(type_) and not isinstance(value, list):
+        raise TypeError(type(value).__name__)
+    if pa.types.is_string(type_) and not isinstance(value, str):
+        raise TypeError(type(value).__name__)
+    if pa.types.is_binary(type_):
+        return bytes(value)
+    return value
+
+
+def to_row(doc, schema):
+    row, extra = {}, {}
+    for field in schema:
+        if field.name == "extra":
+            continue
+        try:
+            row[field.name] = _coerce(doc.get(field.name), field.type)
+        except (TypeError, ValueError):
+            # Valeur d'un type inattendu : conservée telle quelle dans "extra"
+            row[field.name] = None
+            extra[field.name] = doc[field.name]
+    extra.update({k: v for k, v in doc.items() if k not in schema.names})
+    row["extra"] = json_util.dumps(extra) if extra else None
+    return row
+
+
+def from_row(row):
+    extra = row.pop("extra", None)
+    doc = {k: v for k, v in row.items() if v is not None}
+    for name in OBJECT_ID_COLUMNS & doc.keys():
+        doc[name] = parse_object_id(doc[name])
+    if extra:
+        doc.update(json_util.loads(extra))
+    return doc
+
+
+class _PartWriter:
+    """Writes row groups to numbered part files, starting a new file every `rows_per_file` rows."""
+
+    def __init__(self, directory, schema, fmt, rows_per_file):
+        self.directory = directory
+        self.schema = schema
+        self.fmt = fmt
+        self.rows_per_file = rows_per_file
+        self.part = 0
+        self.rows_in_file = 0
+        self._sink = None
+        self._writer = None
+
+    def _open(self):
+        path = os.path.join(self.directory, f"part-{self.part:05d}.{EXTENSIONS[self.fmt]}")
+        if self.fmt == "parquet":
+            self._writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        else:
+            # IPC non compressé : relu par memmap sans copie
+            self._sink = pa.OSFile(path, "wb")
+            self._writer = pa.ipc.new_file(self._sink, self.schema)
+
+    def write(self, table):
+        if self._writer is None:
+            self._open()
+        self._writer.write_table(table)
+        self.rows_in_file += table.num_rows
+        if self.rows_in_file >= self.rows_per_file:
+            self.close()
+            self.part += 1
+            self.rows_in_file = 0
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+
+async def export_collection(
+    db,
+    collection,
+    directory,
+    kind=None,
+    fmt="parquet",
+    query=None,
+    chunk_size=REVIEWS_CHUNK_SIZE,
+    rows_per_file=COLUMNAR_ROWS_PER_FILE,
+):
+    """
+    Stream `collection` to `directory` as part files of `fmt` ("parquet" or "arrow"),
+    one row group per chunk of `chunk_size` documents. `kind` ("reviews" or "venues")
+    selects the schema and defaults to the collection name. Returns the number of rows.
+    """
+    schema = SCHEMAS[kind or collection]
+    os.makedirs(directory, exist_ok=True)
+    for path in part_files(directory, fmt):
+        os.remove(path)
+
+    cursor = db[collection].find(query or {}).batch_size(REVIEWS_CURSOR_BATCH_SIZE)
+    writer = _PartWriter(directory, schema, fmt, rows_per_file)
+    rows = 0
+    try:
+        async for chunk in iter_chunks(cursor, chunk_size):
+            writer.write(pa.Table.from_pylist([to_row(doc, schema) for doc in chunk], schema))
+            rows += len(chunk)
+    finally:
+        writer.close()
+    return rows
+
+
+def part_files(directory, fmt):
+    return sorted(glob.glob(os.path.join(directory, f"part-*.{EXTENSIONS[fmt]}")))
+
+
+def open_dataset(directory, fmt="parquet"):
+    """Lazy dataset over the part files: scans stream record batches instead of loading everything."""
+    return ds.dataset(part_files(directory, fmt), format="ipc" if fmt == "arrow" else "parquet")
+
+
+def read_table(directory, fmt="arrow", columns=None):
+    """
+    Whole export as one table. Arrow IPC parts are memory-mapped and read without
+    copying (the OS pages data in on access); Parquet parts are memory-mapped but
+    still decoded.
+    """
+    paths = part_files(directory, fmt)
+    if fmt == "parquet":
+        tables = [pq.read_table(path, columns=columns, memory_map=True) for path in paths]
+    else:
+        tables = []
+        for path in paths:
+            table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+            tables.append(table.select(columns) if columns else table)
+    return pa.concat_tables(tables) if tables else None
+
+
+async def import_collection(db, collection, directory, fmt="parquet", batch_size=REVIEWS_CHUNK_SIZE):
+    """Upsert the rows of an export into `collection`, one record batch at a time."""
+    rows = 0
+    async with BulkWriter(db[collection]) as writer:
+        for batch in open_dataset(directory, fmt).to_batches(batch_size=batch_size):
+            for row in batch.to_pylist():
+                doc = from_row(row)
+                filter = {"_id": doc.pop("_id")}
+                if doc:
+                    await writer.set(filter, doc, upsert=True)
+            rows += batch.num_rows
+    return rows
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import (
+    GPT_CACHE_ACCESS_FLUSH_EVERY,
+    GPT_CACHE_ENABLED,
+    GPT_CACHE_EVICT_EVERY,
+    GPT_CACHE_MAX_ENTRIES,
+    GPT_CACHE_PATH,
+    GPT_CACHE_TTL,
+)
+
+
+def cache_key(model, temperature, prompt, variant=None):
+    """`variant` tells apart answers to the same prompt in another output format."""
+    fields = {"model": model, "temperature": temperature, "prompt": prompt}
+    if variant is not None:
+        fields["variant"] = variant
+    payload = json.dumps(fields, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GptCache:
+    """
+    Content-addressed cache of GPT answers stored in SQLite.
+    Entries expire after `ttl` seconds; past `max_entries`, the least recently
+    used entries are evicted. Access times are written in batches of
+    `access_flush_every` and eviction runs every `evict_every` inserts, so the
+    cache may briefly hold up to `evict_every` entries too many.
+
+    The methods block on SQLite: from the event loop, use `aget` and `aset`.
+    """
+
+    def __init__(
+        self,
+        path=GPT_CACHE_PATH,
+        ttl=GPT_CACHE_TTL,
+        max_entries=GPT_CACHE_MAX_ENTRIES,
+        access_flush_every=GPT_CACHE_ACCESS_FLUSH_EVERY,
+        evict_every=GPT_CACHE_EVICT_EVERY,
+    ):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.access_flush_every = access_flush_every
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self._accessed = {}
+        self._inserts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, model, temperature, prompt, variant=None):
+        key = cache_key(model, temperature, prompt, variant)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._accessed[key] = now
+            if len(self._accessed) >= self.access_flush_every:
+                self._flush_accessed()
+                self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, model, temperature, prompt, response, variant=None):
+        key = cache_key(model, temperature, prompt, variant)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._accessed.pop(key, None)
+            self._inserts += 1
+            if self._inserts % self.evict_every == 0:
+                self._flush_accessed()
+                self._evict(now)
+            self._conn.commit()
+
+    async def aget(self, model, temperature, prompt, variant=None):
+        return await run_in_threadpool(self.get, model, temperature, prompt, variant)
+
+    async def aset(self, model, temperature, prompt, response, variant=None):
+        await run_in_threadpool(self.set, model, temperature, prompt, response, variant)
+
+    def flush(self):
+        """Write the pending access times (e.g. before the process exits)."""
+        with self._lock:
+            self._flush_accessed()
+            self._conn.commit()
+
+    def _flush_accessed(self):
+        if self._accessed:
+            self._conn.executemany(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._accessed.items()],
+            )
+            self._accessed = {}
+
+    def _evict(self, now):
+        self._conn.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+        )
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                """
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?
+                )
+                """,
+                (count - self.max_entries,),
+            )
+
+    def stats(self):
+        with self._lock:
+            self._flush_accessed()
+            self._conn.commit()
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def __str__(self):
+        return f"Cache GPT : {self.hits} hits / {self.misses} misses"
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_gpt_cache():
+    """
+    The process-wide cache, opened on first use (importing the pipeline touches
+    no file), or None when GPT_CACHE_ENABLED is off.
+    """
+    global _cache
+    if not GPT_CACHE_ENABLED:
+        return None
+    # Appelé depuis le threadpool (découverte des labels) : une seule connexion SQLite
+    with _cache_lock:
+        if _cache is None:
+            _cache = GptCache()
+    return _cache
@@ -0,0 +1,85 @@
+import hashlib
+import json
+
+from app.config import (
+    CASCADE_ENABLED,
+    CASCADE_SKIP_CONFIDENCE,
+    CASCADE_SKIP_MAX_CHARS,
+    CASCADE_TOP_K,
+    CLASSIFIER_MODEL,
+    CLUSTERER_MODEL,
+    EMBEDDINGS_ENABLED,
+    HYPOTHESIS_TEMPLATE,
+    INFERENCE_BACKEND,
+    INFERENCE_MAX_LENGTH,
+    INFERENCE_QUANTIZE,
+    PREPROCESS_ENABLED,
+    PREPROCESS_LONG_TEXT,
+    PREPROCESS_MAX_CHARS,
+    PREPROCESS_MAX_CHUNKS,
+    REVIEW_DATASETS,
+    ZERO_SHOT_MODE,
+)
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def enrichment_version(labels, label_sets=()):
+    """
+    Fingerprint of everything that changes the enrichment output besides the text itself.
+    `label_sets` are the named label sets scored alongside `labels`.
+    """
+    fingerprint = {
+        "classifier": CLASSIFIER_MODEL,
+        "clusterer": CLUSTERER_MODEL,
+        "mode": ZERO_SHOT_MODE,
+        "template": HYPOTHESIS_TEMPLATE,
+        "labels": list(labels),
+        # La quantification int8 ne garantit que l'accord des labels, pas des scores
+        "backend": [
+            INFERENCE_BACKEND,
+            INFERENCE_QUANTIZE and INFERENCE_BACKEND != "torch",
+            INFERENCE_MAX_LENGTH,
+        ],
+    }
+    if label_sets:
+        fingerprint["label_sets"] = {s["name"]: s["version"] for s in label_sets}
+    if CASCADE_ENABLED:
+        fingerprint["cascade"] = [CASCADE_SKIP_CONFIDENCE, CASCADE_SKIP_MAX_CHARS, CASCADE_TOP_K]
+    if PREPROCESS_ENABLED:
+        # La normalisation et le découpage des textes longs changent les entrées des modèles
+        fingerprint["preprocess"] = [PREPROCESS_LONG_TEXT, PREPROCESS_MAX_CHARS, PREPROCESS_MAX_CHUNKS]
+    payload = json.dumps(fingerprint, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def needs_enrichment(review, version):
+    text_hash = content_hash(review["text"])
+    return (
+        review.get("aiContentHash") != text_hash
+        or review.get("aiEnrichmentVersion") != version
+        or (EMBEDDINGS_ENABLED and review.get("aiEmbeddingHash") != text_hash)
+    )
+
+
+def current_labels_key(dataset):
+    """`label_sets` key of the labels of the last enrichment run of `dataset`."""
+    return {"kind": "current", "dataset": dataset}
+
+
+async def get_current_labels(db, dataset="reviews"):
+    label_set = await db["label_sets"].find_one({"_id": current_labels_key(dataset)})
+    if label_set is None and dataset == REVIEW_DATASETS[0]:
+        # Document unique des versions précédentes : repris par la collection principale
+        label_set = await db["label_sets"].find_one({"_id": "default"})
+    return label_set["labels"] if label_set else None
+
+
+async def save_current_labels(db, dataset, labels):
+    await db["label_sets"].update_one(
+        {"_id": current_labels_key(dataset)},
+        {"$set": {"labels": list(labels), "version": enrichment_version(labels)}},
+        upsert=True,
+    )
@@ -0,0 +1,201 @@
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+from app.config import (
+    CASCADE_SKIP_CONFIDENCE,
+    CASCADE_SKIP_MAX_CHARS,
+    CASCADE_TOP_K,
+    CLASSIFIER_MODEL,
+    CLUSTERER_MODEL,
+    INFERENCE_BACKEND,
+    INFERENCE_BATCH_SIZE,
+    INFERENCE_MAX_LENGTH,
+    INFERENCE_QUANTIZE,
+    INFERENCE_THREADS,
+)
+from app.services.metrics import INFERENCE_SECONDS, REVIEWS_PROCESSED, record_error, span
+
+
+def load_classifier(backend=INFERENCE_BACKEND, quantize=INFERENCE_QUANTIZE):
+    from transformers import AutoTokenizer, pipeline
+
+    from app.services.backends import load_sequence_classifier
+
+    return pipeline(
+        "text-classification",
+        model=load_sequence_classifier(CLASSIFIER_MODEL, backend, quantize),
+        tokenizer=AutoTokenizer.from_pretrained(
+            CLASSIFIER_MODEL, model_max_length=INFERENCE_MAX_LENGTH
+        ),
+    )
+
+
+def load_clusterer(backend=INFERENCE_BACKEND, quantize=INFERENCE_QUANTIZE):
+    from app.services.zero_shot import ZeroShotEngine
+
+    return ZeroShotEngine(CLUSTERER_MODEL, backend=backend, quantize=quantize)
+
+
+def pin_torch_threads(threads=INFERENCE_THREADS):
+    import torch
+
+    torch.set_num_threads(threads)
+
+
+class StageStats:
+    """Accumulates the number of reviews processed by a stage and the time spent."""
+
+    def __init__(self, name, stage=None, model=None):
+        self.name = name
+        self.stage = stage
+        self.model = model or ""
+        self.count = 0
+        self.seconds = 0.0
+
+    @contextmanager
+    def measure(self, count):
+        """Time one batch; with a `stage`, also export it as metrics and a span."""
+        traced = (
+            span(f"inference.{self.stage}", model=self.model, reviews=count)
+            if self.stage
+            else nullcontext()
+        )
+        start = perf_counter()
+        try:
+            with traced:
+                yield
+        except Exception as e:
+            if self.stage:
+                record_error(self.stage, e)
+            raise
+        finally:
+            seconds = perf_counter() - start
+            self.seconds += seconds
+            self.count += count
+            if self.stage:
+                INFERENCE_SECONDS.labels(self.stage, self.model).observe(seconds)
+                REVIEWS_PROCESSED.labels(self.stage, self.model).inc(count)
+
+    @property
+    def rate(self):
+        return self.count / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return f"{self.name} : {self.count} avis en {self.seconds:.1f}s ({self.rate:.1f} avis/s)"
+
+
+def length_buckets(reviews, batch_size=INFERENCE_BATCH_SIZE):
+    """
+    Sort reviews by text length and cut them into micro-batches.
+    Reviews of similar length end up together, so padding inside a batch stays minimal.
+    Character length is used as a cheap proxy for the token length.
+    """
+    ordered = sorted(reviews, key=lambda r: len(r["text"]))
+    for i in range(0, len(ordered), batch_size):
+        yield ordered[i : i + batch_size]
+
+
+def classify_batch(classifier, texts, max_length=INFERENCE_MAX_LENGTH):
+    return classifier(
+        texts, batch_size=len(texts), truncation=True, max_length=max_length
+    )
+
+
+def cluster_batch(clusterer, texts, candidate_labels, hypothesis_template):
+    results = clusterer(
+        sequences=texts,
+        candidate_labels=candidate_labels,
+        hypothesis_template=hypothesis_template,
+        batch_size=len(texts),
+    )
+    # The pipeline returns a dict instead of a list for a single sequence
+    return results if isinstance(results, list) else [results]
+
+
+def cluster_many(clusterer, texts, label_sets, hypothesis_template):
+    """`cluster_batch` for each label set, in a single model pass when the engine supports it."""
+    if hasattr(clusterer, "classify_many"):
+        return clusterer.classify_many(
+            texts, label_sets, hypothesis_template, batch_size=len(texts)
+        )
+    return [
+        cluster_batch(clusterer, texts, labels, hypothesis_template) for labels in label_sets
+    ]
+
+
+def needs_nli(
+    text,
+    sentiment,
+    skip_confidence=CASCADE_SKIP_CONFIDENCE,
+    skip_max_chars=CASCADE_SKIP_MAX_CHARS,
+):
+    """Cascade gate: only short reviews whose sentiment is confidently classified skip the NLI pass."""
+    return not (
+        sentiment is not None
+        and len(text) <= skip_max_chars
+        and sentiment["score"] >= skip_confidence
+    )
+
+
+def cascade_many(
+    clusterer,
+    texts,
+    label_sets,
+    hypothesis_template,
+    sentiments=None,
+    skip_confidence=CASCADE_SKIP_CONFIDENCE,
+    skip_max_chars=CASCADE_SKIP_MAX_CHARS,
+    top_k=CASCADE_TOP_K,
+):
+    """
+    `cluster_many` in cascade. Every text is first ranked against the labels by
+    embedding similarity (one encoder pass). Texts that pass the `needs_nli` gate
+    (with their classifier `sentiments`) are then scored by the NLI cross-encoder
+    on their `top_k` best-ranked labels only (all labels when `top_k` is 0), the
+    other labels keeping a score of 0. Returns the results and the number of texts
+    that went through NLI.
+    """
+    ranked = clusterer.classify_many(
+        texts, label_sets, hypothesis_template, batch_size=len(texts), mode="bi-encoder"
+    )
+    sentiments = sentiments or [None] * len(texts)
+    gated = [
+        i
+        for i, (text, sentiment) in enumerate(zip(texts, sentiments))
+        if needs_nli(text, sentiment, skip_confidence, skip_max_chars)
+    ]
+    if not gated or clusterer.mode == "bi-encoder":
+        return ranked, 0
+
+    results = [list(set_results) for set_results in ranked]
+    for set_results, labels in zip(results, label_sets):
+        candidates = [
+            set_results[i]["labels"][:top_k] if top_k else list(labels) for i in gated
+        ]
+        scored = clusterer.classify_each(
+            [texts[i] for i in gated],
+            labels,
+            candidates,
+            hypothesis_template,
+            batch_size=len(gated),
+        )
+        for i, result, shortlist in zip(gated, scored, candidates):
+            rest = [label for label in labels if label not in shortlist]
+            set_results[i] = {
+                "sequence": result["sequence"],
+                "labels": result["labels"] + rest,
+                "scores": result["scores"] + [0.0] * len(rest),
+            }
+    return results, len(gated)
+
+
+def cluster_sets(clusterer, texts, label_sets, hypothesis_template, sentiments=None, cascade=False):
+    """`cluster_many`, or `cascade_many` when `cascade` is on and the clusterer supports it."""
+    if cascade and hasattr(clusterer, "classify_each"):
+        return cascade_many(clusterer, texts, label_sets, hypothesis_template, sentiments)[0]
+    return cluster_many(clusterer, texts, label_sets, hypothesis_template)
+
+
+def embed_batch(embedder, texts):
+    """L2-normalised embeddings as a float16 array, compact enough to be stored with each review."""
+    return embedder.embed(texts).half().numpy()
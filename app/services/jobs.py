@@ -0,0 +1,455 @@
+import asyncio
+import os
+import socket
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.config import JOB_LEASE_SECONDS
+from app.db.mongo import get_db
+from app.services.label_sets import get_label_set
+from app.services.pipeline import run_pipeline
+
+FINISHED = ("completed", "failed", "cancelled")
+# Le bail est renouvelé plusieurs fois par période pour tolérer une écriture lente
+HEARTBEAT_SECONDS = max(JOB_LEASE_SECONDS / 4, 1)
+
+
+def now():
+    return datetime.now(timezone.utc)
+
+
+class UnknownLabelSets(LookupError):
+    """Named label sets requested for a job that do not exist."""
+
+
+class LeaseLost(Exception):
+    """The job's lease was taken over by another worker: this process must stop writing to it."""
+
+
+class DatasetBusy(Exception):
+    """Another job or command-line run holds the lease of the dataset."""
+
+    def __init__(self, dataset, job_id):
+        super().__init__(f"Un job est déjà actif sur {dataset} : {job_id}")
+        self.dataset = dataset
+        self.job_id = job_id
+
+
+class Job:
+    """In-memory handle on a job running in this process."""
+
+    def __init__(self, doc):
+        self.id = str(doc["_id"])
+        self.dataset = doc["dataset"]
+        self.incremental = doc.get("incremental", False)
+        self.label_sets = doc.get("label_sets", [])
+        self.state = doc.get("checkpoint") or {}
+        self.events = list(doc.get("events", []))
+        self.status = doc.get("status", "queued")
+        self.cancel_requested = False
+        self.lease_lost = False
+        self.task = None
+        self.heartbeat = None
+        self._changed = asyncio.Condition()
+
+    async def emit(self, message):
+        self.events.append(message)
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def finish(self, status):
+        self.status = status
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def stream(self, offset=0):
+        """Replay events from `offset`, then follow the job until it finishes."""
+        while True:
+            while offset < len(self.events):
+                yield self.events[offset]
+                offset += 1
+            if self.done:
+                return
+            async with self._changed:
+                await self._changed.wait_for(lambda: offset < len(self.events) or self.done)
+
+    @property
+    def done(self):
+        return self.status in FINISHED or self.lease_lost
+
+
+class JobManager:
+    """
+    Runs summarize pipelines as background tasks, one active job per dataset.
+
+    Jobs are persisted in the `jobs` collection: the unique partial index on
+    `dataset` (for `active` jobs) prevents two processes from running the same
+    dataset, and the lease (`owner`, `heartbeat_at`) lets a restarted worker
+    take over a job whose process died, resuming from its last checkpoint.
+    The lease is renewed by a heartbeat task while the job runs, and every write
+    of the runner is conditioned on still owning it.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{ObjectId()}"
+
+    @property
+    def collection(self):
+        return get_db()["jobs"]
+
+    async def ensure_indexes(self):
+        await self.collection.create_index(
+            "dataset", unique=True, partialFilterExpression={"active": True}
+        )
+
+    async def submit(self, dataset="reviews", incremental=False, label_sets=()):
+        """
+        Start a job for `dataset`, or return the one already running. Returns (job_id, created).
+        `label_sets` names label sets to score alongside the main one; raises
+        UnknownLabelSets, before creating the job, if one of them does not exist.
+        """
+        unknown = [
+            name for name in label_sets if await get_label_set(get_db(), name, dataset=dataset) is None
+        ]
+        if unknown:
+            raise UnknownLabelSets(unknown)
+
+        for job in self.jobs.values():
+            if job.dataset == dataset and not job.done:
+                return job.id, False
+
+        doc = {
+            "_id": ObjectId(),
+            "dataset": dataset,
+            "incremental": incremental,
+            "label_sets": list(label_sets),
+            "status": "queued",
+            "active": True,
+            "owner": self.owner,
+            "checkpoint": {},
+            "events": [],
+            "created_at": now(),
+            "heartbeat_at": now(),
+        }
+        try:
+            await self.collection.insert_one(doc)
+        except DuplicateKeyError:
+            # Un autre worker traite déjà ce dataset : on le reprend seulement si son bail a expiré
+            taken_over = await self._take_over(dataset)
+            if taken_over is not None:
+                return taken_over.id, True
+            running = await self.collection.find_one(
+                {"dataset": dataset, "active": True}
+            )
+            if running is None:
+                # Bail d'une exécution en ligne de commande interrompue, libéré par _take_over
+                return await self.submit(dataset, incremental, label_sets)
+            return str(running["_id"]), False
+
+        return self._start(doc).id, True
+
+    async def resume_interrupted(self):
+        """Take over every active job whose lease has expired (e.g. after a restart)."""
+        datasets = await self.collection.distinct("dataset", {"active": True})
+        for dataset in datasets:
+            await self._take_over(dataset)
+
+    async def _take_over(self, dataset):
+        doc = await self.collection.find_one_and_update(
+            {
+                "dataset": dataset,
+                "active": True,
+                "heartbeat_at": {"$lt": now() - timedelta(seconds=JOB_LEASE_SECONDS)},
+            },
+            {"$set": {"heartbeat_at": now(), "owner": self.owner}},
+        )
+        if doc is None:
+            return None
+        if doc.get("source") == "cli":
+            # Pas de pipeline à reprendre : la commande relancée repart de son propre checkpoint
+            print(f"♻️ Bail de l'exécution en ligne de commande {doc['_id']} ({dataset}) expiré : libéré")
+            await self._release(doc["_id"], "failed", "Exécution en ligne de commande interrompue")
+            return None
+        print(f"♻️ Reprise du job {doc['_id']} ({dataset})")
+        return self._start(doc)
+
+    async def _release(self, job_id, status, error=None):
+        await self.collection.update_one(
+            {"_id": job_id, "active": True},
+            {"$set": {"status": status, "finished_at": now(), "error": error}, "$unset": {"active": ""}},
+        )
+
+    @asynccontextmanager
+    async def lease(self, dataset, shared=False):
+        """
+        Hold the lease of `dataset` outside of a job, for a command-line run: no job
+        starts on the dataset meanwhile, and DatasetBusy is raised if one is active.
+        With `shared`, the lease is shared by the processes of a sharded run, and
+        released by the last one. The lease is renewed while the block runs; if it
+        is lost, the block is cancelled and LeaseLost raised; a cancellation requested
+        through the API cancels the block too.
+        """
+        doc = {
+            "_id": ObjectId(),
+            "dataset": dataset,
+            "source": "cli",
+            "status": "running",
+            "active": True,
+            "owner": self.owner,
+            "holders": [self.owner],
+            "checkpoint": {},
+            "events": [],
+            "created_at": now(),
+            "started_at": now(),
+            "heartbeat_at": now(),
+        }
+        try:
+            await self.collection.insert_one(doc)
+            job_id = doc["_id"]
+        except DuplicateKeyError:
+            joined = None
+            if shared:
+                joined = await self.collection.find_one_and_update(
+                    {"dataset": dataset, "active": True, "source": "cli"},
+                    {"$addToSet": {"holders": self.owner}, "$set": {"heartbeat_at": now()}},
+                )
+            if joined is None:
+                running = await self.collection.find_one({"dataset": dataset, "active": True}, {"_id": 1})
+                raise DatasetBusy(dataset, running["_id"] if running else None)
+            job_id = joined["_id"]
+
+        held = {"_id": job_id, "active": True, "holders": self.owner}
+        task = asyncio.current_task()
+        lost = cancelled = False
+
+        async def heartbeat():
+            nonlocal lost, cancelled
+            while True:
+                await asyncio.sleep(HEARTBEAT_SECONDS)
+                try:
+                    doc = await self.collection.find_one_and_update(
+                        held, {"$set": {"heartbeat_at": now()}}, {"cancel_requested": 1}
+                    )
+                except Exception as e:
+                    # Erreur transitoire de la base : nouvel essai au prochain battement
+                    print(f"⚠️ Heartbeat du bail {job_id} : {e}")
+                    continue
+                if doc is None:
+                    print(f"⚠️ Bail {job_id} sur {dataset} perdu : arrêt sans écrire")
+                    lost = True
+                    task.cancel()
+                    return
+                if doc.get("cancel_requested"):
+                    print(f"⚠️ Annulation demandée pour {job_id} ({dataset})")
+                    cancelled = True
+                    task.cancel()
+                    return
+
+        beat = asyncio.create_task(heartbeat())
+        error = None
+        try:
+            yield str(job_id)
+        except asyncio.CancelledError:
+            if lost:
+                raise LeaseLost(str(job_id))
+            if not cancelled:
+                error = "Exécution interrompue"
+            raise
+        except BaseException as e:
+            error = str(e) or type(e).__name__
+            raise
+        finally:
+            beat.cancel()
+            await asyncio.gather(beat, return_exceptions=True)
+            if not lost:
+                update = {"$pull": {"holders": self.owner}}
+                if error is not None:
+                    update["$set"] = {"error": error}
+                doc = await self.collection.find_one_and_update(
+                    held, update, return_document=ReturnDocument.AFTER
+                )
+                if doc is not None and not doc["holders"]:
+                    # Dernier processus du lancement : le dataset est de nouveau libre
+                    if cancelled or doc.get("cancel_requested"):
+                        status = "cancelled"
+                    else:
+                        status = "failed" if doc.get("error") else "completed"
+                    await self.collection.update_one(
+                        {"_id": job_id, "active": True, "holders": {"$size": 0}},
+                        {"$set": {"status": status, "finished_at": now()}, "$unset": {"active": ""}},
+                    )
+
+    def _start(self, doc):
+        job = Job(doc)
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job))
+        job.heartbeat = asyncio.create_task(self._heartbeat(job))
+        return job
+
+    def _lease(self, job):
+        return {"_id": ObjectId(job.id), "owner": self.owner, "active": True}
+
+    async def _update(self, job, fields, push_event=None):
+        """Write to the job document; raises LeaseLost if another worker has taken it over."""
+        update = {"$set": {"heartbeat_at": now(), **fields}}
+        if push_event is not None:
+            update["$push"] = {"events": push_event}
+        doc = await self.collection.find_one_and_update(
+            self._lease(job),
+            update,
+            {"cancel_requested": 1},
+        )
+        if doc is None:
+            raise LeaseLost(job.id)
+        return doc
+
+    async def _heartbeat(self, job):
+        """
+        Renew the lease of `job` while it runs, including during long steps that
+        yield no message (label discovery, model loading, a large venue's summary).
+        Stops the job if the lease was lost or a cancellation was requested.
+        """
+        while not job.done:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                doc = await self._update(job, {})
+            except LeaseLost:
+                print(f"⚠️ Bail du job {job.id} perdu : arrêt sans écrire")
+                job.lease_lost = True
+                job.task.cancel()
+                return
+            except Exception as e:
+                # Erreur transitoire de la base : nouvel essai au prochain battement
+                print(f"⚠️ Heartbeat du job {job.id} : {e}")
+                continue
+            if doc.get("cancel_requested") and not job.cancel_requested:
+                job.cancel_requested = True
+                job.task.cancel()
+                return
+
+    async def _checkpoint(self, job, state):
+        await self._update(job, {"checkpoint": state})
+
+    async def _run(self, job):
+        try:
+            await self._run_pipeline(job)
+        except LeaseLost:
+            job.lease_lost = True
+            print(f"⚠️ Job {job.id} repris par un autre worker : arrêt sans écrire")
+            await job.finish(job.status)
+        finally:
+            job.heartbeat.cancel()
+
+    async def _run_pipeline(self, job):
+        await self._update(job, {"status": "running", "started_at": now()})
+        job.status = "running"
+        try:
+            async for message in run_pipeline(
+                dataset=job.dataset,
+                incremental=job.incremental,
+                state=job.state,
+                checkpoint=lambda state: self._checkpoint(job, state),
+                label_sets=job.label_sets,
+            ):
+                doc = await self._update(job, {}, push_event=message)
+                await job.emit(message)
+                if doc and doc.get("cancel_requested"):
+                    # Annulation demandée depuis un autre worker
+                    job.cancel_requested = True
+                    break
+            status = "cancelled" if job.cancel_requested else "completed"
+            error = None
+        except asyncio.CancelledError:
+            if job.lease_lost:
+                raise LeaseLost(job.id)
+            if not job.cancel_requested:
+                # Arrêt du serveur : on libère le bail pour qu'un autre worker reprenne le job
+                try:
+                    await self._update(job, {"heartbeat_at": datetime.min})
+                except LeaseLost:
+                    pass
+                raise
+            status, error = "cancelled", None
+        except LeaseLost:
+            raise
+        except Exception as e:
+            print(f"❌ Job {job.id} failed: {e}")
+            status, error = "failed", str(e)
+            message = f"❌ {e}\n"
+            await self._update(job, {}, push_event=message)
+            await job.emit(message)
+
+        await self._finish(job, status, error)
+
+    async def _finish(self, job, status, error=None):
+        fields = {"status": status, "finished_at": now(), "error": error}
+        result = await self.collection.update_one(
+            self._lease(job),
+            {"$set": fields, "$unset": {"active": ""}},
+        )
+        if result.matched_count == 0:
+            raise LeaseLost(job.id)
+        await job.finish(status)
+
+    async def get(self, job_id):
+        if not ObjectId.is_valid(job_id):
+            return None
+        return await self.collection.find_one(
+            {"_id": ObjectId(job_id)},
+            {"events": 0},
+        )
+
+    async def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is not None and not job.done:
+            job.cancel_requested = True
+            job.task.cancel()
+            return True
+
+        # Job exécuté par un autre worker : il s'arrêtera au prochain message ou battement
+        if not ObjectId.is_valid(job_id):
+            return False
+        result = await self.collection.update_one(
+            {"_id": ObjectId(job_id), "active": True},
+            {"$set": {"cancel_requested": True}},
+        )
+        return result.matched_count > 0
+
+    async def stream(self, job_id, offset=0):
+        """Follow a job's progress; jobs running in another process are polled from Mongo."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            async for message in job.stream(offset):
+                yield message
+                offset += 1
+            if not job.lease_lost:
+                return
+            # Job repris par un autre worker : la suite est lue depuis Mongo
+
+        while True:
+            doc = await self.collection.find_one(
+                {"_id": ObjectId(job_id)},
+                {"events": {"$slice": [offset, 1000]}, "status": 1},
+            )
+            if doc is None:
+                return
+            for message in doc.get("events", []):
+                yield message
+                offset += 1
+            if doc["status"] in FINISHED and not doc.get("events"):
+                return
+            await asyncio.sleep(1)
+
+    async def shutdown(self):
+        tasks = [job.task for job in self.jobs.values() if not job.done]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+job_manager = JobManager()
@@ -0,0 +1,203 @@
+import hashlib
+from datetime import datetime, timezone
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from starlette.concurrency import run_in_threadpool
+
+from app.config import (
+    CLUSTERER_MODEL,
+    INFERENCE_BATCH_SIZE,
+    INFERENCE_WORKERS,
+    LABEL_DISCOVERY_CLUSTERS,
+    LABEL_DISCOVERY_EXEMPLARS,
+    LABEL_DISCOVERY_MAX_REVIEWS,
+    LABEL_DISCOVERY_REFRESH_RATIO,
+    REVIEWS_CHUNK_SIZE,
+    REVIEWS_CURSOR_BATCH_SIZE,
+)
+from app.db.mongo import aggregate, iter_chunks
+from app.services.registry import registry
+from app.services.structured import complete_structured, labels_schema, parse_labels
+from app.services.vector_index import decode_embedding
+from app.services.workers import get_inference_pool
+from utils.pre_processing import merge_embeddings, preprocess_batch
+
+EXEMPLAR_MAX_CHARS = 400
+
+
+class LabelDiscoveryError(Exception):
+    pass
+
+
+def embed_texts(embedder, texts, batch_size=INFERENCE_BATCH_SIZE):
+    embeddings = [
+        embedder.embed(texts[i : i + batch_size]).float().numpy()
+        for i in range(0, len(texts), batch_size)
+    ]
+    return np.vstack(embeddings).astype(np.float32)
+
+
+async def embed_inputs(texts, batch_size=INFERENCE_BATCH_SIZE):
+    """Embeddings of model inputs, computed by the inference pool when there is one."""
+    if INFERENCE_WORKERS:
+        # Les modèles restent dans les workers : l'API n'en charge aucun
+        pool = get_inference_pool()
+        step = batch_size * INFERENCE_WORKERS
+        embeddings = [await pool.embed(texts[i : i + step]) for i in range(0, len(texts), step)]
+        return np.vstack(embeddings).astype(np.float32)
+    embedder = await run_in_threadpool(registry.get, "embedder")
+    return await run_in_threadpool(embed_texts, embedder, texts, batch_size)
+
+
+async def embed_corpus(db, dataset, total, limit=LABEL_DISCOVERY_MAX_REVIEWS):
+    """
+    Embed the reviews of `dataset` chunk by chunk, or a random sample of `limit`
+    reviews when the corpus is bigger. Embeddings already stored with the reviews
+    are reused. Returns the texts and their embeddings.
+    """
+    match = {"text": {"$nin": [None, ""]}}
+    projection = {"text": 1, "aiEmbedding": 1}
+    if total > limit:
+        cursor = await aggregate(
+            db[dataset],
+            [{"$match": match}, {"$sample": {"size": limit}}, {"$project": projection}],
+        )
+    else:
+        cursor = db[dataset].find(match, projection).batch_size(REVIEWS_CURSOR_BATCH_SIZE)
+
+    texts, embeddings = [], []
+    async for chunk in iter_chunks(cursor, REVIEWS_CHUNK_SIZE):
+        chunk_texts = [review["text"] for review in chunk]
+        missing = [i for i, review in enumerate(chunk) if review.get("aiEmbedding") is None]
+        computed = {}
+        if missing:
+            # Mêmes entrées que l'enrichissement, pour rester cohérent avec les embeddings stockés
+            prepared = preprocess_batch([chunk_texts[i] for i in missing])
+            computed = await embed_inputs(prepared.inputs)
+            computed = dict(zip(missing, prepared.merge(list(computed), merge_embeddings)))
+        chunk_embeddings = [
+            computed[i] if i in computed else decode_embedding(review["aiEmbedding"])
+            for i, review in enumerate(chunk)
+        ]
+        embeddings.append(np.asarray(chunk_embeddings, dtype=np.float32))
+        texts.extend(chunk_texts)
+
+    if not texts:
+        raise LabelDiscoveryError("Aucun avis à regrouper.")
+    return texts, np.vstack(embeddings)
+
+
+def cluster_embeddings(embeddings, n_clusters=LABEL_DISCOVERY_CLUSTERS):
+    kmeans = MiniBatchKMeans(
+        n_clusters=min(n_clusters, len(embeddings)),
+        batch_size=1024,
+        n_init=3,
+        random_state=42,
+    )
+    assignments = kmeans.fit_predict(embeddings)
+    return kmeans.cluster_centers_, assignments
+
+
+def pick_exemplars(texts, embeddings, centroids, assignments, per_cluster=LABEL_DISCOVERY_EXEMPLARS):
+    """For each cluster, the reviews closest to its centroid."""
+    exemplars = []
+    for k, centroid in enumerate(centroids):
+        members = np.flatnonzero(assignments == k)
+        distances = np.linalg.norm(embeddings[members] - centroid, axis=1)
+        nearest = members[np.argsort(distances)[:per_cluster]]
+        exemplars.append([texts[i][:EXEMPLAR_MAX_CHARS] for i in nearest])
+    return exemplars
+
+
+def get_naming_prompt(exemplars):
+    groups = ""
+    for k, group in enumerate(exemplars):
+        groups += f"[Groupe {k + 1}]\n" + "\n".join(f"- {text}" for text in group) + "\n"
+    return f"""Tu es un expert en traiteurs de mariage. \
+    Voici {len(exemplars)} groupes d'avis de clients sur des traiteurs de mariage, regroupés automatiquement par thème :\n{groups}\n \
+    Donne à chaque groupe un nom de catégorie thématique court (un mot ou une courte expression), dans l'ordre des groupes. \
+    Deux groupes ne doivent pas porter le même nom. \
+    Renvoie uniquement un objet JSON {{"labels": [...]}} contenant {len(exemplars)} noms. Exemple : {{"labels": ["nourriture", "service", "prix"]}}. \
+    Ne donne pas d'explications, juste l'objet JSON. \
+    """
+
+
+def parse_label_names(raw_labels, expected):
+    """Label names from the GPT answer (see `parse_labels`), made distinct."""
+    labels = parse_labels(raw_labels, expected)
+
+    # Les doublons éventuels sont conservés mais rendus distincts pour garder un label par centroïde
+    names, seen = [], {}
+    for label in labels:
+        label = str(label).strip()
+        seen[label] = seen.get(label, 0) + 1
+        names.append(label if seen[label] == 1 else f"{label} ({seen[label]})")
+    return names
+
+
+def label_set_version(labels, centroids):
+    digest = hashlib.sha256(np.ascontiguousarray(centroids, dtype=np.float32).tobytes())
+    digest.update("\x1f".join(labels).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+async def get_reusable_label_set(db, dataset, total, refresh_ratio=LABEL_DISCOVERY_REFRESH_RATIO):
+    """Latest label set discovered on `dataset`, unless the corpus has grown too much since."""
+    label_set = await db["label_sets"].find_one(
+        {"kind": "discovered", "dataset": dataset, "embedding_model": CLUSTERER_MODEL},
+        sort=[("created_at", -1)],
+    )
+    if label_set is None:
+        return None
+    if total > label_set["corpus_size"] * (1 + refresh_ratio):
+        return None
+    return label_set
+
+
+async def discover_labels(db, dataset, total, complete):
+    """
+    Embed the corpus, cluster it with MiniBatchKMeans, have GPT name each cluster
+    from the reviews nearest to its centroid, and store the versioned label set
+    (labels, centroids and exemplars) in `label_sets`.
+
+    `complete` is a blocking `(prompt, schema) -> str` function, run in the threadpool.
+    A malformed answer gets one targeted repair prompt before the discovery fails.
+    """
+    texts, embeddings = await embed_corpus(db, dataset, total)
+    centroids, assignments = await run_in_threadpool(cluster_embeddings, embeddings)
+    exemplars = pick_exemplars(texts, embeddings, centroids, assignments)
+
+    labels, raw_labels, error = await complete_structured(
+        lambda prompt, schema, stage: run_in_threadpool(complete, prompt, schema),
+        get_naming_prompt(exemplars),
+        labels_schema(len(centroids)),
+        lambda answer: parse_label_names(answer, len(centroids)),
+        stage="labels",
+    )
+    if not raw_labels:
+        raise LabelDiscoveryError(
+            "Aucune réponse obtenue depuis l'API OpenAI. Vérifie ta clé API, ta connexion ou ton quota."
+        )
+    if labels is None:
+        raise LabelDiscoveryError(
+            f"Erreur lors de l’analyse de la réponse : {error}\nRéponse GPT brute :\n{raw_labels}"
+        )
+
+    version = label_set_version(labels, centroids)
+    label_set = {
+        "_id": f"discovered-{dataset}-{version}",
+        "kind": "discovered",
+        "dataset": dataset,
+        "version": version,
+        "labels": labels,
+        "centroids": centroids.tolist(),
+        "cluster_sizes": np.bincount(assignments, minlength=len(centroids)).tolist(),
+        "exemplars": exemplars,
+        "embedding_model": CLUSTERER_MODEL,
+        "corpus_size": total,
+        "sample_size": len(texts),
+        "created_at": datetime.now(timezone.utc),
+    }
+    await db["label_sets"].replace_one({"_id": label_set["_id"]}, label_set, upsert=True)
+    return label_set
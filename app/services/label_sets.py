@@ -0,0 +1,124 @@
+import hashlib
+import re
+from datetime import datetime, timezone
+from time import monotonic
+
+from app.config import ANALYZE_LABELS_TTL, DEFAULT_LABELS, LABEL_SET_MAX_LABELS
+from app.services.incremental import get_current_labels
+
+# "default" désigne les labels du dernier enrichissement d'une collection, "discovered-*" les jeux découverts
+DEFAULT_NAME = "default"
+NAME_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+SUMMARY_FIELDS = {"history": 0}
+
+
+class LabelSetError(ValueError):
+    pass
+
+
+def labels_version(labels):
+    """Content version of a label set: identical labels share the version, hence the caches."""
+    return hashlib.sha256("\x1f".join(labels).encode("utf-8")).hexdigest()[:16]
+
+
+def clean_labels(labels):
+    labels = list(dict.fromkeys(label.strip() for label in labels if label and label.strip()))
+    if not labels:
+        raise LabelSetError("Un jeu de labels doit contenir au moins un label")
+    if len(labels) > LABEL_SET_MAX_LABELS:
+        raise LabelSetError(f"Au plus {LABEL_SET_MAX_LABELS} labels par jeu")
+    return labels
+
+
+def check_name(name):
+    if name == DEFAULT_NAME or name.startswith("discovered-") or not NAME_PATTERN.match(name):
+        raise LabelSetError(f"Nom de jeu de labels invalide : {name!r}")
+
+
+async def save_label_set(db, name, labels, scope=None, description=None):
+    """
+    Create or update the named label set `name`. A change of labels makes a new
+    version, and the previous versions are kept in `history`.
+    """
+    check_name(name)
+    labels = clean_labels(labels)
+    version = labels_version(labels)
+    now = datetime.now(timezone.utc)
+
+    current = await db["label_sets"].find_one({"_id": name}, {"version": 1})
+    update = {
+        "$set": {
+            "kind": "named",
+            "name": name,
+            "labels": labels,
+            "version": version,
+            "scope": scope or {},
+            "description": description,
+            "updated_at": now,
+        },
+        "$setOnInsert": {"created_at": now},
+    }
+    if current is None or current.get("version") != version:
+        update["$push"] = {"history": {"version": version, "labels": labels, "created_at": now}}
+        update["$inc"] = {"revision": 1}
+    await db["label_sets"].update_one({"_id": name}, update, upsert=True)
+    return await db["label_sets"].find_one({"_id": name}, SUMMARY_FIELDS)
+
+
+async def get_label_set(db, name=DEFAULT_NAME, version=None, dataset="reviews"):
+    """
+    Label set `name` (optionally one of its earlier `version`s), or None.
+    "default" is the label set of the last enrichment run of `dataset`.
+    """
+    if name == DEFAULT_NAME:
+        labels = await get_current_labels(db, dataset) or DEFAULT_LABELS
+        return {"name": DEFAULT_NAME, "labels": labels, "version": labels_version(labels)}
+
+    label_set = await db["label_sets"].find_one({"_id": name, "kind": "named"})
+    if label_set is None:
+        return None
+    if version is not None and version != label_set["version"]:
+        previous = [v for v in label_set.get("history", []) if v["version"] == version]
+        if not previous:
+            return None
+        return {"name": name, "labels": previous[-1]["labels"], "version": version}
+    return {"name": name, "labels": label_set["labels"], "version": label_set["version"]}
+
+
+async def list_label_sets(db, scope=None):
+    """Named label sets, optionally only those whose scope contains every key/value of `scope`."""
+    query = {"kind": "named"}
+    for key, value in (scope or {}).items():
+        query[f"scope.{key}"] = value
+    return await db["label_sets"].find(query, SUMMARY_FIELDS).sort("_id", 1).to_list(None)
+
+
+async def delete_label_set(db, name):
+    check_name(name)
+    result = await db["label_sets"].delete_one({"_id": name, "kind": "named"})
+    return result.deleted_count > 0
+
+
+class LabelSetCache:
+    """Label sets by name, refreshed from Mongo every `ttl` seconds (for the inline analysis)."""
+
+    def __init__(self, ttl=ANALYZE_LABELS_TTL):
+        self.ttl = ttl
+        self._entries = {}
+
+    async def get(self, db, name=DEFAULT_NAME, dataset="reviews"):
+        entry = self._entries.get((name, dataset))
+        if entry is None or monotonic() - entry[1] > self.ttl:
+            entry = (await get_label_set(db, name, dataset=dataset), monotonic())
+            self._entries[(name, dataset)] = entry
+        return entry[0]
+
+    def invalidate(self, name=None):
+        if name is None:
+            self._entries.clear()
+        else:
+            for key in [key for key in self._entries if key[0] == name]:
+                del self._entries[key]
+
+
+label_set_cache = LabelSetCache()
@@ -0,0 +1,146 @@
+from contextlib import contextmanager, nullcontext
+from time import monotonic
+
+from pymongo import monitoring
+
+from app.config import OTEL_ENABLED
+
+try:
+    import prometheus_client
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    prometheus_client = None
+
+try:
+    from opentelemetry import trace
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    trace = None
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _NoopMetric:
+    """Stand-in for a Prometheus metric when prometheus_client is not installed."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, value=1):
+        pass
+
+    def dec(self, value=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+def _metric(kind, name, documentation, labelnames, **kwargs):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return getattr(prometheus_client, kind)(name, documentation, labelnames, **kwargs)
+
+
+INFERENCE_SECONDS = _metric(
+    "Histogram",
+    "aiwedder_inference_batch_seconds",
+    "Model inference time per batch",
+    ["stage", "model"],
+    buckets=SECONDS_BUCKETS,
+)
+REVIEWS_PROCESSED = _metric(
+    "Counter",
+    "aiwedder_reviews_processed_total",
+    "Reviews processed, rate() gives reviews/sec",
+    ["stage", "model"],
+)
+QUEUE_DEPTH = _metric(
+    "Gauge",
+    "aiwedder_queue_depth",
+    "Items waiting in an in-process queue",
+    ["queue"],
+)
+MONGO_SECONDS = _metric(
+    "Histogram",
+    "aiwedder_mongo_command_seconds",
+    "MongoDB command round-trip time",
+    ["command"],
+    buckets=SECONDS_BUCKETS,
+)
+GPT_SECONDS = _metric(
+    "Histogram",
+    "aiwedder_gpt_request_seconds",
+    "GPT chat completion latency",
+    ["stage", "model"],
+    buckets=SECONDS_BUCKETS,
+)
+GPT_TOKENS = _metric(
+    "Counter",
+    "aiwedder_gpt_tokens_total",
+    "GPT tokens used",
+    ["stage", "model", "kind"],
+)
+ERRORS = _metric(
+    "Counter",
+    "aiwedder_errors_total",
+    "Errors by stage and exception type",
+    ["stage", "error"],
+)
+
+_tracer = trace.get_tracer("ai-wedder") if OTEL_ENABLED and trace is not None else None
+
+
+def span(name, **attributes):
+    """OpenTelemetry span when tracing is enabled, no-op context manager otherwise."""
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+def record_error(stage, error):
+    ERRORS.labels(stage, type(error).__name__).inc()
+
+
+def record_gpt_usage(stage, model, response):
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    GPT_TOKENS.labels(stage, model, "prompt").inc(usage.prompt_tokens or 0)
+    GPT_TOKENS.labels(stage, model, "completion").inc(usage.completion_tokens or 0)
+
+
+@contextmanager
+def measure_gpt(stage, model):
+    """Time one GPT call (histogram and span) and count its failures."""
+    with span("gpt.request", stage=stage, model=model):
+        start = monotonic()
+        try:
+            yield
+        except Exception as e:
+            record_error(stage, e)
+            raise
+        finally:
+            GPT_SECONDS.labels(stage, model).observe(monotonic() - start)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Records the round-trip time of every command sent by the MongoDB driver."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_SECONDS.labels(event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_SECONDS.labels(event.command_name).observe(event.duration_micros / 1e6)
+        ERRORS.labels("mongo", event.command_name).inc()
+
+
+def latest():
+    """Exposition payload and content type, or None without prometheus_client."""
+    if prometheus_client is None:
+        return None
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
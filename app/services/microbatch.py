@@ -0,0 +1,85 @@
+import asyncio
+
+from app.config import ANALYZE_MAX_BATCH_SIZE, ANALYZE_MAX_WAIT_MS
+from app.services.metrics import QUEUE_DEPTH
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests into batches.
+
+    A batch is sent to `process_batch` (an async function mapping a list of items
+    to a list of results) as soon as it holds `max_batch_size` items or the first
+    item has waited `max_wait_ms`, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        process_batch,
+        max_batch_size=ANALYZE_MAX_BATCH_SIZE,
+        max_wait_ms=ANALYZE_MAX_WAIT_MS,
+        name="analyze",
+    ):
+        self.process_batch = process_batch
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._worker = None
+
+    async def submit(self, items):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for item in items:
+            future = loop.create_future()
+            self._queue.put_nowait((item, future))
+            futures.append(future)
+        QUEUE_DEPTH.labels(self.name).set(self._queue.qsize())
+        return await asyncio.gather(*futures)
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        QUEUE_DEPTH.labels(self.name).set(self._queue.qsize())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            # Requêtes abandonnées par le client (timeout, déconnexion) : inutile de les calculer
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+            try:
+                results = await self.process_batch([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
@@ -0,0 +1,76 @@
+from functools import lru_cache
+
+from app.config import GPT_MODEL, SUMMARY_BATCH_TOKENS
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    tiktoken = None
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model=GPT_MODEL):
+    """
+    Tokenizer of `model`, or None to fall back on the character estimate. tiktoken
+    downloads its BPE file on first use: offline, pre-fill TIKTOKEN_CACHE_DIR.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # Fichier BPE introuvable hors ligne : approximation plutôt qu'un échec des résumés
+        print(f"⚠️ Encodage tiktoken indisponible ({e}) : estimation à ~4 caractères par token")
+        return None
+
+
+def count_tokens(text, model=GPT_MODEL):
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Sans tiktoken : approximation (~4 caractères par token)
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def truncate_to_tokens(text, max_tokens, model=GPT_MODEL):
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[: max_tokens * 4]
+    return encoding.decode(encoding.encode(text)[:max_tokens])
+
+
+def format_review(review):
+    review_ai_clusters = ", ".join([c["label"] for c in review.get("aiClusters", [])])
+    return f"\n\n [AVIS] {review['text']} [CLUSTERS] {review_ai_clusters}"
+
+
+def pack_texts(texts, budget=SUMMARY_BATCH_TOKENS):
+    """
+    Greedily fill batches of texts up to `budget` tokens.
+    A text larger than the budget on its own is truncated and gets its own batch.
+    """
+    batch, used = [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if tokens > budget:
+            text, tokens = truncate_to_tokens(text, budget), budget
+
+        if batch and used + tokens > budget:
+            yield batch
+            batch, used = [], 0
+
+        batch.append(text)
+        used += tokens
+
+    if batch:
+        yield batch
+
+
+def pack_reviews(reviews, budget=SUMMARY_BATCH_TOKENS):
+    """Yield the formatted text of each batch of reviews."""
+    formatted = (format_review(r) for r in reviews if r.get("text"))
+    for batch in pack_texts(formatted, budget):
+        yield "".join(batch)
@@ -0,0 +1,586 @@
+from datetime import datetime, timezone
+from itertools import groupby
+
+from starlette.concurrency import run_in_threadpool
+from tqdm import tqdm
+
+from app.config import (
+    CASCADE_ENABLED,
+    CLASSIFIER_MODEL,
+    CLUSTERER_MODEL,
+    EMBEDDINGS_ENABLED,
+    GPT_MODEL,
+    GPT_TEMPERATURE,
+    HYPOTHESIS_TEMPLATE,
+    INFERENCE_BATCH_SIZE,
+    INFERENCE_WORKERS,
+    JOB_CHECKPOINT_EVERY,
+    REVIEWS_CHUNK_SIZE,
+    REVIEWS_CURSOR_BATCH_SIZE,
+)
+from app.db.bulk import BulkWriter
+from app.db.mongo import get_db, iter_chunks
+from app.services.analytics import refresh_venue_stats
+from app.services.gpt_cache import get_gpt_cache
+from app.services.incremental import (
+    content_hash,
+    enrichment_version,
+    get_current_labels,
+    needs_enrichment,
+    save_current_labels,
+)
+from app.services.inference import (
+    StageStats,
+    classify_batch,
+    cluster_sets,
+    embed_batch,
+    length_buckets,
+)
+from app.services.label_discovery import (
+    LabelDiscoveryError,
+    discover_labels,
+    get_reusable_label_set,
+)
+from app.services.label_sets import get_label_set
+from app.services.metrics import measure_gpt, record_gpt_usage
+from app.services.registry import registry
+from app.services.structured import cache_variant, request_options, response_content
+from app.services.summarizer import AsyncSummarizer
+from app.services.vector_index import encode_embedding, get_review_index
+from app.services.workers import get_inference_pool
+from utils.pre_processing import (
+    merge_clusters,
+    merge_embeddings,
+    merge_sentiments,
+    preprocess_batch,
+)
+
+STAGES = ("labels", "classify", "cluster", "summarize")
+
+
+class PipelineError(Exception):
+    """The run cannot go on (no label set, label discovery failed, unknown label set)."""
+
+
+def gpt_model(prompt, schema=None, model=GPT_MODEL):
+    """Blocking GPT call; with a `schema`, returns the JSON arguments of the structured answer."""
+    variant = cache_variant(schema)
+    gpt_cache = get_gpt_cache()
+    if gpt_cache is not None:
+        cached = gpt_cache.get(model, GPT_TEMPERATURE, prompt, variant)
+        if cached is not None:
+            return cached
+
+    try:
+        messages = [{"role": "user", "content": prompt}]
+        with measure_gpt("labels", model):
+            response = registry.get("openai").chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=GPT_TEMPERATURE,
+                **request_options(schema),
+            )
+        record_gpt_usage("labels", model, response)
+        content = response_content(response)
+        if gpt_cache is not None and content:
+            gpt_cache.set(model, GPT_TEMPERATURE, prompt, content, variant)
+        return content
+    except Exception as e:
+        print(f"❌ GPT API error: {e}")
+        return ""
+
+
+def get_ai_clusters(labels, scores):
+    aiClusters = []
+    for label, score in zip(labels, scores):
+        aiClusters.append({"label": label, "score": score})
+    return aiClusters
+
+
+def restrict(query, extra=None):
+    """`query` further restricted by `extra` (e.g. one shard of venues)."""
+    return {"$and": [query, extra]} if extra else query
+
+
+async def iter_catering_with_reviews(db, dataset, venue_ids=None, exclude_ids=(), query=None):
+    """
+    Yield one entry per venue with its reviews, streaming the reviews sorted by venue.
+    Only one venue's reviews are held in memory at a time, unlike a `$group`/`$push`
+    aggregation which builds every venue's review array inside a single result.
+    `query` restricts the reviews considered.
+    """
+    if venue_ids:
+        venues_query = {"venue": {"$in": list(venue_ids)}}
+    else:
+        venues_query = {"venue": {"$ne": None, "$nin": list(exclude_ids)}}
+    query = restrict(venues_query, query)
+    cursor = (
+        db[dataset]
+        .find(query, {"_id": 0, "venue": 1, "text": 1, "aiClusters": 1})
+        .sort("venue", 1)
+        .batch_size(REVIEWS_CURSOR_BATCH_SIZE)
+        .allow_disk_use(True)
+    )
+
+    current = None
+    async for chunk in iter_chunks(cursor, REVIEWS_CURSOR_BATCH_SIZE):
+        for venue_id, venue_reviews in groupby(chunk, key=lambda r: r["venue"]):
+            venue_reviews = list(venue_reviews)
+            # Un traiteur peut être à cheval sur deux chunks : on complète l'entrée en cours
+            if current is not None and current["cateringCompanyId"] == venue_id:
+                current["reviews"].extend(venue_reviews)
+                continue
+            if current is not None:
+                yield current
+            venue = await db["venues"].find_one({"_id": venue_id}, {"name": 1})
+            current = {
+                "cateringCompanyId": venue_id,
+                "cateringCompanyName": venue["name"] if venue else None,
+                "reviews": venue_reviews,
+            }
+
+    if current is not None:
+        yield current
+
+
+async def run_pipeline(
+    dataset="reviews",
+    incremental=False,
+    state=None,
+    checkpoint=None,
+    stages=STAGES,
+    query=None,
+    db=None,
+    sync_index=True,
+    label_sets=(),
+):
+    """
+    Classify, cluster and summarize the reviews of `dataset`, yielding progress messages.
+
+    `state` is the checkpoint of a previous, interrupted run (empty for a new run) and
+    is updated in place. `checkpoint` is awaited with it every JOB_CHECKPOINT_EVERY
+    batches (at the end of the current chunk) or venues, once the corresponding
+    writes have been flushed.
+
+    `stages` is any subset of STAGES; without "labels", clustering uses the stored
+    label set. `query` restricts the reviews processed (e.g. one shard of venues),
+    `db` replaces the shared database and `sync_index` can turn off the update of
+    the similarity index (for runs against a copy of the data).
+    `label_sets` names stored label sets scored alongside the main one, in the same
+    model pass; their clusters go to `aiLabelSets.<name>`.
+    Raises PipelineError when the run cannot go on.
+    """
+    state = state if state is not None else {}
+    resuming = bool(state.get("stage"))
+    run_classify = "classify" in stages
+    run_cluster = "cluster" in stages
+    # The enrichment version only describes reviews that went through both models
+    full_enrichment = run_classify and run_cluster
+
+    async def save_checkpoint(**fields):
+        state.update(fields)
+        if checkpoint is not None:
+            await checkpoint(state)
+
+    db = db if db is not None else get_db()
+    await db[dataset].create_index("venue")
+    reviews_query = restrict({"text": {"$nin": [None, ""]}}, query)
+    total = await db[dataset].count_documents(reviews_query)
+    yield f"🔍 {total} reviews trouvés\n"
+
+    # ------------------------------------------------------------------ #
+    #           Étape 1 : Classification et Clustering des avis          #
+    # ------------------------------------------------------------------ #
+
+    # In incremental mode, the label set of the previous run is reused so that
+    # the enrichment version stays stable and unchanged reviews can be skipped.
+    # A resumed run always reuses the labels saved in its checkpoint.
+    # Without the "labels" stage, the stored label set is used as is.
+    if resuming:
+        suggested_labels = state.get("labels")
+    elif incremental or "labels" not in stages:
+        suggested_labels = await get_current_labels(db, dataset)
+    else:
+        suggested_labels = None
+
+    if suggested_labels:
+        yield f"♻️ Labels de clustering réutilisés : {suggested_labels}\n"
+    elif "labels" not in stages:
+        if run_cluster:
+            raise PipelineError("Aucun jeu de labels enregistré : lance d'abord l'étape labels.")
+    else:
+        # Labels are discovered from the whole corpus: embeddings, k-means, then GPT
+        # names each cluster from the reviews nearest to its centroid.
+        label_set = await get_reusable_label_set(db, dataset, total)
+        if label_set is not None:
+            yield f"♻️ Labels découverts réutilisés (version {label_set['version']}) : {label_set['labels']}\n"
+        else:
+            yield "🧭 Découverte des thèmes (embeddings + k-means)...\n"
+            try:
+                label_set = await discover_labels(db, dataset, total, gpt_model)
+            except LabelDiscoveryError as e:
+                raise PipelineError(str(e)) from e
+            yield f"✅ Labels de clustering récupérés : {label_set['labels']}\n"
+        suggested_labels = label_set["labels"]
+
+        await save_current_labels(db, dataset, suggested_labels)
+
+    # The named label sets are resolved once, a resumed run keeps the same versions
+    if resuming:
+        extra_sets = state.get("label_sets", [])
+    elif run_cluster:
+        extra_sets = []
+        for name in label_sets:
+            label_set = await get_label_set(db, name, dataset=dataset)
+            if label_set is None:
+                raise PipelineError(f"Jeu de labels inconnu : {name}")
+            extra_sets.append(label_set)
+            yield f"🏷️ Jeu de labels {name} (version {label_set['version']}) : {label_set['labels']}\n"
+    else:
+        extra_sets = []
+
+    if not resuming:
+        await save_checkpoint(
+            stage="enrich",
+            labels=suggested_labels,
+            label_sets=extra_sets,
+            enriched=0,
+            resume_after=None,
+            changed_venues=[],
+            summarized_venues=[],
+        )
+
+    # Reviews already enriched with this label set are skipped in incremental mode.
+    # A resumed run restarts after the last review whose writes were flushed.
+    version = enrichment_version(suggested_labels, extra_sets) if full_enrichment else None
+    # Label sets scored by the clusterer: the main one, then the named ones
+    label_lists = [suggested_labels] + [s["labels"] for s in extra_sets] if run_cluster else []
+    skip_unchanged = incremental and full_enrichment
+    resume_after = state.get("resume_after")
+    enrich_query = reviews_query
+    if resume_after is not None:
+        enrich_query = restrict(reviews_query, {"_id": {"$gt": resume_after}})
+
+    inference_pool = get_inference_pool() if INFERENCE_WORKERS else None
+    inference_stats = StageStats(
+        f"Inférence ({INFERENCE_WORKERS} workers)", stage="inference", model="pool"
+    )
+    classification_stats = StageStats(
+        "Classification", stage="classification", model=CLASSIFIER_MODEL
+    )
+    clustering_stats = StageStats("Clustering", stage="clustering", model=CLUSTERER_MODEL)
+    embedding_stats = StageStats("Embeddings", stage="embedding", model=CLUSTERER_MODEL)
+    # Avec le pool, chaque batch est assez grand pour donner un micro-batch à chaque worker
+    batch_size = INFERENCE_BATCH_SIZE * max(1, INFERENCE_WORKERS)
+    reviews_writer = BulkWriter(db[dataset])
+    changed_venues = set(state.get("changed_venues", []))
+    already_enriched = state.get("enriched", 0)
+    done = 0
+    skipped = 0
+
+    async def batches_to_enrich():
+        """
+        Stream the collection in `_id` order, chunk by chunk, and length-bucket each
+        chunk. The last batch of a chunk comes with the chunk's last `_id`.
+        """
+        nonlocal skipped
+        # Rien à enrichir si les étapes ne sont pas demandées ou déjà terminées
+        if not (run_classify or run_cluster) or state.get("stage") != "enrich":
+            return
+        cursor = (
+            db[dataset]
+            .find(
+                enrich_query,
+                {
+                    "_id": 1,
+                    "text": 1,
+                    "venue": 1,
+                    "aiContentHash": 1,
+                    "aiEnrichmentVersion": 1,
+                    "aiEmbeddingHash": 1,
+                },
+            )
+            .sort("_id", 1)
+            .batch_size(REVIEWS_CURSOR_BATCH_SIZE)
+        )
+        async for chunk in iter_chunks(cursor, REVIEWS_CHUNK_SIZE):
+            pending = [
+                review
+                for review in chunk
+                if not skip_unchanged or needs_enrichment(review, version)
+            ]
+            skipped += len(chunk) - len(pending)
+            buckets = list(length_buckets(pending, batch_size))
+            for i, batch in enumerate(buckets):
+                yield batch, chunk[-1]["_id"] if i == len(buckets) - 1 else None
+
+    batch_index = 0
+    async for batch, last_id in batches_to_enrich():
+        batch_index += 1
+        texts = [review["text"] for review in batch]
+        # Repaired, normalized and deduplicated model inputs (long reviews are chunked)
+        prepared = preprocess_batch(texts)
+        inputs = prepared.inputs
+
+        if inference_pool is not None:
+            # The batch is split into one shard per worker process
+            with inference_stats.measure(len(batch)):
+                sentiments, set_results = await inference_pool.infer_many(
+                    inputs,
+                    label_lists,
+                    HYPOTHESIS_TEMPLATE,
+                    classify=run_classify,
+                    cascade=CASCADE_ENABLED,
+                )
+        else:
+            sentiments, set_results = None, []
+            # ------------------------- Classification ------------------------- #
+
+            """
+            The first step is to classify each review with a sentiment analysis model.
+            Here, we use the classifier I built with Camembert. 
+            I have trained it and push it on Hugging Face so that it can be used in production.
+            The classifier is a simple text classification model that predicts the sentiment of each review.
+            It is a French model that predicts the sentiment of the review as either "positive", "negative" or "neutral".
+            Reviews are processed in length-bucketed micro-batches rather than one by one.
+            """
+
+            if run_classify:
+                with classification_stats.measure(len(batch)):
+                    # Le modèle est chargé à la demande, hors de la boucle d'événements
+                    sentiments = await run_in_threadpool(
+                        lambda: classify_batch(registry.get("classifier"), inputs)
+                    )
+
+            # --------------------------- Clustering --------------------------- #
+
+            """
+            The second step is to clusterize the reviews based on their content.
+            For this step, I will use 2 techniques : 
+                1. The first technique is about getting 10 labels based on the overall review tendency.
+                2. The second technique is about using DistilCamembert Zero-Shot to clusterize the reviews based on the labels obtained in the first step.
+            I am basically inducing the labels from the reviews themselves, so that they are more relevant to the dataset and to my specific needs.
+            """
+
+            if run_cluster:
+                with clustering_stats.measure(len(batch)):
+                    # Every label set is scored in the same pass over the reviews. In
+                    # cascade mode, the classifier's confidence gates the NLI pass.
+                    set_results = await run_in_threadpool(
+                        lambda: cluster_sets(
+                            registry.get("clusterer"),
+                            inputs,
+                            label_lists,
+                            HYPOTHESIS_TEMPLATE,
+                            sentiments,
+                            CASCADE_ENABLED,
+                        )
+                    )
+
+        if sentiments is not None:
+            sentiments = prepared.merge(sentiments, merge_sentiments)
+        set_results = [prepared.merge(results, merge_clusters) for results in set_results]
+        clusterer_results = set_results[0] if set_results else None
+
+        # --------------------------- Embeddings --------------------------- #
+
+        # Embeddings only depend on the text: they are computed once per text, not per label set
+        hashes = [content_hash(text) for text in texts]
+        embeddings = {}
+        if EMBEDDINGS_ENABLED and run_cluster:
+            to_embed = [
+                i
+                for i, (review, text_hash) in enumerate(zip(batch, hashes))
+                if review.get("aiEmbeddingHash") != text_hash
+            ]
+            if to_embed:
+                to_embed_prepared = preprocess_batch([texts[i] for i in to_embed])
+                with embedding_stats.measure(len(to_embed)):
+                    if inference_pool is not None:
+                        vectors = await inference_pool.embed(to_embed_prepared.inputs)
+                    else:
+                        vectors = await run_in_threadpool(
+                            lambda: embed_batch(
+                                registry.get("embedder"), to_embed_prepared.inputs
+                            )
+                        )
+                vectors = to_embed_prepared.merge(list(vectors), merge_embeddings)
+                embeddings = dict(zip(to_embed, vectors))
+        embedded_at = datetime.now(timezone.utc)
+
+        # --------------------------- Update DB --------------------------- #
+
+        """
+        I update the reviews in the database with the sentiment and the clusters.
+        """
+
+        for i, review in enumerate(batch):
+            fields = {}
+            if sentiments is not None:
+                fields["aiSentiment"] = sentiments[i]["label"]
+                fields["aiConfidenceScore"] = sentiments[i]["score"]
+            if clusterer_results is not None:
+                fields["aiClusters"] = get_ai_clusters(
+                    labels=clusterer_results[i]["labels"],
+                    scores=clusterer_results[i]["scores"],
+                )
+            for label_set, results in zip(extra_sets, set_results[1:]):
+                fields[f"aiLabelSets.{label_set['name']}"] = {
+                    "version": label_set["version"],
+                    "clusters": get_ai_clusters(results[i]["labels"], results[i]["scores"]),
+                }
+            if full_enrichment:
+                fields["aiContentHash"] = hashes[i]
+                fields["aiEnrichmentVersion"] = version
+            if i in embeddings:
+                fields["aiEmbedding"] = encode_embedding(embeddings[i])
+                fields["aiEmbeddingHash"] = hashes[i]
+                fields["aiEmbeddedAt"] = embedded_at
+            await reviews_writer.set({"_id": review["_id"]}, fields)
+        changed_venues.update(r["venue"] for r in batch if r.get("venue"))
+
+        done += len(batch)
+        if inference_pool is not None:
+            rates = f"{inference_stats.rate:.1f}"
+        else:
+            rates = " / ".join(
+                f"{stats.rate:.1f}"
+                for stats in (classification_stats, clustering_stats)
+                if stats.count
+            )
+        written = " + ".join(
+            name
+            for name, results in (("Sentiment", sentiments), ("clusters", clusterer_results))
+            if results is not None
+        )
+        yield f"[{done + skipped}/{total}] {written} enregistrés ({rates} avis/s)\n"
+
+        # The checkpoint is taken at the end of a chunk, so that a resumed run can
+        # restart right after the last review of the chunk.
+        if last_id is not None and batch_index >= JOB_CHECKPOINT_EVERY:
+            batch_index = 0
+            await reviews_writer.flush()
+            await save_checkpoint(
+                enriched=already_enriched + done,
+                changed_venues=list(changed_venues),
+                resume_after=last_id,
+            )
+
+    await reviews_writer.flush()
+    if skip_unchanged:
+        yield f"♻️ {skipped} avis déjà à jour ignorés\n"
+    if reviews_writer.errors:
+        yield f"⚠️ {len(reviews_writer.errors)} avis n'ont pas pu être enregistrés\n"
+    if changed_venues:
+        refreshed = await refresh_venue_stats(db, dataset, changed_venues)
+        yield f"📊 Statistiques mises à jour pour {refreshed} traiteurs\n"
+    if EMBEDDINGS_ENABLED and sync_index and done:
+        indexed = await get_review_index(dataset).sync(db)
+        yield f"🧲 {indexed} embeddings ajoutés à l'index de similarité\n"
+
+    if state.get("stage") == "enrich":
+        await save_checkpoint(
+            stage="summarize",
+            enriched=already_enriched + done,
+            changed_venues=list(changed_venues),
+        )
+
+    for stats in (inference_stats, classification_stats, clustering_stats, embedding_stats):
+        if stats.count:
+            yield f"⚡ {stats}\n"
+
+    if "summarize" not in stages:
+        await save_checkpoint(stage="done")
+        yield "Traitement terminé.\n"
+        return
+
+    yield "Résumés globaux par traiteur...\n"
+
+    # ------------------------------------------------------------------ #
+    #                         Step 2 : Summarize                         #
+    # ------------------------------------------------------------------ #
+
+    """
+    In this step, I will summarize the reviews for each catering company.
+    I will use the OpenAI GPT model to summarize the reviews.
+    The summary will be stored in the database for each catering company.
+    I will also use the reviews to generate a global score for each catering company.
+    """
+
+    summarized_venues = set(state.get("summarized_venues", []))
+
+    if incremental:
+        venues_to_summarize = changed_venues - summarized_venues
+        if not venues_to_summarize:
+            yield "Aucun traiteur à résumer à nouveau.\n"
+            await save_checkpoint(stage="done")
+            yield "Traitement terminé.\n"
+            return
+        catering_with_reviews = iter_catering_with_reviews(
+            db, dataset, venue_ids=venues_to_summarize, query=query
+        )
+    else:
+        catering_with_reviews = iter_catering_with_reviews(
+            db, dataset, exclude_ids=summarized_venues, query=query
+        )
+
+    """
+    Venues and their review batches are summarized concurrently by the async
+    scheduler, which keeps the calls within the configured rate limits.
+    """
+
+    venues_writer = BulkWriter(db["venues"])
+    gpt_cache = get_gpt_cache()
+    summarizer = AsyncSummarizer(cache=gpt_cache)
+    progress = tqdm(desc="Processing catering companies")
+    pending_venues = []
+
+    async for entry, outcome, error in summarizer.summarize_venues(
+        catering_with_reviews
+    ):
+        progress.update(1)
+        name = entry["cateringCompanyName"]
+
+        if error is not None:
+            yield f"Aïe ! Erreur GPT pour {name} : {error}\n"
+            continue
+
+        parsed, result, batch_errors = outcome
+        for batch_error in batch_errors:
+            yield f"Erreur GPT batch pour {name}: {batch_error}\n"
+
+        if parsed is None:
+            yield f"Résultat inattendu pour {name} : {result}\n"
+            continue
+
+        await venues_writer.set(
+            {"_id": entry["cateringCompanyId"]},
+            {
+                "aiSummary": parsed["summary"],
+                "aiKeyPoints": parsed["key_points"],
+                "aiStrengths": parsed["strengths"],
+                "aiWeaknesses": parsed["weaknesses"],
+                "aiGlobalScore": parsed["score"],
+            },
+        )
+        yield f"Résumé pour {name} enregistré\n"
+
+        pending_venues.append(entry["cateringCompanyId"])
+        if len(pending_venues) >= JOB_CHECKPOINT_EVERY:
+            await venues_writer.flush()
+            summarized_venues.update(pending_venues)
+            pending_venues = []
+            await save_checkpoint(summarized_venues=list(summarized_venues))
+
+    progress.close()
+    await venues_writer.flush()
+    summarized_venues.update(pending_venues)
+    await save_checkpoint(stage="done", summarized_venues=list(summarized_venues))
+
+    if venues_writer.errors:
+        yield f"⚠️ {len(venues_writer.errors)} résumés n'ont pas pu être enregistrés\n"
+    if gpt_cache is not None:
+        await run_in_threadpool(gpt_cache.flush)
+        yield f"💾 {gpt_cache}\n"
+
+    yield "Traitement terminé.\n"
@@ -0,0 +1,90 @@
+import threading
+from time import perf_counter
+
+from openai import OpenAI
+
+from app.config import INFERENCE_WORKERS, OPENAI_API_KEY, OPENAI_BASE_URL
+from app.services.inference import load_classifier, load_clusterer, pin_torch_threads
+
+
+class ModelRegistry:
+    """
+    Loads models on first use (or on warm-up) instead of at import time,
+    and keeps track of each model's load state and load time.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def register(self, name, loader):
+        self._entries[name] = {
+            "loader": loader,
+            "lock": threading.Lock(),
+            "model": None,
+            "state": "pending",
+            "load_seconds": None,
+            "error": None,
+        }
+
+    def get(self, name):
+        entry = self._entries[name]
+        if entry["state"] == "ready":
+            return entry["model"]
+
+        with entry["lock"]:
+            # Un autre thread a pu terminer le chargement pendant l'attente du verrou
+            if entry["state"] != "ready":
+                entry["state"] = "loading"
+                start = perf_counter()
+                try:
+                    entry["model"] = entry["loader"]()
+                except Exception as e:
+                    entry["state"] = "failed"
+                    entry["error"] = str(e)
+                    raise
+                entry["load_seconds"] = perf_counter() - start
+                entry["state"] = "ready"
+                entry["error"] = None
+                print(f"✅ {name} chargé en {entry['load_seconds']:.1f}s")
+        return entry["model"]
+
+    def warm_up(self, names=None):
+        for name in names or list(self._entries):
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"❌ Échec du chargement de {name} : {e}")
+
+    def is_ready(self, names=None):
+        return all(
+            self._entries[name]["state"] == "ready" for name in names or self._entries
+        )
+
+    def status(self):
+        return {
+            name: {
+                "state": entry["state"],
+                "load_seconds": entry["load_seconds"],
+                "error": entry["error"],
+            }
+            for name, entry in self._entries.items()
+        }
+
+
+def _load_in_process(loader):
+    def load():
+        pin_torch_threads()
+        return loader()
+
+    return load
+
+
+registry = ModelRegistry()
+registry.register("openai", lambda: OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL))
+
+# Avec le pool de workers, les modèles sont chargés dans les workers, pas dans l'API
+if not INFERENCE_WORKERS:
+    registry.register("classifier", _load_in_process(load_classifier))
+    registry.register("clusterer", _load_in_process(load_clusterer))
+    # Les embeddings (découverte des labels) réutilisent le modèle zero-shot déjà chargé
+    registry.register("embedder", lambda: registry.get("clusterer"))
@@ -0,0 +1,260 @@
+"""
+Structured GPT outputs: JSON schemas sent as a forced function call (or a JSON
+schema response format), a tolerant parser for answers that drift from the
+schema, and a repair prompt that only sends the faulty answer back.
+"""
+
+import ast
+import json
+import re
+import unicodedata
+
+from app.config import GPT_REPAIR_ATTEMPTS, GPT_STRUCTURED_OUTPUT
+from app.services.metrics import record_error
+
+
+class StructuredOutputError(ValueError):
+    pass
+
+
+def _string_list(description):
+    return {"type": "array", "items": {"type": "string"}, "description": description}
+
+
+SUMMARY_SCHEMA = {
+    "name": "venue_summary",
+    "description": "Synthèse des avis d'un traiteur de mariage",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "summary": {"type": "string", "description": "Résumé synthétique global des avis"},
+            "key_points": _string_list("Points majeurs évoqués, une phrase courte chacun"),
+            "strengths": _string_list("Forces du traiteur"),
+            "weaknesses": _string_list("Faiblesses du traiteur"),
+            "score": {"type": "number", "description": "Score global subjectif entre 0 et 100"},
+        },
+        "required": ["summary", "key_points", "strengths", "weaknesses", "score"],
+        "additionalProperties": False,
+    },
+}
+
+
+def labels_schema(count):
+    return {
+        "name": "cluster_labels",
+        "description": f"Noms de catégorie des {count} groupes d'avis, dans l'ordre des groupes",
+        "schema": {
+            "type": "object",
+            "properties": {"labels": _string_list(f"Exactement {count} noms distincts")},
+            "required": ["labels"],
+            "additionalProperties": False,
+        },
+    }
+
+
+def request_options(schema, mode=GPT_STRUCTURED_OUTPUT):
+    """Extra `chat.completions.create` arguments asking for an answer matching `schema`."""
+    if schema is None or mode == "off":
+        return {}
+    if mode == "json_schema":
+        return {
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": schema["name"], "schema": schema["schema"], "strict": True},
+            }
+        }
+    return {
+        "tools": [
+            {
+                "type": "function",
+                "function": {
+                    "name": schema["name"],
+                    "description": schema["description"],
+                    "parameters": schema["schema"],
+                },
+            }
+        ],
+        "tool_choice": {"type": "function", "function": {"name": schema["name"]}},
+    }
+
+
+def cache_variant(schema, mode=GPT_STRUCTURED_OUTPUT):
+    """Part of the cache key: the same prompt asked with another schema or mode is another answer."""
+    if schema is None or mode == "off":
+        return None
+    return f"{mode}:{schema['name']}"
+
+
+def response_content(response):
+    """Text of a completion: the arguments of the forced function call, or the message content."""
+    message = response.choices[0].message
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        return tool_calls[0].function.arguments
+    return message.content
+
+
+# --------------------------- Tolerant parsing --------------------------- #
+
+FENCE = re.compile(r"```(?:json|python)?\s*(.*?)```", re.S)
+BULLET = re.compile(r"^\s*(?:[-•*]|\d+[.)])\s*")
+NUMBER = re.compile(r"-?\d+(?:[.,]\d+)?")
+LEGACY_SUMMARY = re.compile(
+    r"R[ée]sum[ée]\s*:\s*(?P<summary>.*?)\s*Points cl[ée]s\s*:\s*(?P<key_points>.*?)"
+    r"\s*Score global\s*:\s*(?P<score>[^\n]*)",
+    re.S | re.I,
+)
+KEY_ALIASES = {
+    "resume": "summary",
+    "points_cles": "key_points",
+    "points": "key_points",
+    "forces": "strengths",
+    "faiblesses": "weaknesses",
+    "score_global": "score",
+    "note": "score",
+}
+
+
+def extract_json(text):
+    """First JSON object or list in `text`, tolerating code fences, prose around it and Python literals."""
+    if not text or not text.strip():
+        raise StructuredOutputError("réponse vide")
+    fenced = FENCE.search(text)
+    for candidate in ([fenced.group(1)] if fenced else []) + [text]:
+        starts = sorted(i for i in (candidate.find("{"), candidate.find("[")) if i != -1)
+        for start in starts:
+            end = candidate.rfind("}" if candidate[start] == "{" else "]")
+            if end <= start:
+                continue
+            snippet = candidate[start : end + 1]
+            for loads in (json.loads, ast.literal_eval):
+                try:
+                    return loads(snippet)
+                except (ValueError, SyntaxError):
+                    continue
+    raise StructuredOutputError("aucun objet JSON dans la réponse")
+
+
+def _normalize_key(key):
+    key = unicodedata.normalize("NFKD", str(key)).encode("ascii", "ignore").decode()
+    key = re.sub(r"[\s-]+", "_", key.strip().lower())
+    return KEY_ALIASES.get(key, key)
+
+
+def as_list(value):
+    """List of non-empty strings from a list, or from a text with one item per line/bullet."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.splitlines() if "\n" in value else [value]
+    items = [BULLET.sub("", str(item)).strip() for item in value]
+    return [item for item in items if item]
+
+
+def parse_score(value):
+    """Score between 0 and 100 from a number or a text such as "88%", "88/100" or "8,5 / 10"."""
+    if isinstance(value, bool) or value is None:
+        raise StructuredOutputError("score manquant")
+    if isinstance(value, (int, float)):
+        score = float(value)
+    else:
+        numbers = NUMBER.findall(str(value))
+        if not numbers:
+            raise StructuredOutputError(f"score illisible : {value!r}")
+        score = float(numbers[0].replace(",", "."))
+        if "/10" in str(value).replace(" ", "") and "/100" not in str(value).replace(" ", ""):
+            score *= 10
+    if not 0 <= score <= 100:
+        raise StructuredOutputError(f"score hors de [0, 100] : {score}")
+    return score
+
+
+def parse_summary(text):
+    """
+    Typed summary fields from a GPT answer: JSON (function call, JSON mode or JSON
+    inside prose), else the legacy "Résumé : / Points clés : / Score global :" text.
+    """
+    try:
+        data = extract_json(text)
+    except StructuredOutputError:
+        match = LEGACY_SUMMARY.search(text or "")
+        if match is None:
+            raise
+        data = match.groupdict()
+    if not isinstance(data, dict):
+        raise StructuredOutputError("un objet JSON est attendu")
+    data = {_normalize_key(key): value for key, value in data.items()}
+
+    errors = []
+    summary = str(data.get("summary") or "").strip()
+    if not summary:
+        errors.append("summary manquant")
+    score = None
+    try:
+        score = parse_score(data.get("score"))
+    except StructuredOutputError as e:
+        errors.append(str(e))
+    if errors:
+        raise StructuredOutputError(" ; ".join(errors))
+    return {
+        "summary": summary,
+        "key_points": as_list(data.get("key_points")),
+        "strengths": as_list(data.get("strengths")),
+        "weaknesses": as_list(data.get("weaknesses")),
+        "score": score,
+    }
+
+
+def parse_labels(text, expected):
+    """`expected` label names from {"labels": [...]}, a JSON/Python list, or one name per line."""
+    try:
+        data = extract_json(text)
+    except StructuredOutputError:
+        if not text or not text.strip():
+            raise
+        data = as_list(text.strip())
+    if isinstance(data, dict):
+        data = data.get("labels", next(iter(data.values()), None) if len(data) == 1 else None)
+    if not isinstance(data, list):
+        raise StructuredOutputError("une liste de labels est attendue")
+    labels = [str(label).strip().strip("\"'") for label in data]
+    if len(labels) != expected or not all(labels):
+        raise StructuredOutputError(f"{expected} labels non vides attendus, {len(labels)} reçus")
+    return labels
+
+
+# ------------------------------- Repair ------------------------------- #
+
+
+def get_repair_prompt(schema, answer, error):
+    return f"""La réponse ci-dessous devait être un objet JSON conforme à ce schéma :
+{json.dumps(schema["schema"], ensure_ascii=False)}
+
+Problème constaté : {error}
+
+Réponse à corriger :
+{answer}
+
+Renvoie uniquement l'objet JSON corrigé, sans changer le fond ni ajouter d'explications."""
+
+
+async def complete_structured(complete, prompt, schema, parse, stage, attempts=GPT_REPAIR_ATTEMPTS):
+    """
+    `parse` of the answer to `prompt`. When the answer cannot be parsed, only the
+    answer and the error are sent back (a short repair prompt, the reviews are not
+    resent), up to `attempts` times. `complete` is an async `(prompt, schema, stage)`
+    function. Returns (parsed or None, last answer, last error or None).
+    """
+    answer = await complete(prompt, schema, stage)
+    error = None
+    for attempt in range(attempts + 1):
+        try:
+            return parse(answer), answer, None
+        except StructuredOutputError as e:
+            error = e
+            record_error(stage, e)
+        # Sans réponse (erreur d'API), il n'y a rien à réparer
+        if attempt == attempts or not answer:
+            break
+        answer = await complete(get_repair_prompt(schema, answer, error), schema, "repair")
+    return None, answer, error
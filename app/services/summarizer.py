@@ -0,0 +1,298 @@
+import asyncio
+import random
+from collections import deque
+from time import monotonic
+
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    AsyncOpenAI,
+    RateLimitError,
+)
+
+from app.config import (
+    GPT_MAX_CONCURRENCY,
+    GPT_MAX_RETRIES,
+    GPT_MODEL,
+    GPT_REQUESTS_PER_MINUTE,
+    GPT_TEMPERATURE,
+    GPT_TOKENS_PER_MINUTE,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    SUMMARY_BATCH_TOKENS,
+    SUMMARY_FINAL_TOKENS,
+    SUMMARY_MAX_REDUCE_DEPTH,
+)
+from app.services.metrics import QUEUE_DEPTH, measure_gpt, record_gpt_usage
+from app.services.packing import count_tokens, pack_reviews, pack_texts
+from app.services.structured import (
+    SUMMARY_SCHEMA,
+    cache_variant,
+    complete_structured,
+    parse_summary,
+    request_options,
+    response_content,
+)
+
+
+def get_batch_prompt(name, batch_text):
+    return f"""
+    Tu es un assistant d'analyse d'avis pour des traiteurs de mariage.
+
+    Voici un extrait d'avis avec les thèmes principaux de chaque avis pour le traiteur **{name}** :
+
+    {batch_text}
+
+    Résume les points importants en quelques phrases.
+    """
+
+
+def get_reduce_prompt(name, summaries_text):
+    return f"""
+    Tu es un assistant d'analyse d'avis pour des traiteurs de mariage.
+
+    Voici plusieurs résumés partiels des avis pour le traiteur **{name}** :
+
+    {summaries_text}
+
+    Fusionne-les en un seul résumé de quelques phrases, sans perdre les points importants.
+    """
+
+
+def get_final_prompt(name, full_summary):
+    return f"""
+    Tu es un assistant d'analyse d'avis pour des traiteurs de mariage.
+
+    Voici les résumés intermédiaires des avis pour le traiteur **{name}** :
+
+    {full_summary}
+
+    Ta tâche :
+    1. Fais un résumé synthétique global des avis ("summary").
+    2. Analyse et synthétise les points majeurs évoqués ("key_points"), les forces ("strengths")
+       et les faiblesses ("weaknesses"), sous forme de listes de phrases courtes.
+    3. Attribue un score global subjectif sur 100 basé sur la qualité perçue ("score", un nombre).
+
+    Réponds uniquement avec un objet JSON de cette forme :
+    {{"summary": "Ce traiteur est connu pour sa qualité de service...", "key_points": ["..."], "strengths": ["..."], "weaknesses": ["..."], "score": 88}}
+    """
+
+
+class RateLimiter:
+    """Sliding one-minute window enforcing both a request and a token budget."""
+
+    def __init__(
+        self,
+        requests_per_minute=GPT_REQUESTS_PER_MINUTE,
+        tokens_per_minute=GPT_TOKENS_PER_MINUTE,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._window = deque()  # (timestamp, tokens)
+        self._tokens = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens):
+        # Une requête plus grosse que le budget passe seule, sinon elle attendrait indéfiniment
+        tokens = min(tokens, self.tokens_per_minute)
+        async with self._lock:
+            while True:
+                now = monotonic()
+                while self._window and now - self._window[0][0] >= 60:
+                    self._tokens -= self._window.popleft()[1]
+
+                if (
+                    len(self._window) < self.requests_per_minute
+                    and self._tokens + tokens <= self.tokens_per_minute
+                ):
+                    self._window.append((now, tokens))
+                    self._tokens += tokens
+                    return
+
+                await asyncio.sleep(60 - (now - self._window[0][0]))
+
+
+def is_retryable(error):
+    if isinstance(error, (RateLimitError, APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+class AsyncSummarizer:
+    """
+    Runs the per-venue map (batch prompts) and reduce (final prompt) steps concurrently
+    across venues, within the configured requests/tokens per minute budgets.
+    429 and 5xx responses are retried with exponential backoff and jitter.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        model=GPT_MODEL,
+        temperature=GPT_TEMPERATURE,
+        max_concurrency=GPT_MAX_CONCURRENCY,
+        max_retries=GPT_MAX_RETRIES,
+        rate_limiter=None,
+        backoff_base=1.0,
+        cache=None,
+    ):
+        self.client = client or AsyncOpenAI(
+            api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0
+        )
+        self.model = model
+        self.temperature = temperature
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.backoff_base = backoff_base
+        self.cache = cache
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def complete(self, prompt, stage="final", schema=None):
+        """Answer to `prompt`; with a `schema`, the JSON arguments of the structured answer."""
+        variant = cache_variant(schema)
+        if self.cache is not None:
+            cached = await self.cache.aget(self.model, self.temperature, prompt, variant)
+            if cached is not None:
+                return cached
+
+        for attempt in range(self.max_retries + 1):
+            # Requêtes en attente du rate limiter ou d'une place de concurrence
+            waiting = True
+            QUEUE_DEPTH.labels("gpt").inc()
+            try:
+                await self.rate_limiter.acquire(count_tokens(prompt))
+                async with self._semaphore:
+                    QUEUE_DEPTH.labels("gpt").dec()
+                    waiting = False
+                    with measure_gpt(stage, self.model):
+                        response = await self.client.chat.completions.create(
+                            model=self.model,
+                            messages=[{"role": "user", "content": prompt}],
+                            temperature=self.temperature,
+                            **request_options(schema),
+                        )
+                record_gpt_usage(stage, self.model, response)
+                content = response_content(response)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = self.backoff_base * 2**attempt
+                await asyncio.sleep(delay + random.uniform(0, delay))
+                continue
+            finally:
+                if waiting:
+                    QUEUE_DEPTH.labels("gpt").dec()
+
+            if self.cache is not None and content:
+                await self.cache.aset(self.model, self.temperature, prompt, content, variant)
+            return content
+
+    async def _complete_all(self, prompts, stage):
+        results = await asyncio.gather(
+            *(self.complete(prompt, stage) for prompt in prompts), return_exceptions=True
+        )
+        summaries = [r for r in results if isinstance(r, str)]
+        errors = [r for r in results if isinstance(r, BaseException)]
+        return summaries, errors
+
+    async def summarize_venue(self, entry):
+        """
+        Map-reduce summary of one venue: reviews are packed into prompts of
+        SUMMARY_BATCH_TOKENS, then the intermediate summaries are merged level by
+        level until they fit in one final prompt of SUMMARY_FINAL_TOKENS. If they
+        still do not fit after SUMMARY_MAX_REDUCE_DEPTH levels, the last ones are
+        dropped (and a lone oversized summary truncated).
+        The final answer is a structured (JSON) summary; if it does not parse, only
+        the answer is sent back for repair, so the map/reduce calls are not wasted.
+        Returns (typed summary dict or None, raw final answer, batch errors).
+        """
+        name = entry["cateringCompanyName"]
+        summaries, errors = await self._complete_all(
+            [
+                get_batch_prompt(name, batch_text)
+                for batch_text in pack_reviews(entry["reviews"], SUMMARY_BATCH_TOKENS)
+            ],
+            stage="map",
+        )
+
+        depth = 0
+        while (
+            len(summaries) > 1
+            and depth < SUMMARY_MAX_REDUCE_DEPTH
+            and count_tokens("\n\n".join(summaries)) > SUMMARY_FINAL_TOKENS
+        ):
+            summaries, reduce_errors = await self._complete_all(
+                [
+                    get_reduce_prompt(name, "\n\n".join(group))
+                    for group in pack_texts(summaries, SUMMARY_FINAL_TOKENS)
+                ],
+                stage="reduce",
+            )
+            errors += reduce_errors
+            depth += 1
+
+        if count_tokens("\n\n".join(summaries)) > SUMMARY_FINAL_TOKENS:
+            # Profondeur maximale atteinte : on garde les premiers résumés qui tiennent dans le budget
+            # (un séparateur compte pour un token)
+            kept = next(pack_texts(summaries, SUMMARY_FINAL_TOKENS - len(summaries)), [])
+            print(
+                f"⚠️ {name} : prompt final au-delà de {SUMMARY_FINAL_TOKENS} tokens après "
+                f"{depth} niveaux de fusion, {len(summaries) - len(kept)} résumés partiels écartés"
+            )
+            summaries = kept
+
+        parsed, result, _ = await complete_structured(
+            lambda prompt, schema, stage: self.complete(prompt, stage, schema),
+            get_final_prompt(name, "\n\n".join(summaries)),
+            SUMMARY_SCHEMA,
+            parse_summary,
+            stage="final",
+        )
+        return parsed, result, errors
+
+    async def summarize_venues(self, entries, max_pending_venues=None):
+        """
+        Yield (entry, outcome, error) as soon as each venue is done.
+        `entries` can be a list or an async iterator; at most `max_pending_venues`
+        venues are in flight, so a streamed input is never fully materialized.
+        """
+        max_pending_venues = max_pending_venues or self.max_concurrency * 4
+
+        async def run(entry):
+            try:
+                return entry, await self.summarize_venue(entry), None
+            except Exception as e:
+                return entry, None, e
+
+        async def iterate():
+            if hasattr(entries, "__aiter__"):
+                async for entry in entries:
+                    yield entry
+            else:
+                for entry in entries:
+                    yield entry
+
+        pending = set()
+        try:
+            async for entry in iterate():
+                pending.add(asyncio.create_task(run(entry)))
+                QUEUE_DEPTH.labels("venues").set(len(pending))
+                if len(pending) >= max_pending_venues:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        yield task.result()
+
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+        finally:
+            QUEUE_DEPTH.labels("venues").set(0)
+            for task in pending:
+                task.cancel()
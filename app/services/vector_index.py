@@ -0,0 +1,437 @@
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from bson import Binary, ObjectId
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
+
+from app.config import (
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    HNSW_M,
+    REVIEWS_CHUNK_SIZE,
+    REVIEWS_CURSOR_BATCH_SIZE,
+    VECTOR_INDEX_BACKEND,
+    VECTOR_INDEX_DIR,
+    VECTOR_INDEX_LEASE_SECONDS,
+    VECTOR_INDEX_SYNC_SECONDS,
+)
+from app.db.mongo import iter_chunks
+
+try:
+    import hnswlib
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    hnswlib = None
+
+INITIAL_CAPACITY = 1024
+SCAN_BLOCK = 65536
+WRITER_ID = f"{socket.gethostname()}:{os.getpid()}:{ObjectId()}"
+
+
+def encode_embedding(vector):
+    return Binary(np.asarray(vector, dtype=np.float16).tobytes())
+
+
+def decode_embedding(data):
+    return np.frombuffer(data, dtype=np.float16)
+
+
+def _atomic_save(path, save):
+    """
+    Call `save` with a temporary path next to `path`, then rename it over `path`:
+    a concurrent reader never sees a partial file, and each writer has its own temporary file.
+    """
+    fd, tmp = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.", suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        save(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _atomic_write(path, write, mode="wb"):
+    """`_atomic_save` for a function writing to a file object."""
+
+    def save(tmp):
+        with open(tmp, mode) as f:
+            write(f)
+
+    _atomic_save(path, save)
+
+
+class VectorIndex:
+    """
+    Nearest-neighbour index over L2-normalised vectors, keyed by string ids.
+    Uses an HNSW graph (hnswlib) when available, an exact scan of a float16
+    matrix otherwise. Vectors are added, replaced or removed in place: the index
+    follows the collection incrementally and is never rebuilt. A removed key
+    leaves an empty slot (`None` in `keys`), skipped by searches.
+    """
+
+    def __init__(self, dim, backend=VECTOR_INDEX_BACKEND):
+        self.dim = dim
+        self.backend = "hnsw" if backend == "hnsw" and hnswlib is not None else "exact"
+        self.keys = []
+        self.positions = {}
+        self.lock = threading.Lock()
+        self._hnsw = None
+        self._vectors = None
+        if self.backend == "hnsw":
+            # Vecteurs normalisés : le produit scalaire est la similarité cosinus
+            self._hnsw = hnswlib.Index(space="ip", dim=dim)
+            self._hnsw.init_index(
+                max_elements=INITIAL_CAPACITY, ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M
+            )
+        else:
+            self._vectors = np.empty((INITIAL_CAPACITY, dim), dtype=np.float16)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _reserve(self, needed):
+        if self.backend == "hnsw":
+            capacity = self._hnsw.get_max_elements()
+            if needed > capacity:
+                self._hnsw.resize_index(max(needed, 2 * capacity))
+        elif needed > len(self._vectors) or not self._vectors.flags.writeable:
+            # Un index relu par memmap est en lecture seule : copie au premier ajout
+            vectors = np.empty((max(needed, 2 * len(self._vectors)), self.dim), dtype=np.float16)
+            vectors[: len(self.keys)] = self._vectors[: len(self.keys)]
+            self._vectors = vectors
+
+    def add(self, keys, vectors):
+        """Add vectors, or replace those of keys that are already indexed."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with self.lock:
+            new_keys = {key for key in keys if key not in self.positions}
+            self._reserve(len(self.keys) + len(new_keys))
+            positions = []
+            for key in keys:
+                if key not in self.positions:
+                    self.positions[key] = len(self.keys)
+                    self.keys.append(key)
+                positions.append(self.positions[key])
+
+            if self.backend == "hnsw":
+                self._hnsw.add_items(vectors, np.asarray(positions))
+            else:
+                self._vectors[positions] = vectors
+
+    def remove(self, keys):
+        """Remove keys from the index; unknown keys are ignored. Returns the number removed."""
+        with self.lock:
+            positions = [self.positions.pop(key) for key in keys if key in self.positions]
+            for position in positions:
+                self.keys[position] = None
+                if self.backend == "hnsw":
+                    self._hnsw.mark_deleted(position)
+        return len(positions)
+
+    def get(self, key):
+        position = self.positions.get(key)
+        if position is None:
+            return None
+        with self.lock:
+            if self.backend == "hnsw":
+                return np.asarray(self._hnsw.get_items([position])[0], dtype=np.float32)
+            return self._vectors[position].astype(np.float32)
+
+    def search(self, vector, k, exclude=()):
+        """The `k` nearest keys with their cosine similarity, best first."""
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        with self.lock:
+            count = len(self.keys)
+            if not self.positions:
+                return []
+            k_query = min(len(self.positions), k + len(exclude))
+            if self.backend == "hnsw":
+                self._hnsw.set_ef(max(HNSW_EF_SEARCH, k_query))
+                positions, distances = self._hnsw.knn_query(vector, k=k_query)
+                hits = zip(positions[0], 1.0 - distances[0])
+            else:
+                # Scan par blocs pour ne jamais convertir toute la matrice en float32
+                scores = np.concatenate(
+                    [
+                        self._vectors[i : min(i + SCAN_BLOCK, count)].astype(np.float32) @ vector
+                        for i in range(0, count, SCAN_BLOCK)
+                    ]
+                )
+                if len(self.positions) < count:
+                    # Emplacements des clés retirées
+                    scores[[p for p, key in enumerate(self.keys) if key is None]] = -np.inf
+                top = np.argpartition(-scores, k_query - 1)[:k_query]
+                top = top[np.argsort(-scores[top])]
+                hits = zip(top, scores[top])
+
+        results = [(self.keys[p], float(score)) for p, score in hits]
+        results = [(key, score) for key, score in results if key is not None and key not in exclude]
+        return results[:k]
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            if self.backend == "hnsw":
+                _atomic_save(os.path.join(directory, "index.bin"), self._hnsw.save_index)
+            else:
+                _atomic_write(
+                    os.path.join(directory, "vectors.npy"),
+                    lambda f: np.save(f, self._vectors[: len(self.keys)]),
+                )
+            meta = {"dim": self.dim, "backend": self.backend, "keys": self.keys}
+            _atomic_write(
+                os.path.join(directory, "index.json"), lambda f: json.dump(meta, f), mode="w"
+            )
+
+    @classmethod
+    def load(cls, directory):
+        """Load a saved index, or return None if there is none (or its backend is unavailable)."""
+        meta_path = os.path.join(directory, "index.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta["backend"] == "hnsw" and hnswlib is None:
+            return None
+
+        index = cls.__new__(cls)
+        index.dim = meta["dim"]
+        index.backend = meta["backend"]
+        index.keys = meta["keys"]
+        index.positions = {key: i for i, key in enumerate(index.keys) if key is not None}
+        index.lock = threading.Lock()
+        index._hnsw = None
+        index._vectors = None
+        if index.backend == "hnsw":
+            index._hnsw = hnswlib.Index(space="ip", dim=index.dim)
+            index._hnsw.load_index(
+                os.path.join(directory, "index.bin"),
+                max_elements=max(len(index.keys), INITIAL_CAPACITY),
+            )
+        else:
+            index._vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        return index
+
+
+def _venue_key(venue):
+    return str(venue) if venue is not None else None
+
+
+class ReviewIndex:
+    """
+    Nearest-neighbour index over the review embeddings stored in Mongo (`aiEmbedding`),
+    plus one mean embedding per venue for the "similar caterers" query.
+    `sync` only pulls the reviews embedded since the last sync (`aiEmbeddedAt`); a
+    re-embedded review replaces its previous vector, and reviews found deleted from
+    Mongo are removed with `remove`. Queries only read the current index: syncs run
+    at the end of the pipeline and from `sync_review_indexes`.
+
+    Every process keeps its own copy in memory, but only the holder of the Mongo
+    lease of the directory (`index_leases` collection) writes it to disk.
+    """
+
+    def __init__(self, dataset, directory=VECTOR_INDEX_DIR):
+        self.dataset = dataset
+        self.directory = os.path.join(directory, dataset)
+        self.index = None
+        self.venue_of = {}
+        self.venue_sums = {}
+        self.venue_counts = {}
+        self.synced_at = None
+        # Avis déjà indexés portant la date `synced_at` : ignorés au sync suivant
+        self.synced_keys = set()
+        self._dirty = False
+        self._loaded = False
+        self._sync_lock = asyncio.Lock()
+
+    def _load(self):
+        self.index = VectorIndex.load(self.directory)
+        state_path = os.path.join(self.directory, "venues.npz")
+        if self.index is None or not os.path.exists(state_path):
+            self.index = None
+            return
+        state = np.load(state_path, allow_pickle=False)
+        self.venue_of = {
+            key: venue
+            for key, venue in zip(self.index.keys, state["venue_of"].tolist())
+            if key is not None and venue
+        }
+        self.venue_sums = dict(zip(state["venues"].tolist(), state["sums"]))
+        self.venue_counts = dict(zip(state["venues"].tolist(), state["counts"].tolist()))
+        synced_at = str(state["synced_at"])
+        self.synced_at = datetime.fromisoformat(synced_at) if synced_at else None
+        self.synced_keys = set(state["synced_keys"].tolist()) if "synced_keys" in state else set()
+
+    def _save(self):
+        self.index.save(self.directory)
+        venues = list(self.venue_sums)
+        _atomic_write(
+            os.path.join(self.directory, "venues.npz"),
+            lambda f: np.savez(
+                f,
+                venue_of=np.asarray([self.venue_of.get(key) or "" for key in self.index.keys]),
+                venues=np.asarray(venues, dtype=str),
+                sums=np.asarray([self.venue_sums[v] for v in venues], dtype=np.float32).reshape(
+                    len(venues), self.index.dim
+                ),
+                counts=np.asarray([self.venue_counts[v] for v in venues], dtype=np.int64),
+                synced_at=np.asarray(self.synced_at.isoformat() if self.synced_at else ""),
+                synced_keys=np.asarray(sorted(self.synced_keys), dtype=str),
+            ),
+        )
+
+    def _forget_venue(self, key):
+        """Remove the contribution of an indexed review to its venue's mean."""
+        old_venue = self.venue_of.pop(key, None)
+        if old_venue:
+            self.venue_sums[old_venue] = self.venue_sums[old_venue] - self.index.get(key)
+            self.venue_counts[old_venue] -= 1
+
+    def _add_reviews(self, reviews):
+        keys = [str(review["_id"]) for review in reviews]
+        vectors = np.stack([decode_embedding(review["aiEmbedding"]) for review in reviews])
+        if self.index is None:
+            self.index = VectorIndex(vectors.shape[1])
+
+        # Un avis ré-embeddé remplace son ancienne contribution à la moyenne du traiteur
+        for key, review, vector in zip(keys, reviews, vectors.astype(np.float32)):
+            self._forget_venue(key)
+            venue = _venue_key(review.get("venue"))
+            if venue:
+                self.venue_sums[venue] = self.venue_sums.get(venue, 0) + vector
+                self.venue_counts[venue] = self.venue_counts.get(venue, 0) + 1
+                self.venue_of[key] = venue
+        self.index.add(keys, vectors)
+        self._dirty = True
+
+    def remove(self, review_ids):
+        """Drop reviews deleted from Mongo. Returns the number of reviews removed."""
+        if self.index is None:
+            return 0
+        keys = [str(review_id) for review_id in review_ids]
+        keys = [key for key in keys if self.index.get(key) is not None]
+        for key in keys:
+            self._forget_venue(key)
+        removed = self.index.remove(keys)
+        self._dirty = self._dirty or bool(removed)
+        return removed
+
+    async def _pull(self, db):
+        query = {"aiEmbedding": {"$exists": True}}
+        if self.synced_at is not None:
+            # $gte : un batch partiellement visible lors du dernier sync est repris,
+            # mais ses avis déjà indexés (synced_keys) ne sont pas ajoutés une seconde fois
+            query["aiEmbeddedAt"] = {"$gte": self.synced_at}
+        cursor = (
+            db[self.dataset]
+            .find(query, {"aiEmbedding": 1, "venue": 1, "aiEmbeddedAt": 1})
+            .sort("aiEmbeddedAt", 1)
+            .batch_size(REVIEWS_CURSOR_BATCH_SIZE)
+        )
+        indexed = 0
+        async for chunk in iter_chunks(cursor, REVIEWS_CHUNK_SIZE):
+            new = [
+                review
+                for review in chunk
+                if review["aiEmbeddedAt"] != self.synced_at
+                or str(review["_id"]) not in self.synced_keys
+            ]
+            if new:
+                await run_in_threadpool(self._add_reviews, new)
+            for review in chunk:
+                if review["aiEmbeddedAt"] != self.synced_at:
+                    self.synced_at, self.synced_keys = review["aiEmbeddedAt"], set()
+                self.synced_keys.add(str(review["_id"]))
+            indexed += len(new)
+        return indexed
+
+    async def _acquire_writer(self, db):
+        """Take or renew the lease on the index directory; False if another process holds it."""
+        now = datetime.now(timezone.utc)
+        lease = f"{socket.gethostname()}:{os.path.abspath(self.directory)}"
+        try:
+            await db["index_leases"].update_one(
+                {"_id": lease, "$or": [{"owner": WRITER_ID}, {"expires_at": {"$lt": now}}]},
+                {
+                    "$set": {
+                        "owner": WRITER_ID,
+                        "expires_at": now + timedelta(seconds=VECTOR_INDEX_LEASE_SECONDS),
+                    }
+                },
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def sync(self, db):
+        """Index the reviews embedded since the last sync. Returns the number of reviews indexed."""
+        async with self._sync_lock:
+            if not self._loaded:
+                await db[self.dataset].create_index("aiEmbeddedAt")
+                await run_in_threadpool(self._load)
+                self._loaded = True
+
+            indexed = await self._pull(db)
+            if self._dirty and await self._acquire_writer(db):
+                await run_in_threadpool(self._save)
+                self._dirty = False
+            return indexed
+
+    def get(self, review_id):
+        return self.index.get(str(review_id)) if self.index else None
+
+    def similar_reviews(self, vector, k, exclude=()):
+        if not self.index:
+            return []
+        return self.index.search(vector, k, exclude={str(e) for e in exclude})
+
+    def venue_vector(self, venue):
+        venue = _venue_key(venue)
+        if not self.venue_counts.get(venue):
+            return None
+        mean = self.venue_sums[venue] / self.venue_counts[venue]
+        return mean / max(np.linalg.norm(mean), 1e-12)
+
+    def similar_venues(self, venue, k):
+        """Venues whose mean review embedding is closest to `venue`'s, best first."""
+        target = self.venue_vector(venue)
+        if target is None:
+            return None
+        venues = [v for v, count in self.venue_counts.items() if count and v != _venue_key(venue)]
+        if not venues:
+            return []
+        means = np.stack([self.venue_vector(v) for v in venues])
+        scores = means @ target
+        top = np.argsort(-scores)[:k]
+        return [(venues[i], float(scores[i]), self.venue_counts[venues[i]]) for i in top]
+
+
+_indexes = {}
+
+
+def get_review_index(dataset="reviews"):
+    if dataset not in _indexes:
+        _indexes[dataset] = ReviewIndex(dataset)
+    return _indexes[dataset]
+
+
+async def sync_review_indexes(db, datasets, interval=VECTOR_INDEX_SYNC_SECONDS):
+    """Keep the indexes of `datasets` up to date in the background, off the request path."""
+    while True:
+        for dataset in datasets:
+            try:
+                await get_review_index(dataset).sync(db)
+            except Exception as e:
+                print(f"⚠️ Sync de l'index {dataset} : {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,183 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+import numpy as np
+
+from app.config import INFERENCE_THREADS, INFERENCE_WORKERS
+from app.services.inference import (
+    classify_batch,
+    cluster_sets,
+    embed_batch,
+    load_classifier,
+    load_clusterer,
+    pin_torch_threads,
+)
+
+# Modèles propres à chaque processus worker, chargés une seule fois par l'initializer
+_classifier = None
+_clusterer = None
+
+
+def _init_worker(threads):
+    global _classifier, _clusterer
+    pin_torch_threads(threads)
+    _classifier = load_classifier()
+    _clusterer = load_clusterer()
+
+
+def _infer_shard(texts, label_sets, hypothesis_template, classify, cascade):
+    sentiments = classify_batch(_classifier, texts) if classify else None
+    clusters = (
+        cluster_sets(_clusterer, texts, label_sets, hypothesis_template, sentiments, cascade)
+        if label_sets
+        else []
+    )
+    return sentiments, clusters
+
+
+def _embed_shard(texts):
+    return embed_batch(_clusterer, texts)
+
+
+def _ping():
+    # Ne répond qu'une fois l'initializer (chargement des modèles) terminé
+    return os.getpid()
+
+
+def split_shards(items, shards):
+    """Split items into at most `shards` contiguous, evenly sized shards."""
+    size, extra = divmod(len(items), shards)
+    start = 0
+    for i in range(shards):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            yield items[start:end]
+        start = end
+
+
+class InferencePool:
+    """
+    Pool of inference processes, each holding its own classifier and clusterer
+    with torch pinned to `threads` intra-op threads.
+    Processes are spawned (not forked) so that they never inherit torch state
+    from the API process, which does not need to load the models at all.
+    """
+
+    def __init__(self, workers=INFERENCE_WORKERS, threads=INFERENCE_THREADS):
+        self.workers = workers
+        self.state = "pending"
+        self.load_seconds = None
+        self.error = None
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(threads,),
+        )
+
+    async def infer(self, texts, candidate_labels, hypothesis_template, classify=True):
+        """
+        Classify and cluster `texts`, one shard per worker. Results keep the input order.
+        Classification is skipped without `classify`, clustering without `candidate_labels`
+        (the corresponding result is None).
+        """
+        sentiments, clusters = await self.infer_many(
+            texts,
+            [candidate_labels] if candidate_labels else [],
+            hypothesis_template,
+            classify,
+        )
+        return sentiments, clusters[0] if candidate_labels else None
+
+    async def infer_many(
+        self, texts, label_sets, hypothesis_template, classify=True, cascade=False
+    ):
+        """
+        Like `infer`, with the clusters of `texts` for each label set of `label_sets`.
+        With `cascade`, each worker gates the NLI pass with its classification results.
+        """
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    self.executor,
+                    _infer_shard,
+                    shard,
+                    [list(labels) for labels in label_sets],
+                    hypothesis_template,
+                    classify,
+                    cascade,
+                )
+                for shard in split_shards(texts, self.workers)
+            )
+        )
+        sentiments = [s for shard_sentiments, _ in results for s in shard_sentiments or []]
+        clusters = [
+            [c for _, shard_clusters in results for c in shard_clusters[i]]
+            for i in range(len(label_sets))
+        ]
+        return sentiments if classify else None, clusters
+
+    async def embed(self, texts):
+        """Embeddings of `texts` (float16 array), one shard per worker."""
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(self.executor, _embed_shard, shard)
+                for shard in split_shards(texts, self.workers)
+            )
+        )
+        return np.vstack(results)
+
+    async def warm_up(self):
+        """Start every worker and wait until each has loaded its models."""
+        self.state = "loading"
+        start = perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(
+                *(loop.run_in_executor(self.executor, _ping) for _ in range(self.workers))
+            )
+        except Exception as e:
+            self.state, self.error = "failed", str(e)
+            print(f"❌ Échec du démarrage des workers d'inférence : {e}")
+            return
+        self.state, self.error = "ready", None
+        self.load_seconds = perf_counter() - start
+        print(f"✅ {self.workers} workers d'inférence prêts en {self.load_seconds:.1f}s")
+
+    def status(self):
+        return {
+            "state": self.state,
+            "workers": self.workers,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+
+
+def get_inference_pool():
+    global _pool
+    if _pool is None:
+        _pool = InferencePool()
+    return _pool
+
+
+def inference_pool_status():
+    """State of the pool, or None when it has not been created (lazy mode, no workers)."""
+    return _pool.status() if _pool is not None else None
+
+
+def shutdown_inference_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
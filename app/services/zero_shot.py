@@ -0,0 +1,247 @@
+from collections import OrderedDict
+
+import torch
+from transformers import AutoTokenizer
+
+from app.config import (
+    HYPOTHESIS_CACHE_SIZE,
+    HYPOTHESIS_TEMPLATE,
+    INFERENCE_BACKEND,
+    INFERENCE_MAX_LENGTH,
+    INFERENCE_QUANTIZE,
+    ZERO_SHOT_MODE,
+)
+from app.services.backends import load_encoder, load_sequence_classifier
+from app.services.label_sets import labels_version
+
+
+def _ranked(text, labels, scores):
+    """Result in the pipeline's format: labels sorted by decreasing score."""
+    ranked = sorted(zip(labels, scores), key=lambda x: x[1], reverse=True)
+    return {
+        "sequence": text,
+        "labels": [label for label, _ in ranked],
+        "scores": [score for _, score in ranked],
+    }
+
+
+class LRUCache:
+    """Small in-process LRU mapping, evicting the least recently used entry past `maxsize`."""
+
+    def __init__(self, maxsize=HYPOTHESIS_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key, compute):
+        if key in self._data:
+            self._data.move_to_end(key)
+            return self._data[key]
+        value = self._data[key] = compute()
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return value
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ZeroShotEngine:
+    """
+    Drop-in replacement for the `zero-shot-classification` pipeline.
+
+    Each review is tokenized once and the hypothesis token IDs are cached per
+    (template, label-set version) in an LRU, so the N premise/hypothesis pairs are
+    assembled from token IDs instead of re-tokenizing the review N times.
+    Several label sets are scored in one pass over the union of their labels
+    (see `classify_many`).
+    In "bi-encoder" mode the NLI head is skipped altogether: reviews and hypotheses
+    are embedded separately and compared with a cosine similarity, so each review
+    goes through the model once instead of once per label.
+    """
+
+    def __init__(
+        self,
+        model_name,
+        mode=ZERO_SHOT_MODE,
+        max_length=INFERENCE_MAX_LENGTH,
+        temperature=0.05,
+        model=None,
+        tokenizer=None,
+        encoder=None,
+        backend=INFERENCE_BACKEND,
+        quantize=INFERENCE_QUANTIZE,
+    ):
+        if mode not in ("cross-encoder", "bi-encoder"):
+            raise ValueError(f"Unknown zero-shot mode: {mode}")
+
+        self.tokenizer = tokenizer or AutoTokenizer.from_pretrained(model_name)
+        self.model = model or load_sequence_classifier(model_name, backend, quantize)
+        if hasattr(self.model, "eval"):
+            self.model.eval()
+        self.model_name = model_name
+        self.backend = backend
+        self.encoder = encoder
+        if mode == "bi-encoder" and self.encoder is None:
+            self.encoder = load_encoder(model_name, self.model, backend)
+        self.mode = mode
+        self.max_length = max_length
+        self.temperature = temperature
+        self.entailment_id = self._find_entailment_id()
+        self._hypothesis_ids = LRUCache()
+        self._hypothesis_embeddings = LRUCache()
+
+    def _find_entailment_id(self):
+        for label, idx in self.model.config.label2id.items():
+            if label.lower().startswith("entail"):
+                return idx
+        return -1
+
+    def hypothesis_ids(self, candidate_labels, hypothesis_template):
+        return self._hypothesis_ids.get(
+            (hypothesis_template, labels_version(candidate_labels)),
+            lambda: self.tokenizer(
+                [hypothesis_template.format(label) for label in candidate_labels],
+                add_special_tokens=False,
+            )["input_ids"],
+        )
+
+    def __call__(
+        self,
+        sequences,
+        candidate_labels,
+        hypothesis_template=HYPOTHESIS_TEMPLATE,
+        batch_size=32,
+    ):
+        single = isinstance(sequences, str)
+        texts = [sequences] if single else list(sequences)
+        results = self.classify_many(texts, [candidate_labels], hypothesis_template, batch_size)[0]
+        return results[0] if single else results
+
+    def classify_many(
+        self,
+        texts,
+        label_sets,
+        hypothesis_template=HYPOTHESIS_TEMPLATE,
+        batch_size=32,
+        mode=None,
+    ):
+        """
+        Results of `texts` for each label set of `label_sets`, in the same order.
+        The texts go through the model once, against the union of the labels, and
+        each set's scores are then normalised over its own labels: overlapping
+        label sets cost no more than one, disjoint ones only their extra labels.
+        `mode` overrides the engine's mode (e.g. a cheap bi-encoder ranking).
+        """
+        label_sets = [list(labels) for labels in label_sets]
+        union = list(dict.fromkeys(label for labels in label_sets for label in labels))
+
+        if (mode or self.mode) == "bi-encoder":
+            logits = self._bi_encoder_logits(texts, union, hypothesis_template)
+        else:
+            logits = self._cross_encoder_logits(texts, union, hypothesis_template, batch_size)
+
+        position = {label: i for i, label in enumerate(union)}
+        return [
+            [
+                _ranked(text, labels, row)
+                for text, row in zip(
+                    texts,
+                    logits[:, [position[label] for label in labels]].softmax(dim=-1).tolist(),
+                )
+            ]
+            for labels in label_sets
+        ]
+
+    def classify_each(
+        self,
+        texts,
+        candidate_labels,
+        label_lists,
+        hypothesis_template=HYPOTHESIS_TEMPLATE,
+        batch_size=32,
+    ):
+        """
+        Cross-encoder results of each text against its own subset of `candidate_labels`
+        (`label_lists[i]` for `texts[i]`), e.g. a few labels pre-ranked per review.
+        The hypotheses come from the cache entry of the whole label set.
+        """
+        candidate_labels = list(candidate_labels)
+        hypothesis_ids = self.hypothesis_ids(candidate_labels, hypothesis_template)
+        position = {label: i for i, label in enumerate(candidate_labels)}
+        logits = self._pair_logits(
+            texts,
+            [[hypothesis_ids[position[label]] for label in labels] for labels in label_lists],
+            batch_size,
+        )
+        return [
+            _ranked(text, labels, row.softmax(dim=-1).tolist())
+            for text, labels, row in zip(texts, label_lists, logits)
+        ]
+
+    # --------------------------- Cross-encoder --------------------------- #
+
+    def _cross_encoder_logits(self, texts, candidate_labels, hypothesis_template, batch_size):
+        hypothesis_ids = self.hypothesis_ids(candidate_labels, hypothesis_template)
+        logits = self._pair_logits(texts, [hypothesis_ids] * len(texts), batch_size)
+        # Softmax over the labels (done by the caller) = the pipeline with multi_label=False
+        return torch.stack(logits)
+
+    def _pair_logits(self, texts, hypotheses, batch_size):
+        """Entailment logits of each text against its own hypotheses (token IDs), one tensor per text."""
+        longest_hypothesis = max(len(ids) for per_text in hypotheses for ids in per_text)
+        special_tokens = self.tokenizer.num_special_tokens_to_add(pair=True)
+
+        # Each premise is tokenized once, truncated so that every pair fits in max_length
+        premise_ids = self.tokenizer(
+            texts,
+            add_special_tokens=False,
+            truncation=True,
+            max_length=self.max_length - longest_hypothesis - special_tokens,
+        )["input_ids"]
+
+        pairs = [
+            self.tokenizer.build_inputs_with_special_tokens(premise, hypothesis)
+            for premise, per_text in zip(premise_ids, hypotheses)
+            for hypothesis in per_text
+        ]
+
+        entail_logits = []
+        pair_batch_size = max(batch_size, 1) * max(len(per_text) for per_text in hypotheses)
+        with torch.inference_mode():
+            for i in range(0, len(pairs), pair_batch_size):
+                inputs = self.tokenizer.pad(
+                    {"input_ids": pairs[i : i + pair_batch_size]}, return_tensors="pt"
+                )
+                logits = self.model(**inputs).logits
+                entail_logits.append(logits[:, self.entailment_id])
+
+        return torch.cat(entail_logits).split([len(per_text) for per_text in hypotheses])
+
+    # ---------------------------- Bi-encoder ---------------------------- #
+
+    def embed(self, texts):
+        # En mode cross-encoder, l'encodeur n'est chargé que si des embeddings sont demandés
+        if self.encoder is None:
+            self.encoder = load_encoder(self.model_name, self.model, self.backend)
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="pt",
+        )
+        with torch.inference_mode():
+            hidden = self.encoder(**inputs).last_hidden_state
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        return torch.nn.functional.normalize(pooled, dim=-1)
+
+    def hypothesis_embeddings(self, candidate_labels, hypothesis_template):
+        return self._hypothesis_embeddings.get(
+            (hypothesis_template, labels_version(candidate_labels)),
+            lambda: self.embed([hypothesis_template.format(label) for label in candidate_labels]),
+        )
+
+    def _bi_encoder_logits(self, texts, candidate_labels, hypothesis_template):
+        labels = self.hypothesis_embeddings(candidate_labels, hypothesis_template)
+        return (self.embed(texts) @ labels.T) / self.temperature
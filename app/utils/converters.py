@@ -10,3 +10,8 @@ def convert_objectids(obj):
         return str(obj)
     else:
         return obj
+
+
+def parse_object_id(value):
+    """ObjectId for a valid 24-hex string, the value itself otherwise."""
+    return ObjectId(value) if ObjectId.is_valid(value) else value
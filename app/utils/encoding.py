@@ -1,9 +1,18 @@
+import re
+
+# Séquences typiques d'un texte UTF-8 décodé en latin-1 / cp1252 ("Ã©", "Ã¨", "â€™"...)
+MOJIBAKE = re.compile(r"[ÂÃâ][\u0080-¿ŒœŠšŸŽžƒˆ˜–-›€™]")
+
+
 def fix_encoding(text: str) -> str:
-    try:
-        if any(
-            char in text for char in ["Ã", "�", "Ã©", "Ã¨"]
-        ):  # symboles typiques de corruption
-            return text.encode("latin1").decode("utf-8")
+    if not MOJIBAKE.search(text):
         return text
-    except Exception:
-        return text  # fallback sans crash
+    for encoding in ("cp1252", "latin1"):
+        try:
+            repaired = text.encode(encoding).decode("utf-8")
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            continue
+        # On ne garde la réparation que si elle fait disparaître des symboles de corruption
+        if len(MOJIBAKE.findall(repaired)) < len(MOJIBAKE.findall(text)):
+            return repaired
+    return text  # fallback sans crash
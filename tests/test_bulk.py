@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+from app.db.bulk import BulkWriter  # noqa: E402
+from app.db.mongo import create_client  # noqa: E402
+
+
+@pytest.fixture
+def collection():
+    return create_client("mongomock://")["test"]["reviews"]
+
+
+def test_updates_are_flushed_by_count(collection):
+    async def run():
+        writer = BulkWriter(collection, batch_size=3, flush_interval=float("inf"))
+        for i in range(4):
+            await writer.set({"_id": i}, {"n": i}, upsert=True)
+        return writer, await collection.count_documents({})
+
+    writer, written = asyncio.run(run())
+    assert written == 3
+    assert len(writer.pending) == 1
+
+
+def test_idle_updates_are_flushed_by_the_timer(collection):
+    async def run():
+        async with BulkWriter(collection, batch_size=100, flush_interval=0.05) as writer:
+            await writer.set({"_id": 1}, {"n": 1}, upsert=True)
+            # Aucun autre set() : seul le timer peut écrire la mise à jour
+            await asyncio.sleep(0.2)
+            return await collection.count_documents({}), writer.matched
+
+    assert asyncio.run(run()) == (1, 0)
+
+
+def test_pending_updates_are_flushed_on_exit(collection):
+    async def run():
+        async with BulkWriter(collection, batch_size=100, flush_interval=60) as writer:
+            await writer.set({"_id": 1}, {"n": 1}, upsert=True)
+            await writer.set({"_id": 1}, {"n": 2}, upsert=True)
+        return await collection.find_one({"_id": 1}), writer._timer
+
+    doc, timer = asyncio.run(run())
+    assert doc == {"_id": 1, "n": 2}
+    assert timer is None
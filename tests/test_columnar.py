@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+from bson import ObjectId
+
+pytest.importorskip("mongomock_motor")
+
+from app.db.mongo import create_client  # noqa: E402
+from app.services.columnar import export_collection, import_collection, read_table  # noqa: E402
+
+VENUE = ObjectId()
+REVIEWS = [
+    {
+        "_id": ObjectId(),
+        "venue": VENUE,
+        "rating": 5,
+        "text": "Repas excellent",
+        "aiSentiment": "positive",
+        "aiConfidenceScore": 0.97,
+        "aiClusters": [{"label": "nourriture", "score": 0.8}],
+        "aiEmbeddedAt": datetime(2026, 1, 1, tzinfo=timezone.utc),
+    },
+    # Note manquante, puis absente : la colonne reste entière
+    {"_id": ObjectId(), "venue": VENUE, "rating": None, "text": "Sans note"},
+    {"_id": ObjectId(), "venue": None, "text": "Sans traiteur", "tags": ["mariage"]},
+    # Note décimale : hors du type de la colonne, conservée dans "extra"
+    {"_id": ObjectId(), "venue": VENUE, "rating": 4.5, "text": "Demi-étoile"},
+]
+VENUES = [{"_id": VENUE, "name": "Traiteur", "aiGlobalScore": "88%", "aiKeyPoints": ["Copieux"]}]
+
+
+def without_none(doc):
+    return {k: v for k, v in doc.items() if v is not None}
+
+
+def naive(doc):
+    # mongomock ne conserve pas le fuseau horaire des dates
+    return {k: v.replace(tzinfo=None) if isinstance(v, datetime) else v for k, v in doc.items()}
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_export_import_round_trip(tmp_path, fmt):
+    source = create_client("mongomock://")["source"]
+    target = create_client("mongomock://")["target"]
+
+    async def run():
+        await source["reviews"].insert_many([dict(doc) for doc in REVIEWS])
+        await source["venues"].insert_many([dict(doc) for doc in VENUES])
+        for collection in ("reviews", "venues"):
+            await export_collection(source, collection, str(tmp_path / collection), fmt=fmt)
+            await import_collection(target, collection, str(tmp_path / collection), fmt=fmt)
+        return (
+            await target["reviews"].find().sort("_id", 1).to_list(None),
+            await target["venues"].find().to_list(None),
+        )
+
+    reviews, venues = asyncio.run(run())
+    assert [naive(doc) for doc in reviews] == [naive(without_none(doc)) for doc in REVIEWS]
+    assert isinstance(reviews[0]["rating"], int)
+    assert venues == VENUES
+
+    table = read_table(str(tmp_path / "reviews"), fmt=fmt, columns=["rating"])
+    assert table.schema.field("rating").type == pa.int64()
+    assert table.column("rating").to_pylist() == [5, None, None, None]
+    ratings = table.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)["rating"]
+    assert ratings.dtype == pd.Int64Dtype()
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+pytest.importorskip("mongomock_motor")
+
+from app.db import mongo  # noqa: E402
+from app.services.jobs import DatasetBusy, JobManager  # noqa: E402
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(mongo, "_client", mongo.create_client("mongomock://"))
+    manager = JobManager()
+    asyncio.run(manager.ensure_indexes())
+    return manager
+
+
+def test_lease_refuses_a_dataset_with_an_active_job(manager):
+    async def run():
+        await manager.collection.insert_one(
+            {"dataset": "reviews", "active": True, "status": "running", "heartbeat_at": datetime.now()}
+        )
+        async with manager.lease("reviews"):
+            pass
+
+    with pytest.raises(DatasetBusy):
+        asyncio.run(run())
+
+
+def test_lease_blocks_other_runs_until_released(manager):
+    other = JobManager()
+
+    async def run():
+        async with manager.lease("reviews") as job_id:
+            with pytest.raises(DatasetBusy):
+                async with other.lease("reviews"):
+                    pass
+        async with other.lease("reviews"):
+            pass
+        return await manager.collection.find_one({"_id": ObjectId(job_id)})
+
+    doc = asyncio.run(run())
+    assert doc["status"] == "completed"
+    assert "active" not in doc
+
+
+def test_shared_lease_is_released_by_the_last_shard(manager):
+    shard = JobManager()
+
+    async def run():
+        async with manager.lease("reviews", shared=True) as first:
+            async with shard.lease("reviews", shared=True) as second:
+                assert second == first
+            assert await manager.collection.count_documents({"active": True}) == 1
+        return await manager.collection.find_one({})
+
+    doc = asyncio.run(run())
+    assert doc["status"] == "completed"
+    assert doc["holders"] == []
+
+
+def test_failed_run_marks_the_lease_failed(manager):
+    async def run():
+        with pytest.raises(RuntimeError):
+            async with manager.lease("reviews"):
+                raise RuntimeError("échec")
+        return await manager.collection.find_one({})
+
+    doc = asyncio.run(run())
+    assert doc["status"] == "failed"
+    assert doc["error"] == "échec"
+
+
+def test_expired_command_line_lease_is_released_not_resumed(manager):
+    async def run():
+        await manager.collection.insert_one(
+            {"dataset": "reviews", "source": "cli", "active": True, "holders": ["x"], "heartbeat_at": datetime.min}
+        )
+        taken_over = await manager._take_over("reviews")
+        return taken_over, await manager.collection.find_one({})
+
+    taken_over, doc = asyncio.run(run())
+    assert taken_over is None
+    assert doc["status"] == "failed"
+    assert "active" not in doc
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from app.services.microbatch import MicroBatcher
+
+
+def recorder(fail_on=None):
+    """`process_batch` doubling each item and recording the batch sizes."""
+    sizes = []
+
+    async def process_batch(items):
+        sizes.append(len(items))
+        if fail_on in items:
+            raise ValueError(f"échec sur {fail_on}")
+        return [item * 2 for item in items]
+
+    return process_batch, sizes
+
+
+def run(batcher, coroutine):
+    async def main():
+        try:
+            return await coroutine()
+        finally:
+            await batcher.close()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_are_coalesced():
+    process_batch, sizes = recorder()
+    batcher = MicroBatcher(process_batch, max_batch_size=32, max_wait_ms=50)
+
+    async def requests():
+        return await asyncio.gather(*(batcher.submit([i]) for i in range(5)))
+
+    assert run(batcher, requests) == [[0], [2], [4], [6], [8]]
+    assert sizes == [5]
+
+
+def test_batches_are_capped_at_max_batch_size():
+    process_batch, sizes = recorder()
+    batcher = MicroBatcher(process_batch, max_batch_size=4, max_wait_ms=50)
+
+    async def requests():
+        return await batcher.submit(list(range(10)))
+
+    assert run(batcher, requests) == [i * 2 for i in range(10)]
+    assert sizes == [4, 4, 2]
+
+
+def test_a_lone_request_is_sent_after_max_wait():
+    process_batch, sizes = recorder()
+    batcher = MicroBatcher(process_batch, max_batch_size=32, max_wait_ms=10)
+
+    async def requests():
+        return await asyncio.wait_for(batcher.submit([1]), timeout=1)
+
+    assert run(batcher, requests) == [2]
+    assert sizes == [1]
+
+
+def test_a_failed_batch_fails_its_requests_only():
+    process_batch, sizes = recorder(fail_on=3)
+    batcher = MicroBatcher(process_batch, max_batch_size=2, max_wait_ms=10)
+
+    async def requests():
+        with pytest.raises(ValueError, match="échec sur 3"):
+            await batcher.submit([3])
+        return await batcher.submit([4])
+
+    assert run(batcher, requests) == [8]
+
+
+def test_cancelled_requests_are_dropped_from_the_batch():
+    process_batch, sizes = recorder()
+    batcher = MicroBatcher(process_batch, max_batch_size=32, max_wait_ms=50)
+
+    async def requests():
+        abandoned = asyncio.create_task(batcher.submit([1]))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        return await batcher.submit([2])
+
+    assert run(batcher, requests) == [4]
+    assert sizes == [1]
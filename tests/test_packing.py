@@ -0,0 +1,38 @@
+import pytest
+
+from app.services import packing
+from app.services.packing import count_tokens, format_review, pack_reviews, pack_texts
+
+
+@pytest.fixture(autouse=True)
+def char_estimate(monkeypatch):
+    """Character estimate (~4 characters per token) instead of the tiktoken download."""
+    monkeypatch.setattr(packing, "get_encoding", lambda model=None: None)
+
+
+def test_count_tokens_estimate():
+    assert count_tokens("a" * 40) == 11
+
+
+def test_pack_texts_fills_batches_up_to_the_budget():
+    texts = ["a" * 36] * 5  # 10 tokens chacun
+    batches = list(pack_texts(texts, budget=25))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert all(sum(count_tokens(t) for t in batch) <= 25 for batch in batches)
+
+
+def test_pack_texts_truncates_a_text_larger_than_the_budget():
+    batches = list(pack_texts(["a" * 36, "b" * 400, "c" * 36], budget=20))
+    assert [len(batch) for batch in batches] == [1, 1, 1]
+    assert batches[1] == ["b" * 80]
+
+
+def test_pack_reviews_skips_reviews_without_text():
+    reviews = [
+        {"text": "Repas excellent", "aiClusters": [{"label": "nourriture"}, {"label": "prix"}]},
+        {"text": ""},
+        {"text": "Service lent"},
+    ]
+    batches = list(pack_reviews(reviews, budget=1000))
+    assert batches == [format_review(reviews[0]) + format_review(reviews[2])]
+    assert "[CLUSTERS] nourriture, prix" in batches[0]
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from app.utils.encoding import fix_encoding
+from utils.pre_processing import (
+    PreparedBatch,
+    merge_clusters,
+    merge_embeddings,
+    merge_sentiments,
+    normalize_text,
+    prepare_text,
+    split_long_text,
+)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("TrÃ¨s bon repas, service impeccable", "Très bon repas, service impeccable"),
+        ("Câ€™Ã©tait parfait", "C’était parfait"),
+        ("Déjà correct", "Déjà correct"),
+        ("Prix : 45 €", "Prix : 45 €"),
+    ],
+)
+def test_fix_encoding(text, expected):
+    assert fix_encoding(text) == expected
+
+
+def test_normalize_text_removes_invisible_characters_and_spaces():
+    assert normalize_text("﻿TrÃ¨s  bon​\n\nrepas ") == "Très bon repas"
+
+
+def test_split_long_text_keeps_sentences_together():
+    text = "Repas copieux. Service rapide. Salle magnifique."
+    assert split_long_text(text, max_chars=32) == ["Repas copieux. Service rapide.", "Salle magnifique."]
+
+
+def test_split_long_text_cuts_overlong_sentences_and_caps_chunks():
+    chunks = split_long_text("a" * 25, max_chars=10, max_chunks=2)
+    assert chunks == ["a" * 10, "a" * 10]
+
+
+def test_prepare_text_modes():
+    text = "Repas copieux. Service rapide."
+    assert prepare_text(text, "chunk", 20) == ("Repas copieux.", "Service rapide.")
+    assert prepare_text(text, "truncate", 20) == (text[:20],)
+    assert prepare_text(text, "chunk", 100) == (text,)
+
+
+def test_prepared_batch_deduplicates_and_merges_back():
+    chunks = {"a": ("x",), "b": ("y", "z"), "c": ("x",), "d": ("z",)}
+    batch = PreparedBatch(["a", "b", "c", "d"], prepare=chunks.get)
+    assert batch.inputs == ["x", "y", "z"]
+    assert batch.chunks == [[0], [1, 2], [0], [2]]
+    assert batch.saved == 1
+    assert batch.merge([1, 2, 3], sum) == [1, 5, 1, 3]
+
+
+def test_merge_sentiments_picks_the_highest_total_score():
+    merged = merge_sentiments(
+        [{"label": "positive", "score": 0.9}, {"label": "negative", "score": 0.6}, {"label": "positive", "score": 0.3}]
+    )
+    assert merged["label"] == "positive"
+    assert merged["score"] == pytest.approx(0.4)
+
+
+def test_merge_clusters_averages_and_ranks_again():
+    merged = merge_clusters(
+        [
+            {"sequence": "a", "labels": ["prix", "service"], "scores": [0.8, 0.2]},
+            {"sequence": "b", "labels": ["service", "prix"], "scores": [0.9, 0.1]},
+        ]
+    )
+    assert merged["sequence"] == "a b"
+    assert merged["labels"] == ["service", "prix"]
+    assert merged["scores"] == pytest.approx([0.55, 0.45])
+
+
+def test_merge_embeddings_returns_a_unit_float16_vector():
+    merged = merge_embeddings([[1.0, 0.0], [0.0, 1.0]])
+    assert merged.dtype == np.float16
+    assert np.linalg.norm(merged.astype(np.float32)) == pytest.approx(1.0, abs=1e-3)
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from app.services import summarizer
+from app.services.summarizer import RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake clock: `asyncio.sleep` in the summarizer advances it instead of waiting."""
+    now = [0.0]
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(summarizer, "monotonic", lambda: now[0])
+    monkeypatch.setattr(summarizer.asyncio, "sleep", sleep)
+    return now, sleeps
+
+
+def test_requests_beyond_the_budget_wait_for_the_window(clock):
+    now, sleeps = clock
+    limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=1000)
+
+    async def run():
+        for _ in range(3):
+            await limiter.acquire(10)
+
+    asyncio.run(run())
+    assert sleeps == [60]
+    assert now[0] == 60
+
+
+def test_token_budget_is_enforced(clock):
+    now, sleeps = clock
+    limiter = RateLimiter(requests_per_minute=100, tokens_per_minute=100)
+
+    async def run():
+        await limiter.acquire(60)
+        now[0] += 15
+        await limiter.acquire(30)
+        await limiter.acquire(30)
+
+    asyncio.run(run())
+    # Le troisième appel attend la sortie du premier de la fenêtre
+    assert sleeps == [45]
+    assert limiter._tokens == 60
+
+
+def test_request_larger_than_the_budget_passes_alone(clock):
+    now, sleeps = clock
+    limiter = RateLimiter(requests_per_minute=100, tokens_per_minute=100)
+
+    async def run():
+        await limiter.acquire(500)
+        await limiter.acquire(1)
+
+    asyncio.run(run())
+    assert sleeps == [60]
@@ -0,0 +1,145 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services.structured import (
+    SUMMARY_SCHEMA,
+    StructuredOutputError,
+    complete_structured,
+    extract_json,
+    parse_labels,
+    parse_score,
+    parse_summary,
+)
+
+SUMMARY = {
+    "summary": "Très bon traiteur",
+    "key_points": ["Repas copieux"],
+    "strengths": ["Qualité"],
+    "weaknesses": [],
+    "score": 88,
+}
+
+
+def test_extract_json_from_fenced_block():
+    text = 'Voici la réponse :\n```json\n{"labels": ["prix", "service"]}\n```'
+    assert extract_json(text) == {"labels": ["prix", "service"]}
+
+
+def test_extract_json_ignores_surrounding_text():
+    assert extract_json('Réponse : {"score": 70} En espérant que cela aide.') == {"score": 70}
+
+
+def test_extract_json_accepts_single_quoted_literals():
+    assert extract_json("{'labels': ['prix', 'service']}") == {"labels": ["prix", "service"]}
+
+
+@pytest.mark.parametrize("text", ["", "   ", "pas de JSON ici", '{"summary": "tronqué"'])
+def test_extract_json_rejects_invalid_answers(text):
+    with pytest.raises(StructuredOutputError):
+        extract_json(text)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [(88, 88.0), ("88%", 88.0), ("88/100", 88.0), ("8,5 / 10", 85.0), ("Score : 72.5", 72.5)],
+)
+def test_parse_score(value, expected):
+    assert parse_score(value) == expected
+
+
+@pytest.mark.parametrize("value", [None, True, "excellent", 120, -5])
+def test_parse_score_rejects_missing_or_out_of_range_values(value):
+    with pytest.raises(StructuredOutputError):
+        parse_score(value)
+
+
+def test_parse_summary_normalizes_keys_and_lists():
+    text = '{"Résumé": "Bon traiteur", "points clés": "- Repas copieux\\n- Service rapide", "note": "88%"}'
+    assert parse_summary(text) == {
+        "summary": "Bon traiteur",
+        "key_points": ["Repas copieux", "Service rapide"],
+        "strengths": [],
+        "weaknesses": [],
+        "score": 88.0,
+    }
+
+
+def test_parse_summary_reads_the_legacy_text_format():
+    text = "Résumé : Bon traiteur\nPoints clés :\n- Repas copieux\nScore global : 75/100"
+    parsed = parse_summary(text)
+    assert parsed["summary"] == "Bon traiteur"
+    assert parsed["key_points"] == ["Repas copieux"]
+    assert parsed["score"] == 75.0
+
+
+def test_parse_summary_reports_every_missing_field():
+    with pytest.raises(StructuredOutputError, match="summary manquant ; score manquant"):
+        parse_summary('{"key_points": []}')
+
+
+def test_parse_labels_from_object_list_and_lines():
+    assert parse_labels('{"labels": ["prix", "service"]}', 2) == ["prix", "service"]
+    assert parse_labels('["prix", "service"]', 2) == ["prix", "service"]
+    assert parse_labels("1. prix\n2. service", 2) == ["prix", "service"]
+
+
+def test_parse_labels_rejects_a_wrong_count():
+    with pytest.raises(StructuredOutputError, match="2 labels non vides attendus, 3 reçus"):
+        parse_labels('["prix", "service", "cadre"]', 2)
+
+
+def scripted(answers):
+    """Async `complete` returning `answers` in turn, recording (prompt, stage) of each call."""
+    calls = []
+
+    async def complete(prompt, schema, stage):
+        calls.append((prompt, stage))
+        return answers[len(calls) - 1]
+
+    return complete, calls
+
+
+def test_complete_structured_parses_a_valid_answer_without_repair():
+    complete, calls = scripted([json.dumps(SUMMARY)])
+    parsed, answer, error = asyncio.run(
+        complete_structured(complete, "prompt", SUMMARY_SCHEMA, parse_summary, stage="summary")
+    )
+    assert parsed["score"] == 88.0
+    assert error is None
+    assert [stage for _, stage in calls] == ["summary"]
+
+
+def test_complete_structured_sends_only_the_faulty_answer_to_repair():
+    complete, calls = scripted(['{"summary": "Bon traiteur"}', '{"summary": "Bon traiteur", "score": 80}'])
+    parsed, answer, error = asyncio.run(
+        complete_structured(complete, "avis...", SUMMARY_SCHEMA, parse_summary, stage="summary", attempts=1)
+    )
+    assert parsed["score"] == 80.0
+    assert error is None
+    repair_prompt, stage = calls[1]
+    assert stage == "repair"
+    assert '{"summary": "Bon traiteur"}' in repair_prompt
+    assert "score manquant" in repair_prompt
+    assert "avis..." not in repair_prompt
+
+
+def test_complete_structured_gives_up_after_the_repair_attempts():
+    complete, calls = scripted(["pas de JSON", "toujours pas", "encore raté"])
+    parsed, answer, error = asyncio.run(
+        complete_structured(complete, "prompt", SUMMARY_SCHEMA, parse_summary, stage="summary", attempts=2)
+    )
+    assert parsed is None
+    assert answer == "encore raté"
+    assert isinstance(error, StructuredOutputError)
+    assert len(calls) == 3
+
+
+def test_complete_structured_does_not_repair_a_missing_answer():
+    complete, calls = scripted([None])
+    parsed, answer, error = asyncio.run(
+        complete_structured(complete, "prompt", SUMMARY_SCHEMA, parse_summary, stage="summary")
+    )
+    assert parsed is None and answer is None
+    assert len(calls) == 1
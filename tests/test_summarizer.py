@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services import packing, summarizer
+from app.services.summarizer import AsyncSummarizer
+
+FINAL_ANSWER = json.dumps(
+    {"summary": "Bon traiteur", "key_points": [], "strengths": [], "weaknesses": [], "score": 80}
+)
+
+
+class ScriptedSummarizer(AsyncSummarizer):
+    """Answers every map/reduce prompt with a fixed-size summary, records the final prompt."""
+
+    def __init__(self, summary_chars):
+        super().__init__(client=object())
+        self.summary_chars = summary_chars
+        self.prompts = {}
+
+    async def complete(self, prompt, stage="final", schema=None):
+        self.prompts.setdefault(stage, []).append(prompt)
+        if stage == "final":
+            return FINAL_ANSWER
+        return "x" * self.summary_chars
+
+
+@pytest.fixture(autouse=True)
+def budgets(monkeypatch):
+    monkeypatch.setattr(packing, "get_encoding", lambda model=None: None)
+    monkeypatch.setattr(summarizer, "SUMMARY_BATCH_TOKENS", 50)
+    monkeypatch.setattr(summarizer, "SUMMARY_FINAL_TOKENS", 100)
+
+
+def summarize(engine, reviews=20):
+    entry = {"cateringCompanyName": "Traiteur", "reviews": [{"text": "y" * 150} for _ in range(reviews)]}
+    return asyncio.run(engine.summarize_venue(entry))
+
+
+def test_partial_summaries_are_reduced_into_one_final_prompt(monkeypatch):
+    monkeypatch.setattr(summarizer, "SUMMARY_MAX_REDUCE_DEPTH", 3)
+    engine = ScriptedSummarizer(summary_chars=40)
+    parsed, _, errors = summarize(engine)
+    assert parsed["score"] == 80.0
+    assert errors == []
+    assert len(engine.prompts["map"]) == 20
+    assert "reduce" in engine.prompts
+
+
+def test_final_prompt_is_capped_when_the_reduce_depth_is_reached(monkeypatch, capsys):
+    monkeypatch.setattr(summarizer, "SUMMARY_MAX_REDUCE_DEPTH", 0)
+    engine = ScriptedSummarizer(summary_chars=120)
+    parsed, _, _ = summarize(engine)
+    assert parsed is not None
+    assert "reduce" not in engine.prompts
+    final_prompt = engine.prompts["final"][0]
+    prompt_overhead = summarizer.count_tokens(summarizer.get_final_prompt("Traiteur", ""))
+    assert summarizer.count_tokens(final_prompt) <= prompt_overhead + 100
+    assert "résumés partiels écartés" in capsys.readouterr().out
@@ -0,0 +1,117 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+from app.db.mongo import create_client  # noqa: E402
+from app.services.vector_index import ReviewIndex, VectorIndex, encode_embedding  # noqa: E402
+
+EMBEDDED_AT = datetime(2026, 1, 1)
+
+
+def review(rng, venue, embedded_at=EMBEDDED_AT):
+    vector = rng.normal(size=8)
+    return {
+        "venue": venue,
+        "aiEmbedding": encode_embedding(vector / np.linalg.norm(vector)),
+        "aiEmbeddedAt": embedded_at,
+    }
+
+
+@pytest.fixture
+def db():
+    return create_client("mongomock://")["test"]
+
+
+def test_sync_without_new_reviews_changes_nothing(db, tmp_path):
+    rng = np.random.default_rng(0)
+    # Tous les avis du dernier batch partagent la même date d'embedding
+    reviews = [review(rng, f"v{i % 3}", EMBEDDED_AT + timedelta(seconds=i // 4)) for i in range(12)]
+    index = ReviewIndex("reviews", str(tmp_path))
+
+    async def run():
+        await db["reviews"].insert_many(reviews)
+        first = await index.sync(db)
+        counts = dict(index.venue_counts)
+        second = await index.sync(db)
+        return first, counts, second
+
+    first, counts, second = asyncio.run(run())
+    assert first == 12
+    assert second == 0
+    assert len(index.index) == 12
+    assert index.venue_counts == counts == {"v0": 4, "v1": 4, "v2": 4}
+
+
+def test_sync_picks_up_late_reviews_of_the_last_batch(db, tmp_path):
+    rng = np.random.default_rng(1)
+    index = ReviewIndex("reviews", str(tmp_path))
+
+    async def run():
+        await db["reviews"].insert_many([review(rng, "v0") for _ in range(3)])
+        await index.sync(db)
+        # Écriture du même batch arrivée après le sync
+        await db["reviews"].insert_one(review(rng, "v1"))
+        return await index.sync(db)
+
+    assert asyncio.run(run()) == 1
+    assert len(index.index) == 4
+    assert index.venue_counts == {"v0": 3, "v1": 1}
+
+
+def test_removed_reviews_leave_results_and_venue_means(db, tmp_path):
+    rng = np.random.default_rng(2)
+    index = ReviewIndex("reviews", str(tmp_path))
+    docs = [review(rng, "v0") for _ in range(5)]
+
+    async def run():
+        await db["reviews"].insert_many(docs)
+        await index.sync(db)
+
+    asyncio.run(run())
+    removed = [str(doc["_id"]) for doc in docs[:2]]
+    assert index.remove(removed + ["unknown"]) == 2
+    assert len(index.index) == 3
+    assert index.venue_counts["v0"] == 3
+    hits = index.similar_reviews(index.get(str(docs[2]["_id"])), k=10)
+    assert {key for key, _ in hits} == {str(doc["_id"]) for doc in docs[2:]}
+
+
+def test_saved_index_reloads_with_removed_keys(db, tmp_path):
+    rng = np.random.default_rng(3)
+    docs = [review(rng, "v0") for _ in range(4)]
+
+    async def run():
+        await db["reviews"].insert_many(docs)
+        index = ReviewIndex("reviews", str(tmp_path))
+        await index.sync(db)
+        index.remove([str(docs[0]["_id"])])
+        await index.sync(db)
+        reloaded = ReviewIndex("reviews", str(tmp_path))
+        indexed = await reloaded.sync(db)
+        return reloaded, indexed
+
+    reloaded, indexed = asyncio.run(run())
+    assert indexed == 0
+    assert len(reloaded.index) == 3
+    assert reloaded.get(str(docs[0]["_id"])) is None
+    assert reloaded.venue_counts == {"v0": 3}
+
+
+@pytest.mark.parametrize("backend", ["exact", "hnsw"])
+def test_vector_index_remove(backend):
+    if backend == "hnsw":
+        pytest.importorskip("hnswlib")
+    vectors = np.eye(4, dtype=np.float32)
+    index = VectorIndex(4, backend=backend)
+    index.add(["a", "b", "c", "d"], vectors)
+    index.remove(["a"])
+    hits = index.search(vectors[0], k=4)
+    assert "a" not in [key for key, _ in hits]
+    assert len(hits) == 3
+    # Une clé retirée peut être indexée de nouveau
+    index.add(["a"], vectors[:1])
+    assert index.search(vectors[0], k=1)[0][0] == "a"
@@ -0,0 +1,281 @@
+"""
+Benchmark the enrichment pipeline stages on data/catering_reviews.csv.
+
+    python -m utils.benchmark --sizes 500,2000 --batch-sizes 16,32 [--baseline old.json]
+
+Reviews are loaded into an in-memory MongoDB stand-in (mongomock) and GPT calls
+go to an in-process stub, so only the code under test is measured.
+Classification, zero-shot clustering, DB writes and summarization are timed
+separately (throughput and latency percentiles) and written as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+from time import perf_counter
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from app.config import (
+    BULK_WRITE_BATCH_SIZE,
+    DEFAULT_LABELS,
+    HYPOTHESIS_TEMPLATE,
+    INFERENCE_BACKEND,
+    INFERENCE_QUANTIZE,
+    ZERO_SHOT_MODE,
+)
+from app.db.bulk import BulkWriter
+from app.db.mongo import create_client
+from app.services.inference import (
+    classify_batch,
+    cluster_batch,
+    length_buckets,
+    load_classifier,
+    load_clusterer,
+)
+from app.services.pipeline import iter_catering_with_reviews
+from app.services.summarizer import AsyncSummarizer, RateLimiter
+from utils.enrich import load_frame
+from utils.openai_stub import fake_message
+
+STAGES = ["classification", "clustering", "db_writes", "summarization"]
+
+
+class StubChatClient:
+    """In-process AsyncOpenAI stand-in returning the canned answers of utils.openai_stub."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model, messages, temperature, **options):
+        await asyncio.sleep(self.latency)
+        _, message = fake_message({"messages": messages, **options})
+        tool_calls = [
+            SimpleNamespace(function=SimpleNamespace(**call["function"]))
+            for call in message.get("tool_calls", [])
+        ]
+        return SimpleNamespace(
+            choices=[
+                SimpleNamespace(
+                    message=SimpleNamespace(content=message["content"], tool_calls=tool_calls)
+                )
+            ]
+        )
+
+
+def stage_report(items, latencies, unit):
+    """Throughput over the whole stage and latency percentiles per `unit` (batch, flush, venue)."""
+    latencies = np.asarray(latencies, dtype=float)
+    seconds = float(latencies.sum())
+    percentiles = np.percentile(latencies, [50, 90, 99]) if len(latencies) else [0.0] * 3
+    return {
+        "items": items,
+        "unit": unit,
+        "calls": int(len(latencies)),
+        "seconds": round(seconds, 4),
+        "throughput": round(items / seconds, 2) if seconds else None,
+        "latency_ms": {
+            "p50": round(percentiles[0] * 1000, 2),
+            "p90": round(percentiles[1] * 1000, 2),
+            "p99": round(percentiles[2] * 1000, 2),
+            "max": round(float(latencies.max()) * 1000, 2) if len(latencies) else 0.0,
+        },
+    }
+
+
+def timed(fn, *args, **kwargs):
+    start = perf_counter()
+    result = fn(*args, **kwargs)
+    return result, perf_counter() - start
+
+
+async def load_corpus(db, df):
+    await load_frame(db, "reviews", df)
+    return await db["reviews"].find({}, {"text": 1}).to_list(None)
+
+
+async def bench_db_writes(db, reviews, sentiments, clusters):
+    writer = BulkWriter(db["reviews"], batch_size=float("inf"), flush_interval=float("inf"))
+    latencies = []
+    for i, (review, sentiment, result) in enumerate(zip(reviews, sentiments, clusters), 1):
+        await writer.set(
+            {"_id": review["_id"]},
+            {
+                "aiSentiment": sentiment["label"],
+                "aiConfidenceScore": sentiment["score"],
+                "aiClusters": [
+                    {"label": label, "score": score}
+                    for label, score in zip(result["labels"], result["scores"])
+                ],
+            },
+        )
+        if i % BULK_WRITE_BATCH_SIZE == 0 or i == len(reviews):
+            start = perf_counter()
+            await writer.flush()
+            latencies.append(perf_counter() - start)
+    return stage_report(len(reviews), latencies, "flush")
+
+
+async def bench_summarization(db, gpt_latency, max_venues):
+    summarizer = AsyncSummarizer(
+        client=StubChatClient(gpt_latency),
+        rate_limiter=RateLimiter(10**9, 10**12),
+    )
+    entries = []
+    async for entry in iter_catering_with_reviews(db, "reviews"):
+        entries.append(entry)
+        if max_venues and len(entries) >= max_venues:
+            break
+
+    latencies = []
+
+    async def summarize(entry):
+        start = perf_counter()
+        await summarizer.summarize_venue(entry)
+        latencies.append(perf_counter() - start)
+
+    # Les traiteurs sont résumés en parallèle, comme dans le pipeline
+    start = perf_counter()
+    await asyncio.gather(*(summarize(entry) for entry in entries))
+    wall = perf_counter() - start
+    report = stage_report(len(entries), latencies, "venue")
+    report["seconds"] = round(wall, 4)
+    report["throughput"] = round(len(entries) / wall, 2) if wall else None
+    return report
+
+
+async def bench_run(df, batch_size, stages, models, args):
+    db = create_client("mongomock://")["benchmark"]
+    reviews = await load_corpus(db, df)
+    report = {"size": len(reviews), "batch_size": batch_size, "stages": {}}
+
+    sentiments, clusters, ordered = [], [], []
+    latencies = {"classification": [], "clustering": []}
+    if {"classification", "clustering", "db_writes"} & set(stages):
+        for batch in length_buckets(reviews, batch_size):
+            texts = [r["text"] for r in batch]
+            batch_sentiments, seconds = timed(classify_batch, models["classifier"], texts)
+            latencies["classification"].append(seconds)
+            batch_clusters, seconds = timed(
+                cluster_batch, models["clusterer"], texts, DEFAULT_LABELS, HYPOTHESIS_TEMPLATE
+            )
+            latencies["clustering"].append(seconds)
+            sentiments.extend(batch_sentiments)
+            clusters.extend(batch_clusters)
+            ordered.extend(batch)
+
+    for stage in ("classification", "clustering"):
+        if stage in stages:
+            report["stages"][stage] = stage_report(len(ordered), latencies[stage], "batch")
+    if "db_writes" in stages:
+        report["stages"]["db_writes"] = await bench_db_writes(db, ordered, sentiments, clusters)
+    if "summarization" in stages:
+        report["stages"]["summarization"] = await bench_summarization(
+            db, args.gpt_latency, args.max_venues
+        )
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Print the throughput change of each (size, batch size, stage) against a previous run."""
+    previous = {
+        (run["size"], run["batch_size"], stage): stats["throughput"]
+        for run in baseline["runs"]
+        for stage, stats in run["stages"].items()
+    }
+    print(f"\nComparaison avec {baseline['meta'].get('commit')} :")
+    for run in results["runs"]:
+        for stage, stats in run["stages"].items():
+            before = previous.get((run["size"], run["batch_size"], stage))
+            if before and stats["throughput"]:
+                change = (stats["throughput"] / before - 1) * 100
+                print(
+                    f"  {stage:<14} n={run['size']:<6} batch={run['batch_size']:<4} "
+                    f"{before:>9.1f} -> {stats['throughput']:>9.1f} /s ({change:+.1f}%)"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--csv", default="data/catering_reviews.csv")
+    parser.add_argument("--sizes", default="500,2000", help="tailles de corpus, séparées par des virgules")
+    parser.add_argument("--batch-sizes", default="16,32")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--gpt-latency", type=float, default=0.2, help="latence du GPT bouchon (s)")
+    parser.add_argument("--max-venues", type=int, default=50, help="0 = tous les traiteurs")
+    parser.add_argument("--output", default=None, help="par défaut benchmarks/<commit>.json")
+    parser.add_argument("--baseline", default=None, help="résultats précédents à comparer")
+    args = parser.parse_args()
+
+    stages = [stage for stage in args.stages.split(",") if stage]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"étapes inconnues : {', '.join(sorted(unknown))}")
+
+    df = pd.read_csv(args.csv).dropna(subset=["text"]).sample(frac=1, random_state=42)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+
+    models, load_seconds = {}, {}
+    if {"classification", "clustering", "db_writes"} & set(stages):
+        models["classifier"], load_seconds["classifier"] = timed(load_classifier)
+        models["clusterer"], load_seconds["clusterer"] = timed(load_clusterer)
+
+    commit = git_commit()
+    results = {
+        "meta": {
+            "commit": commit,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "backend": INFERENCE_BACKEND,
+            "quantize": INFERENCE_QUANTIZE,
+            "zero_shot_mode": ZERO_SHOT_MODE,
+            "gpt_latency": args.gpt_latency,
+            "model_load_seconds": {k: round(v, 2) for k, v in load_seconds.items()},
+        },
+        "runs": [],
+    }
+
+    for size in sizes:
+        for batch_size in batch_sizes:
+            run = asyncio.run(bench_run(df.head(size), batch_size, stages, models, args))
+            results["runs"].append(run)
+            for stage, stats in run["stages"].items():
+                unit = "traiteurs" if stats["unit"] == "venue" else "avis"
+                print(
+                    f"n={run['size']:<6} batch={batch_size:<4} {stage:<14} "
+                    f"{stats['throughput'] or 0:>9.1f} {unit}/s  "
+                    f"p50={stats['latency_ms']['p50']:.1f}ms p99={stats['latency_ms']['p99']:.1f}ms"
+                )
+
+    output = args.output or os.path.join("benchmarks", f"{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"📄 Résultats écrits dans {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
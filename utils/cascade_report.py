@@ -0,0 +1,164 @@
+"""
+Accuracy vs throughput of cascade clustering against the full NLI path.
+
+    python -m utils.cascade_report --size 1000 --confidences 0.8,0.9,0.95 --top-k 2,3,5
+
+Reviews of data/catering_reviews.csv are classified once, then clustered with the
+full path (every label through the NLI cross-encoder) and with each cascade
+setting (CASCADE_SKIP_CONFIDENCE x CASCADE_TOP_K). For each setting the report
+gives the clustering throughput, the share of reviews sent to NLI and the
+agreement with the full path: same top label, top label within the full path's
+top 3, and mean absolute difference of the label scores.
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from app.config import (
+    CASCADE_SKIP_MAX_CHARS,
+    DEFAULT_LABELS,
+    HYPOTHESIS_TEMPLATE,
+    INFERENCE_BATCH_SIZE,
+)
+from app.services.inference import (
+    cascade_many,
+    classify_batch,
+    cluster_batch,
+    length_buckets,
+    load_classifier,
+    load_clusterer,
+)
+from utils.benchmark import git_commit, timed
+from utils.pre_processing import preprocess_batch
+
+
+def agreement(full, cascade):
+    """Top-1 agreement, top-1 within the full top 3, and mean absolute score difference."""
+    top1 = np.mean([f["labels"][0] == c["labels"][0] for f, c in zip(full, cascade)])
+    top3 = np.mean([c["labels"][0] in f["labels"][:3] for f, c in zip(full, cascade)])
+    score_diff = np.mean(
+        [
+            abs(score - dict(zip(c["labels"], c["scores"]))[label])
+            for f, c in zip(full, cascade)
+            for label, score in zip(f["labels"], f["scores"])
+        ]
+    )
+    return round(float(top1), 4), round(float(top3), 4), round(float(score_diff), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--csv", default="data/catering_reviews.csv")
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=INFERENCE_BATCH_SIZE)
+    parser.add_argument("--confidences", default="0.8,0.9,0.95")
+    parser.add_argument("--top-k", default="2,3,5", help="0 = tous les labels")
+    parser.add_argument("--max-chars", type=int, default=CASCADE_SKIP_MAX_CHARS)
+    parser.add_argument("--output", default=None, help="par défaut benchmarks/cascade-<commit>.json")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv).dropna(subset=["text"]).sample(frac=1, random_state=42)
+    inputs = preprocess_batch(df["text"].head(args.size).tolist()).inputs
+    batches = [
+        [item["text"] for item in batch]
+        for batch in length_buckets([{"text": text} for text in inputs], args.batch_size)
+    ]
+    texts = [text for batch in batches for text in batch]
+    labels = DEFAULT_LABELS
+
+    classifier = load_classifier()
+    clusterer = load_clusterer()
+    # Préchauffage : l'encodeur du classement par similarité est chargé à la demande
+    clusterer.classify_many(texts[:1], [labels], HYPOTHESIS_TEMPLATE, mode="bi-encoder")
+
+    sentiments = [classify_batch(classifier, batch) for batch in batches]
+
+    full, full_seconds = [], 0.0
+    for batch in batches:
+        results, seconds = timed(cluster_batch, clusterer, batch, labels, HYPOTHESIS_TEMPLATE)
+        full.extend(results)
+        full_seconds += seconds
+    runs = [
+        {
+            "setting": "full",
+            "throughput": round(len(texts) / full_seconds, 2),
+            "nli_share": 1.0,
+            "speedup": 1.0,
+            "top1_agreement": 1.0,
+            "top3_agreement": 1.0,
+            "mean_score_diff": 0.0,
+        }
+    ]
+
+    confidences = [float(value) for value in args.confidences.split(",")]
+    top_ks = [int(value) for value in args.top_k.split(",")]
+    for confidence, top_k in product(confidences, top_ks):
+        cascade, seconds_total, nli = [], 0.0, 0
+        for batch, batch_sentiments in zip(batches, sentiments):
+            (results, batch_nli), seconds = timed(
+                cascade_many,
+                clusterer,
+                batch,
+                [labels],
+                HYPOTHESIS_TEMPLATE,
+                batch_sentiments,
+                skip_confidence=confidence,
+                skip_max_chars=args.max_chars,
+                top_k=top_k,
+            )
+            cascade.extend(results[0])
+            seconds_total += seconds
+            nli += batch_nli
+        top1, top3, score_diff = agreement(full, cascade)
+        runs.append(
+            {
+                "setting": f"confidence={confidence} top_k={top_k}",
+                "skip_confidence": confidence,
+                "top_k": top_k,
+                "throughput": round(len(texts) / seconds_total, 2),
+                "nli_share": round(nli / len(texts), 4),
+                "speedup": round(full_seconds / seconds_total, 2),
+                "top1_agreement": top1,
+                "top3_agreement": top3,
+                "mean_score_diff": score_diff,
+            }
+        )
+
+    print(f"{'réglage':<28} {'avis/s':>9} {'NLI':>6} {'gain':>6} {'top1':>6} {'top3':>6} {'Δscore':>7}")
+    for run in runs:
+        print(
+            f"{run['setting']:<28} {run['throughput']:>9.1f} {run['nli_share']:>6.0%} "
+            f"{run['speedup']:>5.2f}x {run['top1_agreement']:>6.1%} {run['top3_agreement']:>6.1%} "
+            f"{run['mean_score_diff']:>7.3f}"
+        )
+
+    commit = git_commit()
+    output = args.output or os.path.join("benchmarks", f"cascade-{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "meta": {
+                    "commit": commit,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "size": len(texts),
+                    "batch_size": args.batch_size,
+                    "max_chars": args.max_chars,
+                    "zero_shot_mode": clusterer.mode,
+                },
+                "runs": runs,
+            },
+            f,
+            indent=2,
+        )
+    print(f"📄 Résultats écrits dans {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Compare the ONNX Runtime backend with PyTorch on data/catering_reviews.csv.
+
+    python -m utils.check_backend_parity [--limit 1000] [--quantize]
+
+Exits with status 1 when labels disagree more than allowed or scores drift
+beyond the tolerance. The whole file is compared unless `--limit` is given,
+in which case the verdict only holds for that sample.
+"""
+
+import argparse
+import sys
+
+import pandas as pd
+
+from app.config import DEFAULT_LABELS, HYPOTHESIS_TEMPLATE, INFERENCE_BATCH_SIZE
+from app.services.inference import (
+    classify_batch,
+    cluster_batch,
+    length_buckets,
+    load_classifier,
+    load_clusterer,
+)
+
+
+def run(classifier, clusterer, reviews, labels):
+    sentiments, clusters = {}, {}
+    for batch in length_buckets(reviews, INFERENCE_BATCH_SIZE):
+        texts = [r["text"] for r in batch]
+        for review, s, c in zip(
+            batch,
+            classify_batch(classifier, texts),
+            cluster_batch(clusterer, texts, labels, HYPOTHESIS_TEMPLATE),
+        ):
+            sentiments[review["_id"]] = s
+            clusters[review["_id"]] = dict(zip(c["labels"], c["scores"]))
+    return sentiments, clusters
+
+
+def compare(reference, candidate, labels):
+    ref_sentiments, ref_clusters = reference
+    sentiments, clusters = candidate
+    ids = list(ref_sentiments)
+
+    label_agreement = sum(
+        ref_sentiments[i]["label"] == sentiments[i]["label"] for i in ids
+    ) / len(ids)
+    sentiment_drift = max(
+        (
+            abs(ref_sentiments[i]["score"] - sentiments[i]["score"])
+            for i in ids
+            if ref_sentiments[i]["label"] == sentiments[i]["label"]
+        ),
+        default=0.0,
+    )
+    top_cluster_agreement = sum(
+        max(ref_clusters[i], key=ref_clusters[i].get)
+        == max(clusters[i], key=clusters[i].get)
+        for i in ids
+    ) / len(ids)
+    cluster_drift = max(
+        abs(ref_clusters[i][label] - clusters[i][label]) for i in ids for label in labels
+    )
+    return {
+        "sentiment_label_agreement": label_agreement,
+        "sentiment_max_score_diff": sentiment_drift,
+        "cluster_top_label_agreement": top_cluster_agreement,
+        "cluster_max_score_diff": cluster_drift,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--csv", default="data/catering_reviews.csv")
+    parser.add_argument("--limit", type=int, default=0, help="0 = tout le fichier (par défaut)")
+    parser.add_argument("--quantize", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.02)
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv).dropna(subset=["text"])
+    available = len(df)
+    if args.limit:
+        df = df.head(args.limit)
+    reviews = [{"_id": i, "text": text} for i, text in enumerate(df["text"])]
+    labels = DEFAULT_LABELS
+
+    sample = f"{len(reviews)}/{available} avis" + (" (échantillon --limit)" if len(reviews) < available else "")
+    print(f"🔍 {sample}, {len(labels)} labels")
+    reference = run(load_classifier("torch"), load_clusterer("torch"), reviews, labels)
+    candidate = run(
+        load_classifier("onnx", args.quantize),
+        load_clusterer("onnx", args.quantize),
+        reviews,
+        labels,
+    )
+
+    report = compare(reference, candidate, labels)
+    for key, value in report.items():
+        print(f"{key}: {value:.4f}")
+
+    # Int8 shifts scores more than fp32 ONNX: the tolerance applies to the
+    # agreement rates in that case, not to the raw score drift.
+    ok = (
+        report["sentiment_label_agreement"] >= args.min_agreement
+        and report["cluster_top_label_agreement"] >= args.min_agreement
+    )
+    if not args.quantize:
+        ok = ok and (
+            report["sentiment_max_score_diff"] <= args.tolerance
+            and report["cluster_max_score_diff"] <= args.tolerance
+        )
+
+    print(f"✅ Parité OK sur {sample}" if ok else f"❌ Écart au-delà de la tolérance sur {sample}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
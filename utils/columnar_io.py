@@ -0,0 +1,50 @@
+"""
+Export the reviews and venues collections to partitioned Parquet / Arrow files, or import them back.
+
+    python -m utils.columnar_io export --out data/export [--format arrow]
+    python -m utils.columnar_io import --src data/export
+
+Each collection goes to its own directory (data/export/reviews/part-00000.parquet...),
+written chunk by chunk; `aiClusters` is a list<struct<label, score>> column.
+"""
+
+import argparse
+import asyncio
+import os
+from time import perf_counter
+
+from app.db import mongo
+from app.services.columnar import export_collection, import_collection
+
+
+async def main(args):
+    db = await mongo.connect()
+    collections = [c for c in args.collections.split(",") if c]
+    try:
+        for collection in collections:
+            # Le jeu d'avis peut porter un autre nom que "reviews" (ex. reviews_test)
+            kind = "venues" if collection == "venues" else "reviews"
+            directory = os.path.join(args.out or args.src, collection)
+            start = perf_counter()
+            if args.command == "export":
+                rows = await export_collection(db, collection, directory, kind=kind, fmt=args.format)
+                print(f"✅ {collection} : {rows} lignes exportées vers {directory}", end="")
+            else:
+                rows = await import_collection(db, collection, directory, fmt=args.format)
+                print(f"✅ {collection} : {rows} lignes importées depuis {directory}", end="")
+            print(f" en {perf_counter() - start:.1f}s")
+    finally:
+        await mongo.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("--out", help="répertoire de destination (export)")
+    parser.add_argument("--src", help="répertoire source (import)")
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    parser.add_argument("--collections", default="reviews,venues")
+    args = parser.parse_args()
+    if (args.command == "export" and not args.out) or (args.command == "import" and not args.src):
+        parser.error("--out est requis pour export, --src pour import")
+    asyncio.run(main(args))
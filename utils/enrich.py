@@ -0,0 +1,245 @@
+"""
+Run the enrichment pipeline of the service from the command line.
+
+    python -m utils.enrich --stages classify,cluster [--shard 0/4] [--checkpoint run.json]
+    python -m utils.enrich --input data/catering_reviews.csv --output data/enriched
+    python -m utils.enrich --shard 1/4 --dry-run --output data/shard-1
+
+The stages (labels, classify, cluster, summarize, or any subset) are those of
+app.services.pipeline.run_pipeline; `--label-sets` adds named label sets to the
+cluster stage. The input is the MongoDB collection, a CSV or
+Parquet file (columns text, rating, company_id, company_name) or a directory
+exported by utils.columnar_io. `--shard i/N` only processes the venues whose hash
+falls in shard i, so that N machines can split a corpus.
+
+File inputs and `--dry-run` work on an in-memory copy of the data and write the
+results as Parquet/Arrow files to `--output` (same layout as utils.columnar_io),
+without touching the database. `--checkpoint` saves the progress of a MongoDB run
+to a JSON file; running the same command again resumes from it.
+
+A MongoDB run holds the dataset's lease in the `jobs` collection, like a job of
+the API: it refuses to start while a job is active on the dataset, and no job
+starts until it is done. The processes of a sharded run share the lease.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+from contextlib import nullcontext
+
+import pandas as pd
+from bson import ObjectId, json_util
+
+from app.config import DEFAULT_LABELS, REVIEWS_CHUNK_SIZE, REVIEWS_CURSOR_BATCH_SIZE
+from app.db import mongo
+from app.db.mongo import create_client, iter_chunks
+from app.services.columnar import export_collection, import_collection, part_files
+from app.services.incremental import get_current_labels, save_current_labels
+from app.services.jobs import DatasetBusy, LeaseLost, job_manager
+from app.services.pipeline import STAGES, PipelineError, run_pipeline
+from app.services.workers import shutdown_inference_pool
+
+
+def shard_of(venue, shards):
+    """Shard of a venue, stable across machines and runs. Reviews without venue go to shard 0."""
+    if venue is None:
+        return 0
+    return int(hashlib.sha1(str(venue).encode()).hexdigest(), 16) % shards
+
+
+async def shard_query(db, dataset, index, shards):
+    venues = await db[dataset].distinct("venue")
+    query = {"venue": {"$in": [v for v in venues if v is not None and shard_of(v, shards) == index]}}
+    if index == 0:
+        query = {"$or": [query, {"venue": None}]}
+    return query
+
+
+def as_rating(value):
+    """Rating of a frame cell: pandas reads a column with missing ratings as float64."""
+    if pd.isna(value):
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+async def load_frame(db, dataset, df):
+    """Insert the venues and reviews of a CSV-shaped frame (text, rating, company_id, company_name)."""
+    venues = (
+        df[["company_id", "company_name"]]
+        .dropna()
+        .drop_duplicates("company_id")
+        .itertuples(index=False)
+    )
+    venues = [{"_id": ObjectId(company_id), "name": name} for company_id, name in venues]
+    if venues:
+        await db["venues"].insert_many(venues)
+    await db[dataset].insert_many(
+        [
+            {
+                "text": row.text,
+                "rating": as_rating(row.rating),
+                "venue": ObjectId(row.company_id) if isinstance(row.company_id, str) else None,
+            }
+            for row in df.itertuples(index=False)
+        ]
+    )
+
+
+async def load_input(db, dataset, path):
+    if os.path.isdir(path):
+        # Export de utils.columnar_io : un répertoire par collection
+        fmt = "arrow" if part_files(os.path.join(path, dataset), "arrow") else "parquet"
+        await import_collection(db, dataset, os.path.join(path, dataset), fmt=fmt)
+        if os.path.isdir(os.path.join(path, "venues")):
+            await import_collection(db, "venues", os.path.join(path, "venues"), fmt=fmt)
+    else:
+        df = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+        await load_frame(db, dataset, df.dropna(subset=["text"]))
+
+
+async def copy_from_mongo(source, db, dataset, query):
+    """Copy the reviews matching `query`, their venues and the label sets."""
+    venue_ids = set()
+    cursor = source[dataset].find(query or {}).batch_size(REVIEWS_CURSOR_BATCH_SIZE)
+    async for chunk in iter_chunks(cursor, REVIEWS_CHUNK_SIZE):
+        await db[dataset].insert_many(chunk)
+        venue_ids.update(review["venue"] for review in chunk if review.get("venue"))
+    venues = await source["venues"].find({"_id": {"$in": list(venue_ids)}}).to_list(None)
+    label_sets = await source["label_sets"].find({}).to_list(None)
+    for collection, docs in (("venues", venues), ("label_sets", label_sets)):
+        if docs:
+            await db[collection].insert_many(docs)
+
+
+def load_state(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json_util.loads(f.read())
+
+
+def save_state(path, state):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(json_util.dumps(state))
+    os.replace(tmp, path)
+
+
+async def main(args, stages, shard, label_sets):
+    offline = args.dry_run or args.input != "mongo"
+    dataset = args.dataset
+    source = await mongo.connect() if args.input == "mongo" else None
+    try:
+        if offline:
+            # Copie en mémoire : la base n'est jamais modifiée
+            db = create_client("mongomock://")["enrich"]
+            if source is not None:
+                query = await shard_query(source, dataset, *shard) if shard else None
+                await copy_from_mongo(source, db, dataset, query)
+                query = None
+            else:
+                await load_input(db, dataset, args.input)
+                query = await shard_query(db, dataset, *shard) if shard else None
+                if "labels" not in stages and not await get_current_labels(db, dataset):
+                    await save_current_labels(db, dataset, DEFAULT_LABELS)
+        else:
+            db = source
+            query = await shard_query(db, dataset, *shard) if shard else None
+            await job_manager.ensure_indexes()
+
+        state = load_state(args.checkpoint)
+        run = {
+            "dataset": dataset,
+            "stages": stages,
+            "shard": list(shard) if shard else None,
+            "label_sets": label_sets,
+        }
+        if state and state.get("run") != run:
+            raise SystemExit(f"❌ {args.checkpoint} correspond à un autre lancement : {state.get('run')}")
+        if state.get("stage") == "done":
+            print(f"✅ Déjà terminé d'après {args.checkpoint}")
+            return
+        state["run"] = run
+
+        async def checkpoint(state):
+            save_state(args.checkpoint, state)
+
+        # En mémoire, aucun job ne peut concurrencer l'exécution
+        lease = nullcontext() if offline else job_manager.lease(dataset, shared=shard is not None)
+        try:
+            async with lease:
+                async for message in run_pipeline(
+                    dataset,
+                    state=state,
+                    checkpoint=checkpoint if args.checkpoint else None,
+                    stages=stages,
+                    query=query,
+                    db=db,
+                    sync_index=not offline,
+                    label_sets=label_sets,
+                ):
+                    print(message, end="")
+        except (PipelineError, DatasetBusy) as e:
+            raise SystemExit(f"❌ {e}")
+        except LeaseLost as e:
+            raise SystemExit(f"❌ Bail {e} repris par un autre processus : exécution arrêtée")
+        except asyncio.CancelledError:
+            # Annulation demandée depuis l'API (POST /reviews/jobs/{id}/cancel) ou Ctrl-C
+            raise SystemExit("⚠️ Exécution annulée")
+
+        if offline:
+            for collection, kind in ((dataset, "reviews"), ("venues", "venues")):
+                directory = os.path.join(args.output, collection)
+                rows = await export_collection(
+                    db,
+                    collection,
+                    directory,
+                    kind=kind,
+                    fmt=args.format,
+                    query=query if collection == dataset else None,
+                )
+                print(f"📄 {collection} : {rows} lignes écrites dans {directory}")
+    finally:
+        shutdown_inference_pool()
+        await mongo.close()
+
+
+def parse_shard(value):
+    index, _, shards = value.partition("/")
+    index, shards = int(index), int(shards)
+    if not 0 <= index < shards:
+        raise ValueError(value)
+    return index, shards
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--dataset", default="reviews")
+    parser.add_argument("--label-sets", default="", help="jeux de labels nommés à appliquer en plus")
+    parser.add_argument("--input", default="mongo", help="mongo, fichier CSV/Parquet ou export columnar_io")
+    parser.add_argument("--shard", default=None, help="i/N : ne traite que la part i sur N des traiteurs")
+    parser.add_argument("--checkpoint", default=None, help="fichier JSON de reprise (entrée mongo)")
+    parser.add_argument("--dry-run", action="store_true", help="écrit les résultats dans --output au lieu de la base")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    args = parser.parse_args()
+
+    stages = [stage for stage in args.stages.split(",") if stage]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"étapes inconnues : {', '.join(sorted(unknown))}")
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+    except ValueError:
+        parser.error("--shard attend i/N avec 0 <= i < N")
+    if shard and "labels" in stages:
+        parser.error("l'étape labels porte sur tout le corpus : lance-la sans --shard")
+    if (args.dry_run or args.input != "mongo") and not args.output:
+        parser.error("--output est requis avec --dry-run ou une entrée fichier")
+    if args.checkpoint and (args.dry_run or args.input != "mongo"):
+        parser.error("--checkpoint ne s'applique qu'à une exécution sur MongoDB")
+    label_sets = [name for name in args.label_sets.split(",") if name]
+    asyncio.run(main(args, stages, shard, label_sets))
@@ -0,0 +1,121 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+    uvicorn utils.openai_stub:app --port 8090
+    OPENAI_BASE_URL=http://localhost:8090/v1 OPENAI_API_KEY=stub make run
+
+STUB_LATENCY (seconds) and STUB_FAILURE_RATE (0-1, answered with 429 or 500)
+make it possible to exercise the scheduler's concurrency, rate limits and retries.
+"""
+
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+LATENCY = float(os.getenv("STUB_LATENCY", "0.5"))
+FAILURE_RATE = float(os.getenv("STUB_FAILURE_RATE", "0"))
+
+app = FastAPI()
+stats = {"requests": 0, "failures": 0}
+
+
+LABELS = [
+    "qualité des plats",
+    "service client",
+    "rapport qualité/prix",
+    "présentation des plats",
+    "ponctualité",
+]
+
+
+SUMMARY = {
+    "summary": "Traiteur apprécié pour la qualité de ses plats.",
+    "key_points": ["Service attentionné", "Quelques retards signalés"],
+    "strengths": ["Qualité des plats"],
+    "weaknesses": ["Ponctualité"],
+    "score": 85,
+}
+
+
+def fake_answer(prompt):
+    if '"labels"' in prompt:
+        # La découverte des labels attend exactement un nom par cluster
+        expected = re.search(r"contenant (\d+) noms", prompt)
+        count = int(expected.group(1)) if expected else len(LABELS)
+        labels = [
+            LABELS[i % len(LABELS)] + (f" {i // len(LABELS) + 1}" if i >= len(LABELS) else "")
+            for i in range(count)
+        ]
+        return json.dumps({"labels": labels}, ensure_ascii=False)
+    if '"score"' in prompt:
+        return json.dumps(SUMMARY, ensure_ascii=False)
+    return "Les clients saluent la qualité des plats et la gentillesse de l'équipe."
+
+
+def fake_message(body):
+    """Assistant message, as a forced function call when the request asks for one."""
+    content = fake_answer(body["messages"][-1]["content"])
+    tool_choice = body.get("tool_choice")
+    if isinstance(tool_choice, dict):
+        return content, {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {"name": tool_choice["function"]["name"], "arguments": content},
+                }
+            ],
+        }
+    return content, {"role": "assistant", "content": content}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    await asyncio.sleep(LATENCY)
+
+    if random.random() < FAILURE_RATE:
+        stats["failures"] += 1
+        status = random.choice([429, 500])
+        return JSONResponse(
+            status_code=status,
+            content={"error": {"message": "stub failure", "type": "stub", "code": status}},
+        )
+
+    prompt = body["messages"][-1]["content"]
+    content, message = fake_message(body)
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [
+            {
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if "tool_calls" in message else "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+@app.get("/stats")
+def get_stats():
+    return stats
@@ -0,0 +1,133 @@
+"""
+Batch text normalization run before inference.
+
+Each review is repaired (mojibake), whitespace-normalized and, when longer than
+the model can read, truncated or cut into sentence-aligned chunks. Identical
+inputs within a batch are inferred once, and the per-review results are merged
+back from their chunks. Normalization is memoized per text.
+"""
+
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from app.config import (
+    PREPROCESS_CACHE_SIZE,
+    PREPROCESS_ENABLED,
+    PREPROCESS_LONG_TEXT,
+    PREPROCESS_MAX_CHARS,
+    PREPROCESS_MAX_CHUNKS,
+)
+from app.utils.encoding import fix_encoding
+
+# Caractères invisibles (espaces de largeur nulle, BOM, caractères de contrôle)
+INVISIBLE = re.compile(r"[\u200b-\u200d\u2060\ufeff\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+WHITESPACE = re.compile(r"\s+")
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+def normalize_text(text):
+    # Les caractères invisibles (BOM...) empêchent le ré-encodage cp1252 de fix_encoding
+    text = INVISIBLE.sub("", text)
+    text = fix_encoding(text)
+    return WHITESPACE.sub(" ", text).strip()
+
+
+def split_long_text(text, max_chars=PREPROCESS_MAX_CHARS, max_chunks=PREPROCESS_MAX_CHUNKS):
+    """Cut `text` into at most `max_chunks` chunks of `max_chars`, on sentence boundaries when possible."""
+    chunks, current = [], ""
+    for sentence in SENTENCE_END.split(text):
+        # Une phrase plus longue qu'un chunk est coupée brutalement
+        while len(sentence) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:max_chars])
+            sentence = sentence[max_chars:].lstrip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks[:max_chunks]
+
+
+@lru_cache(maxsize=PREPROCESS_CACHE_SIZE)
+def prepare_text(text, mode=PREPROCESS_LONG_TEXT, max_chars=PREPROCESS_MAX_CHARS):
+    """Model inputs for one review (one, or several chunks in "chunk" mode)."""
+    text = normalize_text(text) or text
+    if len(text) <= max_chars:
+        return (text,)
+    if mode == "chunk":
+        return tuple(split_long_text(text, max_chars))
+    return (text[:max_chars],)
+
+
+class PreparedBatch:
+    """
+    Unique model inputs of a batch of reviews, and for each review the positions
+    of its chunks in `inputs`. Results computed on `inputs` are mapped back with `merge`.
+    """
+
+    def __init__(self, texts, prepare=prepare_text):
+        self.inputs = []
+        self.chunks = []
+        positions = {}
+        for text in texts:
+            review_chunks = []
+            for chunk in prepare(text):
+                if chunk not in positions:
+                    positions[chunk] = len(self.inputs)
+                    self.inputs.append(chunk)
+                review_chunks.append(positions[chunk])
+            self.chunks.append(review_chunks)
+
+    @property
+    def saved(self):
+        """Model inputs avoided by deduplication (negative when chunking adds inputs)."""
+        return len(self.chunks) - len(self.inputs)
+
+    def merge(self, results, combine):
+        """Per-review results: the result of its only chunk, or `combine` of its chunks' results."""
+        return [
+            results[positions[0]]
+            if len(positions) == 1
+            else combine([results[p] for p in positions])
+            for positions in self.chunks
+        ]
+
+
+def preprocess_batch(texts, enabled=PREPROCESS_ENABLED):
+    """Prepared inputs of `texts`; when disabled, texts are only deduplicated."""
+    return PreparedBatch(texts, prepare_text if enabled else lambda text: (text,))
+
+
+def merge_sentiments(results):
+    """Label with the highest total score over the chunks, scored by its mean."""
+    totals = {}
+    for result in results:
+        totals[result["label"]] = totals.get(result["label"], 0.0) + result["score"]
+    label = max(totals, key=totals.get)
+    return {"label": label, "score": totals[label] / len(results)}
+
+
+def merge_clusters(results):
+    """Mean score of each label over the chunks, ranked again."""
+    scores = {}
+    for result in results:
+        for label, score in zip(result["labels"], result["scores"]):
+            scores[label] = scores.get(label, 0.0) + score / len(results)
+    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    return {
+        "sequence": " ".join(r["sequence"] for r in results),
+        "labels": [label for label, _ in ranked],
+        "scores": [score for _, score in ranked],
+    }
+
+
+def merge_embeddings(vectors):
+    mean = np.mean(np.asarray(vectors, dtype=np.float32), axis=0)
+    return (mean / max(np.linalg.norm(mean), 1e-12)).astype(np.float16)
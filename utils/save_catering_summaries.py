@@ -1,21 +1,10 @@
-import os
+import asyncio
 import json
-from dotenv import load_dotenv
-from pymongo import MongoClient
 from bson import ObjectId
 
-
-def connect_to_db():
-    load_dotenv()
-    MONGODB_URI = os.getenv("MONGODB_URI")
-    client = MongoClient(MONGODB_URI)
-
-    if client is not None:
-        print("Connected to DB")
-        return client
-    else:
-        print("Failed to connect to DB")
-        return None
+from app.db import mongo
+from app.db.bulk import BulkWriter
+from app.services.structured import StructuredOutputError, as_list, parse_score
 
 
 def load_summaries_from_file(path="microservice/data/catering_reviews_summary.json"):
@@ -29,42 +18,41 @@ def load_summaries_from_file(path="microservice/data/catering_reviews_summary.js
         return []
 
 
-def save_summaries_to_db(client, summaries):
-    if client is None:
-        return
-
-    db = client["ai-wedder"]
-    Venue = db["venues"]
-
-    for entry in summaries:
-        venue_id = ObjectId(entry.get("cateringCompanyId"))
-        summary = entry.get("summary", "").strip()
-        key_points = entry.get("key_points", "").strip()
-        global_score = entry.get("global_score", "").strip()
-
-        if not venue_id:
-            print("⚠️ Skipping: no venue ID")
-            continue
-
-        update_result = Venue.update_one(
-            {"_id": venue_id},
-            {
-                "$set": {
+async def save_summaries_to_db(db, summaries):
+    async with BulkWriter(db["venues"]) as writer:
+        for entry in summaries:
+            venue_id = ObjectId(entry.get("cateringCompanyId"))
+            summary = entry.get("summary", "").strip()
+            key_points = as_list(entry.get("key_points"))
+
+            if not venue_id:
+                print("⚠️ Skipping: no venue ID")
+                continue
+            try:
+                global_score = parse_score(entry.get("global_score"))
+            except StructuredOutputError as e:
+                print(f"⚠️ Skipping {venue_id}: {e}")
+                continue
+
+            await writer.set(
+                {"_id": venue_id},
+                {
                     "aiSummary": summary,
                     "aiKeyPoints": key_points,
                     "aiGlobalScore": global_score,
-                }
-            },
-        )
+                },
+            )
 
-        if update_result.modified_count > 0:
-            print(f"✅ Updated venue {venue_id}")
-        else:
-            print(f"⚠️ No update for venue {venue_id}")
+    print(f"✅ Updated {writer.modified} venues ({len(writer.errors)} errors)")
 
 
-if __name__ == "__main__":
-    client = connect_to_db()
+async def main():
+    db = await mongo.connect()
     summaries = load_summaries_from_file()
-    save_summaries_to_db(client, summaries)
+    await save_summaries_to_db(db, summaries)
+    await mongo.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
     print("🎉 Upload completed")